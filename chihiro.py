@@ -4,6 +4,17 @@ from pathlib import Path
 ROOT_DIR = Path(os.path.dirname(os.path.abspath(__file__)))
 if __name__ == '__main__':
     import sys
+    from multiprocessing import freeze_support
+    freeze_support()
     sys.path.insert(1, 'src')
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        import batch
+        sys.exit(batch.main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        import simulation_server
+        sys.exit(simulation_server.main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "optimize":
+        import optimizer
+        sys.exit(optimizer.main(sys.argv[2:]))
     import main
     main.main()
@@ -4,6 +4,11 @@ import platform
 LOGGER_NAME = "chihiro"
 LOG_DIR = ROOT_DIR / "logs"
 MAX_WORKERS = 6  # Set this high and your PC dies
+SIMULATION_WORKERS = 4  # Worker processes dedicated to simulations
+SIMULATION_SERVER_HOST = None  # Set to the address of a simulation server to simulate there instead of locally
+SIMULATION_SERVER_PORT = 47823
+SIMULATION_SERVER_AUTHKEY = None  # None to use the key generated in SIMULATION_SERVER_KEY_PATH on first run
+SIMULATION_SERVER_CACHE_SIZE = 4096  # Results kept by the server
 
 DATA_PATH = ROOT_DIR / "data"
 BACKUP_PATH = DATA_PATH / "backup"
@@ -11,6 +16,7 @@ DB_PATH = DATA_PATH / "db"
 IMAGE_PATH = DATA_PATH / "img"
 IMAGE_PATH32 = DATA_PATH / "img32"
 IMAGE_PATH64 = DATA_PATH / "img64"
+IMAGE_ATLAS_PATH = DATA_PATH / "img_atlas"
 ZIP_PATH = ROOT_DIR / "img.zip"
 MUSICSCORES_PATH = DATA_PATH / "musicscores"
 CACHEDB_PATH = DB_PATH / "chihiro.db"
@@ -18,6 +24,7 @@ MANIFEST_PATH = DB_PATH / "manifest.db"
 MASTERDB_PATH = DB_PATH / "master.db"
 
 PROFILE_PATH = DATA_PATH / "profiles"
+SIMULATION_SERVER_KEY_PATH = DATA_PATH / "simulation_server.key"  # Copy it to every client of the server
 
 STATIC_PATH = ROOT_DIR
 TOOL_EXE = STATIC_PATH / "tool.exe"
@@ -36,4 +43,7 @@ ABUSE_CHARTS_PATH = ROOT_DIR / "abuse"
 CHART_PICS_PATH = ROOT_DIR / "charts"
 
 REMOTE_CACHE_SCORES_URL = "https://raw.githubusercontent.com/deresute-tools/chihiro-static/master/live_detail_cache.csv"
-REMOTE_TRANSLATED_SONG_URL = "https://raw.githubusercontent.com/deresute-tools/chihiro-static/master/translated.csv"
\ No newline at end of file
+REMOTE_TRANSLATED_SONG_URL = "https://raw.githubusercontent.com/deresute-tools/chihiro-static/master/translated.csv"
+HTTP_TIMEOUT = 30  # Seconds
+HTTP_RETRIES = 3
+HTTP_MAX_CONNECTIONS_PER_HOST = MAX_WORKERS
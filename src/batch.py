@@ -0,0 +1,302 @@
+"""
+Headless batch simulation, no Qt involved.
+
+Jobs are read from a JSONL or CSV file, one unit per line, and simulated across worker processes with the same
+Simulator the GUI uses. Results are streamed out in input order as JSONL or CSV while the rest is still running.
+
+A job has the following keys, only cards and a chart are required:
+    id              echoed back in the result, defaults to the line number
+    cards           list of 5, 6 or 15 card ids, or a string of card ids or short names separated by spaces/commas
+    pots            vo, vi, da, li, sk potentials applied to every card, the current profile's potentials if absent
+    score_id        live id of the chart, or
+    music_name      name of the song
+    difficulty      Difficulty name (MPLUS, MASTER, ...) or value
+    times           number of random runs, 100 by default
+    perfect_play, auto, doublelife, mirror, allow_great, abuse, left_inclusive, right_inclusive
+                    flags with the same meaning as in the GUI
+    appeals, support, autoplay_offset
+                    optional overrides
+
+Usage: python chihiro.py batch jobs.jsonl -o results.csv
+"""
+import argparse
+import copy
+import csv
+import json
+import sys
+from collections import deque
+
+import numpy as np
+
+import customlogger as logger
+from settings import MAX_WORKERS
+from utils.misc import get_process_pool
+
+RESULT_COLUMNS = [
+    "id", "error",
+    "perfect_score", "mean", "median", "max", "min", "deviation", "full_roll_chance", "abuse_score", "fans",
+    "score", "perfects", "misses", "max_combo", "lowest_life", "lowest_life_time", "all_100",
+    "total_appeal", "total_life",
+]
+BOOLEAN_KEYS = ["perfect_play", "auto", "doublelife", "mirror", "allow_great", "abuse", "left_inclusive",
+                "right_inclusive"]
+INTEGER_KEYS = ["times", "appeals", "support", "score_id"]
+# Jobs in flight per worker, enough to keep workers busy without reading the whole input ahead
+JOBS_PER_WORKER = 4
+# Charts kept per worker, sweeps usually revisit a handful of charts many times
+CHART_CACHE_SIZE = 32
+
+_chart_cache = dict()
+
+
+def _parse_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "y")
+    return bool(value)
+
+
+def _split(value):
+    return value.replace(",", " ").split()
+
+
+def normalize_job(job, line_number):
+    """
+    Coerce a job read from JSONL or CSV into plain Python types. CSV values all arrive as strings.
+    """
+    job = {key: value for key, value in job.items() if value is not None and value != ""}
+    if "cards" not in job:
+        raise ValueError("Job on line {} has no cards".format(line_number))
+    if "score_id" not in job and "music_name" not in job:
+        raise ValueError("Job on line {} has neither score_id nor music_name".format(line_number))
+    job.setdefault("id", line_number)
+    if isinstance(job["cards"], str):
+        tokens = _split(job["cards"])
+        job["cards"] = [int(_) for _ in tokens] if all(_.isdigit() for _ in tokens) else " ".join(tokens)
+    if "pots" in job:
+        pots = _split(job["pots"]) if isinstance(job["pots"], str) else job["pots"]
+        if len(pots) != 5:
+            raise ValueError("Job on line {} needs 5 potentials, got {}".format(line_number, pots))
+        job["pots"] = [int(_) for _ in pots]
+    for key in BOOLEAN_KEYS:
+        if key in job:
+            job[key] = _parse_bool(job[key])
+    for key in INTEGER_KEYS:
+        if key in job:
+            job[key] = int(job[key])
+    if "autoplay_offset" in job:
+        job["autoplay_offset"] = float(job["autoplay_offset"])
+    return job
+
+
+def read_jobs(path):
+    """
+    Lazily read jobs from a .jsonl or .csv file, '-' reads JSONL from stdin.
+    """
+    if path == "-":
+        yield from _read_jsonl(sys.stdin)
+        return
+    with open(path, "r", newline="", encoding="utf-8") as fr:
+        if path.lower().endswith(".csv"):
+            for idx, row in enumerate(csv.DictReader(fr)):
+                yield normalize_job(row, idx + 1)
+        else:
+            yield from _read_jsonl(fr)
+
+
+def _read_jsonl(fr):
+    for idx, line in enumerate(fr):
+        if line.strip() == "":
+            continue
+        yield normalize_job(json.loads(line), idx + 1)
+
+
+def _get_live(job, grand):
+    from logic.grandlive import GrandLive
+    from logic.live import Live
+    from static.song_difficulty import Difficulty
+
+    difficulty = job.get("difficulty", "MASTER")
+    difficulty = Difficulty[difficulty.upper()] if isinstance(difficulty, str) and not difficulty.isdigit() \
+        else Difficulty(int(difficulty))
+    key = (job.get("score_id"), job.get("music_name"), difficulty, grand)
+    if key not in _chart_cache:
+        if len(_chart_cache) >= CHART_CACHE_SIZE:
+            _chart_cache.pop(next(iter(_chart_cache)))
+        live = GrandLive() if grand else Live()
+        live.set_music(music_name=job.get("music_name"), score_id=job.get("score_id"), difficulty=difficulty)
+        _chart_cache[key] = live
+    # Lives are mutable, every job works on its own copy of the loaded chart
+    return copy.deepcopy(_chart_cache[key])
+
+
+def _get_unit(job):
+    from logic.grandunit import GrandUnit
+    from logic.search import card_query
+    from logic.unit import Unit
+
+    cards = job["cards"]
+    if isinstance(cards, str):
+        cards = card_query.convert_short_name_to_id(cards)
+    pots = job.get("pots")
+    if len(cards) == 15:
+        return GrandUnit.from_list(cards, pots)
+    return Unit.from_list(cards, pots)
+
+
+def _summarize(result):
+    from simulator import SimulationResult
+
+    if isinstance(result, SimulationResult):
+        deltas = result.deltas
+        return {
+            "perfect_score": int(result.perfect_score),
+            "mean": int(result.base + np.round(deltas.mean())),
+            "median": int(result.base + np.round(np.median(deltas))),
+            "max": int(result.base + deltas.max()),
+            "min": int(result.base + deltas.min()),
+            "deviation": int(np.round(np.std(deltas))),
+            "full_roll_chance": float(result.full_roll_chance),
+            "abuse_score": int(result.abuse_score),
+            "fans": int(result.fans),
+            "total_appeal": int(result.total_appeal),
+            "total_life": int(result.total_life),
+        }
+    return {
+        "score": int(result.score),
+        "perfects": int(result.perfects),
+        "misses": int(result.misses),
+        "max_combo": int(result.max_combo),
+        "lowest_life": int(result.lowest_life),
+        "lowest_life_time": float(result.lowest_life_time),
+        "all_100": bool(result.all_100),
+        "total_appeal": int(result.total_appeal),
+        "total_life": int(result.total_life),
+    }
+
+
+def run_job(job):
+    """
+    Simulate a single normalized job.
+
+    :return: dict of result columns, with the error column set instead if the job could not be simulated
+    """
+    from simulator import Simulator
+
+    try:
+        unit = _get_unit(job)
+        live = _get_live(job, grand=len(unit.all_cards()) == 15)
+        live.set_unit(unit)
+        auto = job.get("auto", False)
+        sim = Simulator(live, special_offset=0.075 if auto else None,
+                        left_inclusive=job.get("left_inclusive", False),
+                        right_inclusive=job.get("right_inclusive", True))
+        if auto:
+            result = sim.simulate(appeals=job.get("appeals"), support=job.get("support"),
+                                  time_offset=job.get("autoplay_offset", 0), mirror=job.get("mirror", False),
+                                  perfect_only=not job.get("allow_great", False),
+                                  doublelife=job.get("doublelife", False), auto=True)
+        else:
+            result = sim.simulate(times=job.get("times", 100), appeals=job.get("appeals"),
+                                  support=job.get("support"), perfect_play=job.get("perfect_play", False),
+                                  doublelife=job.get("doublelife", False), abuse=job.get("abuse", False),
+                                  perfect_only=not job.get("allow_great", False))
+        summary = _summarize(result)
+    except Exception as e:
+        summary = {"error": "{}: {}".format(type(e).__name__, e)}
+    summary["id"] = job["id"]
+    return summary
+
+
+def run_jobs(jobs, workers=MAX_WORKERS, executor=None):
+    """
+    Simulate jobs across worker processes and yield their results in input order as soon as they are ready. At most
+    JOBS_PER_WORKER jobs per worker are read ahead, so the input can be arbitrarily large.
+
+    :param executor: executor to run the jobs on instead of a local process pool, e.g. a simulation server
+    """
+    if executor is None and workers <= 1:
+        yield from map(run_job, jobs)
+        return
+    own_executor = executor is None
+    if own_executor:
+        executor = get_process_pool(workers)
+    try:
+        pending = deque()
+        for job in jobs:
+            pending.append(executor.submit(run_job, job))
+            if len(pending) >= workers * JOBS_PER_WORKER:
+                yield pending.popleft().result()
+        while len(pending) > 0:
+            yield pending.popleft().result()
+    finally:
+        if own_executor:
+            executor.shutdown()
+
+
+class JsonlResultWriter:
+    def __init__(self, fw):
+        self.fw = fw
+
+    def write(self, row):
+        self.fw.write(json.dumps(row) + "\n")
+
+
+class CsvResultWriter:
+    def __init__(self, fw):
+        self.writer = csv.DictWriter(fw, fieldnames=RESULT_COLUMNS, extrasaction="ignore")
+        self.writer.writeheader()
+
+    def write(self, row):
+        self.writer.writerow(row)
+
+
+def _get_writer(fw, output_format):
+    if output_format == "csv":
+        return CsvResultWriter(fw)
+    return JsonlResultWriter(fw)
+
+
+def _run(args):
+    executor = None
+    if args.server is not None:
+        from simulation_server import RemoteExecutor
+        executor = RemoteExecutor(args.server, max_workers=args.workers)
+    results = run_jobs(read_jobs(args.jobs), workers=args.workers, executor=executor)
+    failed = 0
+    total = 0
+    fw = sys.stdout if args.output == "-" else open(args.output, "w", newline="", encoding="utf-8")
+    try:
+        writer = _get_writer(fw, args.format)
+        for total, row in enumerate(results, start=1):
+            writer.write(row)
+            if "error" in row:
+                failed += 1
+            if total % 100 == 0:
+                fw.flush()
+                logger.info("Simulated {} units".format(total))
+    finally:
+        if fw is not sys.stdout:
+            fw.close()
+        if executor is not None:
+            executor.shutdown()
+    logger.info("Simulated {} units, {} failed".format(total, failed))
+    return 0 if failed == 0 else 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="chihiro.py batch", description="Simulate units without the GUI.")
+    parser.add_argument("jobs", help="JSONL or CSV file of jobs, - for JSONL on stdin")
+    parser.add_argument("-o", "--output", default="-", help="result file, - for stdout")
+    parser.add_argument("-f", "--format", choices=["jsonl", "csv"], default=None,
+                        help="result format, guessed from the output file extension by default")
+    parser.add_argument("-w", "--workers", type=int, default=MAX_WORKERS, help="worker processes")
+    parser.add_argument("--server", default=None, help="simulate on the simulation server at this address")
+    parser.add_argument("--update", action="store_true", help="update the game databases before simulating")
+    args = parser.parse_args(argv)
+    if args.format is None:
+        args.format = "csv" if args.output.lower().endswith(".csv") else "jsonl"
+
+    if args.server is None:
+        import initializer
+        initializer.setup_headless(args.update)
+    return _run(args)
@@ -10,8 +10,34 @@ mutex = threading.Lock()
 class CustomDB(object):
 
     def __init__(self, path):
-        self._db_connection = sqlite3.connect(path, check_same_thread=False)
-        self._db_cur = self._db_connection.cursor()
+        """
+        :param path: path of the database, or a function returning it to only resolve the path and connect on first use
+        """
+        self._path = path
+        self._connection = None
+        self._cursor = None
+        self._connect_lock = threading.Lock()
+        if not callable(path):
+            self._connect()
+
+    def _connect(self):
+        with self._connect_lock:
+            if self._connection is None:
+                path = self._path() if callable(self._path) else self._path
+                self._connection = sqlite3.connect(str(path), check_same_thread=False)
+                self._cursor = self._connection.cursor()
+
+    @property
+    def _db_connection(self):
+        if self._connection is None:
+            self._connect()
+        return self._connection
+
+    @property
+    def _db_cur(self):
+        if self._cursor is None:
+            self._connect()
+        return self._cursor
 
     def __enter__(self):
         return self
@@ -56,6 +82,15 @@ class CustomDB(object):
         if not let_me_unlock:
             mutex.release()
 
+    def executemany(self, query, params):
+        mutex.acquire()
+        try:
+            self._db_cur.executemany(query, params)
+        except sqlite3.OperationalError as e:
+            mutex.release()
+            raise e
+        mutex.release()
+
     def commit(self):
         mutex.acquire()
         self._db_connection.commit()
@@ -65,5 +100,6 @@ class CustomDB(object):
         return self._db_connection
 
 
-masterdb = CustomDB(meta_updater.get_masterdb_path())
-cachedb = CustomDB(meta_updater.get_cachedb_path())
+# Connected on first query, so importing does not download master.db
+masterdb = CustomDB(meta_updater.get_masterdb_path)
+cachedb = CustomDB(meta_updater.get_cachedb_path)
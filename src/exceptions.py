@@ -4,3 +4,7 @@ class NoLiveFoundException(Exception):
 
 class InvalidUnit(Exception):
     pass
+
+
+class DownloadFailedException(Exception):
+    pass
@@ -1,3 +1,4 @@
+from gui.events.service.simulation_scheduler import PRIORITY_NORMAL
 from gui.events.utils.wrappers import BaseSimulationResultWithUuid
 
 
@@ -14,7 +15,8 @@ class SimulationEvent:
                  force_encore_amr_cache_to_encore_unit=False,
                  force_encore_magic_to_encore_unit=False,
                  allow_encore_magic_to_escape_max_agg=True,
-                 allow_great=False
+                 allow_great=False,
+                 priority=PRIORITY_NORMAL
                  ):
         self.uuid = uuid
         self.short_uuid = short_uuid
@@ -41,6 +43,7 @@ class SimulationEvent:
         self.force_encore_magic_to_encore_unit = force_encore_magic_to_encore_unit
         self.allow_encore_magic_to_escape_max_agg = allow_encore_magic_to_escape_max_agg
         self.allow_great = allow_great
+        self.priority = priority
 
 
 class DisplaySimulationResultEvent:
@@ -5,4 +5,9 @@ class PushCardIndexEvent:
 
 class ToggleQuickSearchOptionEvent:
     def __init__(self, option):
-        self.option = option
\ No newline at end of file
+        self.option = option
+
+
+class RefreshQuickSearchEvent:
+    def __init__(self, card_ids):
+        self.card_ids = card_ids
@@ -0,0 +1,216 @@
+"""
+Dedicated scheduler for simulations, separate from the shared thread pool so simulations are never dropped and never
+starve the other services.
+
+Jobs run on a process pool. Only as many jobs as there are workers are handed to the pool, the rest wait in a priority
+queue so they can still be reordered or cancelled. Every job belongs to a key, the unit uuid for the calculator: a new
+job for a key supersedes the previous one, and a job identical to the one already pending for its key is dropped.
+
+If SIMULATION_SERVER_HOST is set, jobs are sent to that simulation server instead of the local process pool.
+"""
+import heapq
+import itertools
+import threading
+
+import customlogger as logger
+from settings import SIMULATION_WORKERS, SIMULATION_SERVER_HOST
+from simulation_server import RemoteExecutor, get_cache_key
+from simulator import Simulator
+from utils.misc import get_process_pool
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+
+def run_simulation(event):
+    """
+    Run the simulation described by a SimulationEvent. Module level so it can be sent to a worker process.
+    """
+    event.live.set_unit(event.unit)
+    if event.autoplay:
+        logger.info("Simulation mode: Autoplay - {} - {}".format(event.short_uuid, event.unit))
+        sim = Simulator(event.live, special_offset=0.075,
+                        force_encore_amr_cache_to_encore_unit=event.force_encore_amr_cache_to_encore_unit,
+                        force_encore_magic_to_encore_unit=event.force_encore_magic_to_encore_unit,
+                        allow_encore_magic_to_escape_max_agg=event.allow_encore_magic_to_escape_max_agg,
+                        )
+        return sim.simulate(appeals=event.appeals, extra_bonus=event.extra_bonus, support=event.support,
+                            special_option=event.special_option, special_value=event.special_value,
+                            time_offset=event.autoplay_offset, mirror=event.mirror,
+                            perfect_only=not event.allow_great,
+                            doublelife=event.doublelife, auto=True)
+    if event.perfect_play:
+        logger.info("Simulation mode: Perfect - {} - {}".format(event.short_uuid, event.unit))
+    else:
+        logger.info("Simulation mode: Normal - {} - {}".format(event.short_uuid, event.unit))
+    sim = Simulator(event.live, left_inclusive=event.left_inclusive, right_inclusive=event.right_inclusive,
+                    force_encore_amr_cache_to_encore_unit=event.force_encore_amr_cache_to_encore_unit,
+                    force_encore_magic_to_encore_unit=event.force_encore_magic_to_encore_unit,
+                    allow_encore_magic_to_escape_max_agg=event.allow_encore_magic_to_escape_max_agg,
+                    )
+    return sim.simulate(perfect_play=event.perfect_play,
+                        times=event.times, appeals=event.appeals, extra_bonus=event.extra_bonus,
+                        support=event.support,
+                        special_option=event.special_option, special_value=event.special_value,
+                        doublelife=event.doublelife, abuse=event.theoretical_simulation,
+                        perfect_only=not event.allow_great,
+                        output=event.theoretical_simulation)
+
+
+class SchedulerProgress:
+    def __init__(self, queued, running, completed, dropped, submitted):
+        self.queued = queued
+        self.running = running
+        # Jobs whose result was delivered, or whose error was
+        self.completed = completed
+        # Jobs superseded or cancelled, whether they ran or not
+        self.dropped = dropped
+        self.submitted = submitted
+
+
+class _Job:
+    def __init__(self, key, fn, args, fingerprint, callback, error_callback):
+        self.key = key
+        self.fn = fn
+        self.args = args
+        self.fingerprint = fingerprint
+        self.callback = callback
+        self.error_callback = error_callback
+        self.cancelled = False
+
+
+class SimulationScheduler:
+    def __init__(self, max_workers=SIMULATION_WORKERS):
+        self.max_workers = max_workers
+        self.progress_callback = None
+        self._executor = None
+        self._lock = threading.Lock()
+        self._queue = list()
+        self._counter = itertools.count()
+        # Newest job of every key, queued or running
+        self._latest = dict()
+        self._running = 0
+        self._completed = 0
+        self._dropped = 0
+        self._submitted = 0
+
+    def _get_executor(self):
+        # Workers are only started on the first simulation
+        if self._executor is None and SIMULATION_SERVER_HOST is not None:
+            try:
+                self._executor = RemoteExecutor(SIMULATION_SERVER_HOST, max_workers=self.max_workers)
+                logger.info("Simulating on the server at {}".format(SIMULATION_SERVER_HOST))
+            except OSError as e:
+                logger.warning("Simulation server at {} unreachable, simulating locally: {}".format(
+                    SIMULATION_SERVER_HOST, e))
+        if self._executor is None:
+            self._executor = get_process_pool(self.max_workers)
+        return self._executor
+
+    def submit(self, key, fn, args, priority=PRIORITY_NORMAL, callback=None, error_callback=None):
+        """
+        Queue fn(*args). fn and args are sent to a worker process so they must be picklable.
+
+        :param key: jobs with the same key supersede each other, e.g. the uuid of the unit being simulated
+        :param callback: called with the result from a background thread, unless the job got superseded
+        :param error_callback: called with the exception from a background thread if fn raised
+        :return: False if an identical job was already pending for the key and nothing was queued
+        """
+        fingerprint = get_cache_key(fn, args)
+        with self._lock:
+            previous = self._latest.get(key)
+            if previous is not None and not previous.cancelled and previous.fingerprint == fingerprint:
+                logger.debug("Simulation for {} already pending, ignoring duplicate".format(key))
+                return False
+            if previous is not None:
+                self._drop(previous)
+            job = _Job(key, fn, args, fingerprint, callback, error_callback)
+            self._latest[key] = job
+            heapq.heappush(self._queue, (priority, next(self._counter), job))
+            self._submitted += 1
+            started = self._dispatch()
+        self._watch(started)
+        self._report_progress()
+        return True
+
+    def cancel(self, key):
+        """
+        Cancel the pending job of key. A job already running on a worker finishes, but its result is dropped.
+        """
+        with self._lock:
+            job = self._latest.pop(key, None)
+            if job is not None:
+                self._drop(job)
+        self._report_progress()
+
+    def cancel_all(self):
+        with self._lock:
+            for job in self._latest.values():
+                self._drop(job)
+            self._latest.clear()
+            self._queue.clear()
+        self._report_progress()
+
+    def _drop(self, job):
+        # Called with the lock held
+        if not job.cancelled:
+            job.cancelled = True
+            self._dropped += 1
+
+    def _dispatch(self):
+        # Called with the lock held, the caller watches the started jobs once it released the lock
+        started = list()
+        while self._running < self.max_workers and len(self._queue) > 0:
+            _, _, job = heapq.heappop(self._queue)
+            if job.cancelled:
+                continue
+            self._running += 1
+            started.append((job, self._get_executor().submit(job.fn, *job.args)))
+        return started
+
+    def _watch(self, started):
+        # A future that is already done runs its callback right away, so this must not hold the lock
+        for job, future in started:
+            future.add_done_callback(lambda f, j=job: self._on_done(j, f))
+
+    def _on_done(self, job, future):
+        with self._lock:
+            self._running -= 1
+            if not job.cancelled:
+                self._completed += 1
+            if self._latest.get(job.key) is job:
+                self._latest.pop(job.key)
+            started = self._dispatch()
+        self._watch(started)
+        self._report_progress()
+        if job.cancelled:
+            logger.debug("Dropping result of superseded simulation for {}".format(job.key))
+            return
+        try:
+            result = future.result()
+        except Exception as e:
+            logger.error("Simulation for {} failed: {}".format(job.key, e))
+            if job.error_callback is not None:
+                job.error_callback(e)
+            return
+        if job.callback is not None:
+            job.callback(result)
+
+    def get_progress(self):
+        with self._lock:
+            queued = sum(1 for _, _, job in self._queue if not job.cancelled)
+            return SchedulerProgress(queued, self._running, self._completed, self._dropped, self._submitted)
+
+    def _report_progress(self):
+        if self.progress_callback is not None:
+            self.progress_callback(self.get_progress())
+
+    def shutdown(self):
+        self.cancel_all()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+scheduler = SimulationScheduler()
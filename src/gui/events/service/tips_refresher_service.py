@@ -1,17 +1,16 @@
-import random
-from time import sleep, time
-
-from PyQt5.QtCore import QRunnable, pyqtSlot
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal, pyqtSlot
 
 from gui.events.state_change_events import SetTipTextEvent, InjectTextEvent
 from gui.events.utils import eventbus
 from gui.events.utils.eventbus import subscribe
-from gui.events.utils.threadpool import threadpool
 
 DELAY_SECS = 15
 
 
-class TipRefresherService(QRunnable):
+class TipRefresherService(QObject):
+    # Injected text can come from any thread, the timer must only be touched from the UI thread
+    inject_signal = pyqtSignal(str, float)
+
     TIPS = {
         "Tip: You can use Ctrl/Alt + 1/2/3/... in the quicksearch bar to quickly send cards to the simulator.",
         "Tip: Select a unit then press Ctrl + D or Ctrl + Shift + D to clone it.",
@@ -37,24 +36,22 @@ class TipRefresherService(QRunnable):
     def __init__(self):
         super().__init__()
         self.current_tip = None
-        self.scheduled_time = time()
-        self.running = True
         self.current_tips = self.TIPS.copy()
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.display_next_tip)
+        self.inject_signal.connect(self._inject_message)
         eventbus.eventbus.register(self)
 
-    @pyqtSlot()
-    def run(self):
-        self.set_timer(10)
+    def start(self):
         eventbus.eventbus.post(SetTipTextEvent("You can see various tips on how to use the tool here."))
-        self.schedule_tip_display()
+        self.set_timer(10)
 
-    def schedule_tip_display(self):
-        while self.running:
-            sleep(0.2)
-            if time() >= self.scheduled_time:
-                self.select_next_tip()
-                self.send_to_view()
-                self.set_timer(DELAY_SECS)
+    @pyqtSlot()
+    def display_next_tip(self):
+        self.select_next_tip()
+        self.send_to_view()
+        self.set_timer(DELAY_SECS)
 
     def select_next_tip(self):
         if len(self.current_tips) == 0:
@@ -65,23 +62,32 @@ class TipRefresherService(QRunnable):
         eventbus.eventbus.post(SetTipTextEvent(self.current_tip))
 
     def set_timer(self, offset):
-        self.scheduled_time = time() + offset
+        self.timer.start(int(offset * 1000))
 
     def disable(self):
-        self.running = False
+        self.timer.stop()
 
     @subscribe(InjectTextEvent)
     def inject_message(self, event):
-        self.set_timer(event.offset)
-        eventbus.eventbus.post(SetTipTextEvent(event.text))
+        self.inject_signal.emit(event.text, event.offset)
+
+    @pyqtSlot(str, float)
+    def _inject_message(self, text, offset):
+        self.set_timer(offset)
+        eventbus.eventbus.post(SetTipTextEvent(text))
 
 
-__service = TipRefresherService()
+# Created on start, a QTimer needs the application to exist
+__service = None
 
 
 def start_tip_refresher_service():
-    threadpool.start(__service)
+    global __service
+    if __service is None:
+        __service = TipRefresherService()
+    __service.start()
 
 
 def kill_tip_refresher_service():
-    __service.disable()
+    if __service is not None:
+        __service.disable()
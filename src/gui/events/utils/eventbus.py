@@ -1,64 +1,93 @@
+import threading
+import types
+
 from PyQt5.QtCore import QRunnable, pyqtSlot
 
 from gui.events.utils.threadpool import threadpool
 
 
 class MyRunnable(QRunnable):
-    def __init__(self, subscriber, registrant, posted_event):
+    def __init__(self, handler, posted_event):
         super().__init__()
-        self.subscriber = subscriber
-        self.registrant = registrant
+        self.handler = handler
         self.posted_event = posted_event
 
     @pyqtSlot()
     def run(self):
-        self.subscriber(self.registrant, self.posted_event)
+        self.handler(self.posted_event)
 
 
 class AsyncEventBus:
     _registrants = list()
     _subscribers = dict()
+    # Event class -> subscribers in subscription order
+    _subscribers_by_event = dict()
+    # Event class -> handlers bound to their registrants, rebuilt whenever a subscriber or registrant comes or goes
+    _dispatch = dict()
+    _lock = threading.Lock()
 
     # Singleton it
     def __init__(self):
         pass
 
+    def _rebuild(self, event):
+        handlers = [
+            types.MethodType(subscriber, registrant)
+            for subscriber in self._subscribers_by_event.get(event, list())
+            for registrant in self._registrants
+            if hasattr(type(registrant), subscriber.__name__)
+        ]
+        # Replaced rather than mutated so posts running on other threads keep a consistent list
+        if len(handlers) > 0:
+            self._dispatch[event] = handlers
+        else:
+            self._dispatch.pop(event, None)
+
+    def _rebuild_all(self):
+        for event in self._subscribers_by_event:
+            self._rebuild(event)
+
     def post(self, posted_event, high_priority=False, asynchronous=False):
-        subscribed = {key: value for (key, value) in self._subscribers.items() if value == posted_event.__class__}
-        for subscriber in subscribed:
-            registrants = filter(lambda r: subscriber.__name__ in dir(r), self._registrants)
-            for registrant in registrants:
-                # Just outright drop it if full and not high priority
-                if asynchronous:
-                    if high_priority:
-                        threadpool.start(MyRunnable(subscriber, registrant, posted_event))
-                    else:
-                        threadpool.tryStart(MyRunnable(subscriber, registrant, posted_event))
+        for handler in self._dispatch.get(posted_event.__class__, tuple()):
+            # Just outright drop it if full and not high priority
+            if asynchronous:
+                if high_priority:
+                    threadpool.start(MyRunnable(handler, posted_event))
                 else:
-                    subscriber(registrant, posted_event)
+                    threadpool.tryStart(MyRunnable(handler, posted_event))
+            else:
+                handler(posted_event)
 
     # Only synchronous, for small operations
     def post_and_get_first(self, posted_event, required_non_none=False):
-        subscribed = {key: value for (key, value) in self._subscribers.items() if value == posted_event.__class__}
-        for subscriber in subscribed:
-            registrants = filter(lambda r: subscriber.__name__ in dir(r), self._registrants)
-            for registrant in registrants:
-                res = subscriber(registrant, posted_event)
-                if required_non_none and res is not None or not required_non_none:
-                    return res
+        for handler in self._dispatch.get(posted_event.__class__, tuple()):
+            res = handler(posted_event)
+            if required_non_none and res is not None or not required_non_none:
+                return res
         return None
 
     def register(self, registrant):
-        self._registrants.append(registrant)
+        with self._lock:
+            self._registrants.append(registrant)
+            self._rebuild_all()
 
     def unregister(self, registrant):
-        try:
-            self._registrants.remove(registrant)
-        except ValueError:
-            pass
+        with self._lock:
+            try:
+                self._registrants.remove(registrant)
+            except ValueError:
+                return
+            self._rebuild_all()
 
     def subscribe(self, subscriber, event):
-        self._subscribers[subscriber] = event
+        with self._lock:
+            previous_event = self._subscribers.get(subscriber)
+            if previous_event is not None:
+                self._subscribers_by_event[previous_event].remove(subscriber)
+                self._rebuild(previous_event)
+            self._subscribers[subscriber] = event
+            self._subscribers_by_event.setdefault(event, list()).append(subscriber)
+            self._rebuild(event)
 
 
 eventbus = AsyncEventBus()
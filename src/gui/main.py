@@ -7,6 +7,7 @@ import customlogger as logger
 from chihiro import ROOT_DIR
 from gui.events.calculator_view_events import ToggleUnitLockingOptionsVisibilityEvent
 from gui.events.chart_viewer_events import PopupChartViewerEvent
+from gui.events.service.simulation_scheduler import scheduler
 from gui.events.service.tips_refresher_service import kill_tip_refresher_service
 from gui.events.state_change_events import ShutdownTriggeredEvent, BackupFlagsEvent
 from gui.events.utils import eventbus
@@ -18,7 +19,6 @@ from gui.viewmodels.song import SongView, SongModel
 from gui.viewmodels.tips_view import TipView
 from gui.viewmodels.unit import UnitView, UnitModel
 from logic.profile import profile_manager, unit_storage
-from logic.search import indexer, search_engine
 
 
 class CustomMainWindow(QMainWindow):
@@ -44,7 +44,7 @@ class CustomMainWindow(QMainWindow):
             for r_idx in range(self.ui.unit_view.widget.count()):
                 widget = self.ui.unit_view.widget.itemWidget(self.ui.unit_view.widget.item(r_idx))
                 widget.update_unit()
-            profile_manager.cleanup()
+            profile_manager.pm.export_csv()
 
     def closeEvent(self, event):
         eventbus.eventbus.post(ShutdownTriggeredEvent())
@@ -142,8 +142,6 @@ class UiMainWindow:
         self.card_model = CardModel(self.card_view)
         self.card_view.set_model(self.card_model)
         self.card_model.initialize_cards()
-        self.card_view.initialize_pics()
-        self.card_view.connect_cell_change()
         self.card_layout.addWidget(self.card_view.widget)
 
         # Need card view
@@ -199,9 +197,6 @@ class UiMainWindow:
         if updated_card_ids is None:
             self.card_view.connect_cell_change()
             return
-        indexer.im.initialize_index_db(updated_card_ids)
-        indexer.im.reindex(updated_card_ids)
-        search_engine.engine.refresh_searcher()
         self.card_model.initialize_cards(updated_card_ids)
         self.card_view.connect_cell_change()
 
@@ -216,6 +211,7 @@ class UiMainWindow:
 def cleanup():
     logger.info("Waiting for all threads to finish...")
     kill_tip_refresher_service()
+    scheduler.shutdown()
 
 
 def setup_gui(*args):
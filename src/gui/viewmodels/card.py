@@ -1,6 +1,6 @@
 from PyQt5.QtCore import QSize, QMimeData, Qt, QPoint
 from PyQt5.QtGui import QDrag, QPixmap, QPainter, QColor
-from PyQt5.QtWidgets import QTableWidget, QTableWidgetItem, QComboBox, QAbstractItemView, QApplication
+from PyQt5.QtWidgets import QTableView, QComboBox, QAbstractItemView, QApplication
 
 import customlogger as logger
 from db import db
@@ -10,16 +10,91 @@ from gui.events.state_change_events import PotentialUpdatedEvent
 from gui.events.utils import eventbus
 from gui.events.utils.eventbus import subscribe
 from gui.viewmodels.mime_headers import CARD
-from gui.viewmodels.utils import ImageWidget, NumericalTableWidgetItem
+from gui.viewmodels.utils import ColumnarTableModel, pixmap_from_rgba
 from logic.live import Live
 from logic.profile import card_storage
 from network import meta_updater
-from settings import IMAGE_PATH64, IMAGE_PATH, IMAGE_PATH32
+from network.image_updater import THUMBNAIL_SIZES
+from settings import IMAGE_PATH, IMAGE_ATLAS_PATH
 from static.color import CARD_GUI_COLORS
 from static.skill import SKILL_COLOR_BY_NAME
-
-
-class CustomCardTable(QTableWidget):
+from utils import atlas
+
+
+class CardTableModel(ColumnarTableModel):
+    OWNED_COLUMN = 3
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.icon_loader = None
+        self.icons = dict()
+        self.highlighted_charas = set()
+        self.edit_handler = None
+        self.edits_enabled = True
+
+    def set_icon_loader(self, icon_loader):
+        self.icon_loader = icon_loader
+        self.icons = dict()
+        if self.rowCount() > 0:
+            self.dataChanged.emit(self.index(0, 1), self.index(self.rowCount() - 1, 1))
+
+    def get_icon(self, card_id):
+        # Only rows the view paints ask for their icon, so only visible icons are ever created
+        if self.icon_loader is None:
+            return None
+        if card_id not in self.icons:
+            self.icons[card_id] = self.icon_loader(card_id)
+        return self.icons[card_id]
+
+    def set_highlighted_charas(self, charas):
+        self.highlighted_charas = charas
+        if self.rowCount() > 0:
+            self.dataChanged.emit(self.index(0, 4), self.index(self.rowCount() - 1, 4))
+
+    def get_display(self, row, column):
+        if column == 0:
+            return str(row + 1)
+        return super().get_display(row, column)
+
+    def get_decoration(self, row, column):
+        if column != 1:
+            return None
+        return self.get_icon(self.get_id(row))
+
+    def get_background(self, row, column):
+        key = self.keys[column]
+        if key == 'Skill':
+            value = self.get_value(row, key)
+            if value is not None:
+                return QColor(*SKILL_COLOR_BY_NAME[value], 135)
+        elif key == 'Color':
+            value = self.get_value(row, key)
+            if value is not None:
+                return QColor(*CARD_GUI_COLORS[value], 100)
+        elif key == 'Name' and self.get_value(row, 'Character') in self.highlighted_charas:
+            return QColor(50, 100, 100, 80)
+        return None
+
+    def flags(self, index):
+        flags = super().flags(index)
+        if index.isValid():
+            flags |= Qt.ItemIsDragEnabled
+            if index.column() == self.OWNED_COLUMN and self.edits_enabled:
+                flags |= Qt.ItemIsEditable
+        return flags
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.EditRole or index.column() != self.OWNED_COLUMN or self.edit_handler is None:
+            return False
+        new_value = self.edit_handler(self.get_id(index.row()), value)
+        if new_value is None:
+            return False
+        self.columns[self.keys[index.column()]][self.get_source_row(index.row())] = new_value
+        self.dataChanged.emit(index, index)
+        return True
+
+
+class CustomCardTable(QTableView):
     def __init__(self, *args):
         super().__init__(*args)
 
@@ -27,23 +102,25 @@ class CustomCardTable(QTableWidget):
         super().mousePressEvent(event)
         if event.button() == Qt.LeftButton:
             self.drag_start_position = event.pos()
-            self.selected = self.selectedItems()
+            self.selected = self.selectedIndexes()
 
     def mouseMoveEvent(self, event):
         if not (event.buttons() & Qt.LeftButton):
             return
         if (event.pos() - self.drag_start_position).manhattanLength() < QApplication.startDragDistance():
             return
-        if self.selectedItems():
-            self.selected = self.selectedItems()
+        if self.selectedIndexes():
+            self.selected = self.selectedIndexes()
         if not self.selected:
             return
         drag = QDrag(self)
-        card_row = self.row(self.selected[0])
-        card_id = self.item(card_row, 2).text()
-        card_img = self.cellWidget(card_row, 1).picture
+        card_row = self.selected[0].row()
+        card_id = self.model().get_id(card_row)
+        card_img = self.model().get_icon(card_id)
+        if card_img is None:
+            card_img = QPixmap(0, 0)
         mimedata = QMimeData()
-        mimedata.setText(CARD + card_id)
+        mimedata.setText(CARD + str(card_id))
         pixmap = QPixmap(card_img.size())
         painter = QPainter(pixmap)
         painter.drawPixmap(0, 0, card_img)
@@ -58,11 +135,14 @@ class CardView:
 
     def __init__(self, main):
         self.widget = CustomCardTable(main)
+        self.table_model = CardTableModel(self.widget)
+        self.widget.setModel(self.table_model)
         self.widget.setVerticalScrollMode(1)  # Smooth scroll
         self.widget.setHorizontalScrollMode(1)  # Smooth scroll
         self.widget.setDragEnabled(True)
         self.widget.setSelectionMode(QAbstractItemView.SingleSelection)
         self.widget.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.widget.horizontalHeader().setSortIndicator(0, Qt.AscendingOrder)
         self.widget.setSortingEnabled(True)
         self.widget.verticalHeader().setVisible(False)
         self.model = None
@@ -70,18 +150,13 @@ class CardView:
 
     def set_model(self, model):
         self.model = model
+        self.table_model.edit_handler = self.model.handle_owned_change
 
     def connect_cell_change(self):
-        self.widget.cellChanged.connect(lambda r, c: self.model.handle_cell_change(r, c))
+        self.table_model.edits_enabled = True
 
     def disconnect_cell_change(self):
-        self.widget.cellChanged.disconnect()
-
-    def initialize_pics(self):
-        for r_idx in range(self.widget.rowCount()):
-            image = ImageWidget(None, self.widget)
-            self.widget.setCellWidget(r_idx, 1, image)
-        self.connect_cell_change()
+        self.table_model.edits_enabled = False
 
     def toggle_auto_resize(self, on=False):
         if on:
@@ -94,77 +169,37 @@ class CardView:
 
     def load_data(self, data, card_list=None):
         if card_list is None:
-            self.widget.setColumnCount(len(data[0]) + 2)
+            keys = list(data[0].keys())
+            self.table_model.set_records(['#', ''] + keys, [None, None] + keys, data, 'ID')
             self.widget.horizontalHeader().setSectionResizeMode(1, 2)  # Not allow change icon column size
-            self.widget.setRowCount(len(data))
-            self.widget.setHorizontalHeaderLabels(['#', ''] + list(data[0].keys()))
-            rows = range(len(data))
         else:
-            data_dict = {int(_['ID']): _ for _ in data}
-            rows = dict()
-            for r_idx in range(self.widget.rowCount()):
-                card_id = int(self.widget.item(r_idx, 2).text())
-                if card_id not in data_dict:
-                    continue
-                else:
-                    rows[card_id] = r_idx
-            rows = [rows[card_id] for card_id in map(int, card_list)]
-            data = [data_dict[card_id] for card_id in map(int, card_list)]
-
-        # Turn off sorting to avoid indices changing mid-update
-        self.widget.setSortingEnabled(False)
-        for r_idx, card_data in zip(rows, data):
-            row_count_item = NumericalTableWidgetItem(r_idx + 1)
-            row_count_item.setFlags(row_count_item.flags() & ~Qt.ItemIsEditable)
-            self.widget.setItem(r_idx, 0, row_count_item)
-            for c_idx, (key, value) in enumerate(card_data.items()):
-                if isinstance(value, int):
-                    item = NumericalTableWidgetItem(value)
-                elif value is None:
-                    item = QTableWidgetItem("")
-                else:
-                    item = QTableWidgetItem(str(value))
-                if c_idx != 1:
-                    item.setFlags(item.flags() & ~Qt.ItemIsEditable)
-                else:
-                    item = QTableWidgetItem()
-                    item.setData(Qt.EditRole, value)
-                if key == 'Skill' and value is not None:
-                    item.setBackground(QColor(*SKILL_COLOR_BY_NAME[value], 135))
-                if key == 'Color' and value is not None:
-                    item.setBackground(QColor(*CARD_GUI_COLORS[value], 100))
-                self.widget.setItem(r_idx, c_idx + 2, item)
+            self.table_model.update_records(data)
         logger.info("Loaded {} cards".format(len(data)))
-        self.widget.setSortingEnabled(True)
         # Turn on auto fit once to make it look better then turn it off to render faster during resize
         self.toggle_auto_resize(card_list is None)
 
     def show_only_ids(self, card_ids):
-        if not card_ids:
-            card_ids = set()
-        else:
-            card_ids = set(card_ids)
-        count = 1
-        for r_idx in range(self.widget.rowCount()):
-            if int(self.widget.item(r_idx, 2).text()) in card_ids:
-                self.widget.setRowHidden(r_idx, False)
-                self.widget.item(r_idx, 0).setData(2, str(count))
-                count += 1
-            else:
-                self.widget.setRowHidden(r_idx, True)
+        self.table_model.set_visible_ids(card_ids)
         self.refresh_spacing()
 
+    def get_card_id(self, row):
+        if row >= self.table_model.rowCount():
+            return None
+        return self.table_model.get_id(row)
+
+    def highlight_charas(self, charas):
+        self.table_model.set_highlighted_charas(charas)
+
     def draw_icons(self, icons, size):
+        """
+        :param icons: callable returning the QPixmap of a card id, None to remove the icons
+        """
         if size is None:
             self.size = 20
         else:
             self.size = size
-        for r_idx in range(self.widget.rowCount()):
-            if icons:
-                card_id = self.widget.item(r_idx, 2).text()
-                self.widget.cellWidget(r_idx, 1).set_path(icons[card_id])
-            else:
-                self.widget.cellWidget(r_idx, 1).set_path(None)
+        self.widget.setIconSize(QSize(self.size, self.size))
+        self.table_model.set_icon_loader(icons)
         self.refresh_spacing()
 
     def refresh_spacing(self):
@@ -177,27 +212,36 @@ class CardModel:
     def __init__(self, view):
         assert isinstance(view, CardView)
         self.view = view
-        self.images = dict()
+        self.atlas = None
+        self.size = None
         self.owned = dict()
         eventbus.eventbus.register(self)
 
     def load_images(self, size=None):
         logger.info("Card list thumbnail size: {}".format(size))
+        if self.atlas is not None:
+            self.atlas.close()
+            self.atlas = None
+        self.size = size
         if size is None:
-            self.images = dict()
             self.view.draw_icons(None, size)
             return
-        if size is not None:
-            assert size == 32 or size == 64 or size == 124
-            if size == 32:
-                path = IMAGE_PATH32
-            elif size == 64:
-                path = IMAGE_PATH64
-            elif size == 124:
-                path = IMAGE_PATH
-            for image_path in path.iterdir():
-                self.images[image_path.name.split(".")[0]] = image_path
-            self.view.draw_icons(self.images, size)
+        assert size == 32 or size == 64 or size == 124
+        if size in THUMBNAIL_SIZES:
+            self.atlas = atlas.Atlas(IMAGE_ATLAS_PATH, size)
+        self.view.draw_icons(self.get_icon, size)
+
+    def get_icon(self, card_id):
+        if self.atlas is not None and card_id in self.atlas:
+            return pixmap_from_rgba(self.atlas.get_tile(card_id), self.size)
+        # Not packed yet, fall back to the loose image files
+        if self.size == 124:
+            path = IMAGE_PATH / "{:06d}.png".format(card_id)
+        else:
+            path = THUMBNAIL_SIZES[self.size] / "{:06d}.jpg".format(card_id)
+        if not path.exists():
+            return None
+        return QPixmap(str(path))
 
     @subscribe(PotentialUpdatedEvent)
     def initialize_cards_from_event(self, event: PotentialUpdatedEvent):
@@ -244,56 +288,37 @@ class CardModel:
             self.owned[int(card['ID'])] = int(card['Owned'])
         self.view.load_data(data, card_list)
 
-    def handle_cell_change(self, r_idx, c_idx):
-        if c_idx != 3:
-            return
-        card_id = int(self.view.widget.item(r_idx, 2).text())
-        new_value = self.view.widget.item(r_idx, c_idx).text()
-        if str(self.owned[card_id]) == new_value:
-            return
+    def handle_owned_change(self, card_id, new_value):
+        """
+        :return: the value to store, None to reject the edit
+        """
+        if str(self.owned[card_id]) == str(new_value):
+            return None
         try:
             new_value = int(new_value)
             assert new_value >= 0
         except:
             logger.error("Owned value {} invalid for card ID {}".format(new_value, card_id))
-            # Revert value
-            self.view.disconnect_cell_change()
-            self.view.widget.item(r_idx, c_idx).setData(2, self.owned[card_id])
-            self.view.connect_cell_change()
-            return
+            return None
         self.owned[card_id] = new_value
-        card_storage.update_owned_cards(card_id, new_value)
+        card_storage.update_owned_cards(card_id, new_value, deferred=True)
+        return new_value
 
     @subscribe(PushCardIndexEvent)
     def push_card(self, event: PushCardIndexEvent):
         idx = event.idx
         skip_guest_push = event.skip_guest_push
-        count = 0
-        cell_widget = None
-        for row in range(self.view.widget.rowCount()):
-            if self.view.widget.isRowHidden(row):
-                continue
-            if count == idx:
-                cell_widget = self.view.widget.item(row, 2)
-                break
-            else:
-                count += 1
-        if cell_widget is None:
+        card_id = self.view.get_card_id(idx)
+        if card_id is None:
             logger.info("No card at index {}".format(idx))
             return
-        eventbus.eventbus.post(PushCardEvent(int(cell_widget.text()), skip_guest_push))
+        eventbus.eventbus.post(PushCardEvent(int(card_id), skip_guest_push))
 
     def highlight_event_cards(self, checked):
-        highlight_set = Live.static_get_chara_bonus_set(get_name=True)
-        for r_idx in range(self.view.widget.rowCount()):
-            if self.view.widget.item(r_idx, 5).text() not in highlight_set:
-                continue
-            for c_idx in range(4, 5):
-                item = self.view.widget.item(r_idx, c_idx)
-                if checked:
-                    item.setBackground(QColor(50, 100, 100, 80))
-                else:
-                    item.setBackground(QColor(0, 0, 0, 0))
+        if checked:
+            self.view.highlight_charas(Live.static_get_chara_bonus_set(get_name=True))
+        else:
+            self.view.highlight_charas(set())
 
 
 class IconLoaderView:
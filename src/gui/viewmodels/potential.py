@@ -121,8 +121,6 @@ class PotentialModel:
         # Swap dance / visual
         pots[1] = self.potentials[chara_id][2]
         pots[2] = self.potentials[chara_id][1]
-        potential.update_potential(chara_id=chara_id, pots=pots)
-        card_ids = db.cachedb.execute_and_fetchall("SELECT id FROM card_data_cache WHERE chara_id = ?", [chara_id])
-        card_ids = [_[0] for _ in card_ids]
+        card_ids = potential.update_potential(chara_id=chara_id, pots=pots)
         eventbus.eventbus.post(PotentialUpdatedEvent(card_ids))
         self.view.update_total(r_idx, sum(pots))
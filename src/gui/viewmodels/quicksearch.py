@@ -1,11 +1,12 @@
-from PyQt5.QtCore import QSize, Qt
+from PyQt5.QtCore import QObject, QSize, Qt, pyqtSignal
 from PyQt5.QtWidgets import QCheckBox, QLineEdit, QApplication
 
 import customlogger as logger
-from gui.events.quicksearch_events import PushCardIndexEvent, ToggleQuickSearchOptionEvent
+from gui.events.quicksearch_events import PushCardIndexEvent, RefreshQuickSearchEvent, \
+    ToggleQuickSearchOptionEvent
 from gui.events.utils import eventbus
 from gui.events.utils.eventbus import subscribe
-from logic.search import search_engine
+from logic.search import indexer, search_engine
 
 
 class ShortcutQuickSearchWidget(QLineEdit):
@@ -66,11 +67,19 @@ class QuickSearchView:
         self.widget.setFocus()
 
 
+class _RefreshSignal(QObject):
+    refresh = pyqtSignal()
+
+
 class QuickSearchModel:
     def __init__(self, view, card_view):
         self.view = view
         self._card_view = card_view
         self.options = dict()
+        # Refreshes are posted from the reindex thread, the signal brings them back to the UI thread
+        self._refresh_signal = _RefreshSignal()
+        self._refresh_signal.refresh.connect(lambda: self.call_searchengine(self.view.widget.text().strip()))
+        indexer.im.reindex_callback = lambda card_ids: eventbus.eventbus.post(RefreshQuickSearchEvent(card_ids))
         eventbus.eventbus.register(self)
 
     def call_searchengine(self, query):
@@ -113,6 +122,10 @@ class QuickSearchModel:
     def toggle_option(self, event: ToggleQuickSearchOptionEvent):
         self.options[event.option].nextCheckState()
 
+    @subscribe(RefreshQuickSearchEvent)
+    def refresh_results(self, event: RefreshQuickSearchEvent):
+        self._refresh_signal.refresh.emit()
+
 
 class SongShortcutQuickSearchWidget(ShortcutQuickSearchWidget):
     def keyPressEvent(self, event):
@@ -10,6 +10,7 @@ from exceptions import InvalidUnit
 from gui.events.calculator_view_events import GetAllCardsEvent, SimulationEvent, DisplaySimulationResultEvent, \
     AddEmptyUnitEvent, YoinkUnitEvent, PushCardEvent, ContextAwarePushCardEvent, TurnOffRunningLabelFromUuidEvent
 from gui.events.chart_viewer_events import HookAbuseToChartViewerEvent
+from gui.events.service.simulation_scheduler import scheduler, run_simulation, PRIORITY_HIGH, PRIORITY_NORMAL
 from gui.events.song_view_events import GetSongDetailsEvent
 from gui.events.state_change_events import PostYoinkEvent, InjectTextEvent
 from gui.events.utils import eventbus
@@ -31,7 +32,7 @@ from logic.grandunit import GrandUnit
 from logic.live import Live
 from logic.unit import Unit
 from network.api_client import get_top_build
-from simulator import Simulator, SimulationResult
+from simulator import SimulationResult
 
 
 class MainView:
@@ -221,6 +222,8 @@ class MainModel(QObject):
 
     process_simulation_results_signal = pyqtSignal(BaseSimulationResultWithUuid)
     process_yoink_results_signal = pyqtSignal(YoinkResults)
+    simulation_failed_signal = pyqtSignal(object)
+    simulation_progress_signal = pyqtSignal(object)
 
     def __init__(self, view, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -228,6 +231,11 @@ class MainModel(QObject):
         eventbus.eventbus.register(self)
         self.process_simulation_results_signal.connect(lambda payload: self.process_results(payload))
         self.process_yoink_results_signal.connect(lambda payload: self._handle_yoink_done_signal(payload))
+        # The scheduler calls back from its own threads, the signals bring everything back to the UI thread
+        self.simulation_failed_signal.connect(
+            lambda uuid: eventbus.eventbus.post_and_get_first(TurnOffRunningLabelFromUuidEvent(uuid)))
+        self.simulation_progress_signal.connect(lambda progress: self._display_simulation_progress(progress))
+        scheduler.progress_callback = self.simulation_progress_signal.emit
 
     def simulate_internal(self, perfect_play, left_inclusive, right_inclusive, theoretical_simulation, score_id,
                           diff_id, times, all_cards,
@@ -314,9 +322,10 @@ class MainModel(QObject):
                                 force_encore_amr_cache_to_encore_unit,
                                 force_encore_magic_to_encore_unit,
                                 allow_encore_magic_to_escape_max_agg,
-                                allow_great
-                                ),
-                high_priority=True, asynchronous=True)
+                                allow_great,
+                                # Re-simulating a single unit jumps ahead of a full table run
+                                PRIORITY_HIGH if row is not None else PRIORITY_NORMAL
+                                ))
 
     @pyqtSlot(BaseSimulationResultWithUuid)
     def process_results(self, payload: BaseSimulationResultWithUuid):
@@ -330,38 +339,19 @@ class MainModel(QObject):
 
     @subscribe(SimulationEvent)
     def handle_simulation_request(self, event: SimulationEvent):
-        event.live.set_unit(event.unit)
-        if event.autoplay:
-            logger.info("Simulation mode: Autoplay - {} - {}".format(event.short_uuid, event.unit))
-            sim = Simulator(event.live, special_offset=0.075,
-                            force_encore_amr_cache_to_encore_unit=event.force_encore_amr_cache_to_encore_unit,
-                            force_encore_magic_to_encore_unit=event.force_encore_magic_to_encore_unit,
-                            allow_encore_magic_to_escape_max_agg=event.allow_encore_magic_to_escape_max_agg,
-                            )
-            result = sim.simulate(appeals=event.appeals, extra_bonus=event.extra_bonus, support=event.support,
-                                  special_option=event.special_option, special_value=event.special_value,
-                                  time_offset=event.autoplay_offset, mirror=event.mirror,
-                                  perfect_only=not event.allow_great,
-                                  doublelife=event.doublelife, auto=True)
-        else:
-            if event.perfect_play:
-                logger.info("Simulation mode: Perfect - {} - {}".format(event.short_uuid, event.unit))
-            else:
-                logger.info("Simulation mode: Normal - {} - {}".format(event.short_uuid, event.unit))
-            sim = Simulator(event.live, left_inclusive=event.left_inclusive, right_inclusive=event.right_inclusive,
-                            force_encore_amr_cache_to_encore_unit=event.force_encore_amr_cache_to_encore_unit,
-                            force_encore_magic_to_encore_unit=event.force_encore_magic_to_encore_unit,
-                            allow_encore_magic_to_escape_max_agg=event.allow_encore_magic_to_escape_max_agg,
-                            )
-            result = sim.simulate(perfect_play=event.perfect_play,
-                                  times=event.times, appeals=event.appeals, extra_bonus=event.extra_bonus,
-                                  support=event.support,
-                                  special_option=event.special_option, special_value=event.special_value,
-                                  doublelife=event.doublelife, abuse=event.theoretical_simulation,
-                                  perfect_only=not event.allow_great,
-                                  output=event.theoretical_simulation)
-        self.process_simulation_results_signal.emit(
-            BaseSimulationResultWithUuid(event.uuid, event.unit.all_cards(), result, event.abuse_load))
+        cards = event.unit.all_cards()
+        scheduler.submit(
+            event.uuid, run_simulation, (event,), priority=event.priority,
+            callback=lambda result: self.process_simulation_results_signal.emit(
+                BaseSimulationResultWithUuid(event.uuid, cards, result, event.abuse_load)),
+            error_callback=lambda e: self.simulation_failed_signal.emit(event.uuid))
+
+    @pyqtSlot(object)
+    def _display_simulation_progress(self, progress):
+        if progress.queued == 0 and progress.running == 0:
+            return
+        eventbus.eventbus.post(InjectTextEvent("Simulating: {} running, {} queued".format(progress.running,
+                                                                                         progress.queued), 2))
 
     def handle_yoink_button(self, rank=1, player_id=None):
         _, _, live_detail_id, song_name, diff_name = eventbus.eventbus.post_and_get_first(GetSongDetailsEvent())
@@ -1,7 +1,7 @@
 from PyQt5 import QtWidgets
 from PyQt5.QtCore import Qt, QMimeData
 from PyQt5.QtGui import QDrag
-from PyQt5.QtWidgets import QTableWidget, QAbstractItemView, QTableWidgetItem, QApplication
+from PyQt5.QtWidgets import QTableView, QAbstractItemView, QApplication
 
 import customlogger as logger
 from db import db
@@ -11,12 +11,12 @@ from gui.events.song_view_events import GetSongDetailsEvent
 from gui.events.utils import eventbus
 from gui.events.utils.eventbus import subscribe
 from gui.viewmodels.mime_headers import MUSIC
-from gui.viewmodels.utils import NumericalTableWidgetItem
+from gui.viewmodels.utils import ColumnarTableModel
 from static.color import Color
 from static.song_difficulty import Difficulty
 
 
-class SongViewWidget(QTableWidget):
+class SongViewWidget(QTableView):
     def __init__(self, main, song_view, *args, **kwargs):
         super(SongViewWidget, self).__init__(main, *args, **kwargs)
         self.song_view = song_view
@@ -38,7 +38,7 @@ class SongViewWidget(QTableWidget):
             return
         if (event.pos() - self.drag_start_position).manhattanLength() < QApplication.startDragDistance():
             return
-        if self.selectedItems():
+        if self.selectedIndexes():
             self.selected = self.selectedIndexes()
         if not self.selected:
             return
@@ -59,6 +59,8 @@ class SongViewWidget(QTableWidget):
 class SongView:
     def __init__(self, main):
         self.widget = SongViewWidget(main, self)
+        self.table_model = ColumnarTableModel(self.widget)
+        self.widget.setModel(self.table_model)
         self.widget.setEditTriggers(QAbstractItemView.NoEditTriggers)  # Disable edit
         self.widget.setVerticalScrollMode(1)  # Smooth scroll
         self.widget.setHorizontalScrollMode(1)  # Smooth scroll
@@ -77,42 +79,26 @@ class SongView:
 
     def set_model(self, model):
         self.model = model
-        self.widget.cellClicked.connect(lambda r, _: self.model.ping_support(r))
-        self.widget.cellDoubleClicked.connect(lambda r, _: self.model.popup_and_load_chart(r))
+        self.widget.clicked.connect(lambda index: self.model.ping_support(index.row()))
+        self.widget.doubleClicked.connect(lambda index: self.model.popup_and_load_chart(index.row()))
 
     def show_only_ids(self, live_detail_ids):
-        if not live_detail_ids:
-            live_detail_ids = set()
-        else:
-            live_detail_ids = set(live_detail_ids)
-        for r_idx in range(self.widget.rowCount()):
-            if int(self.widget.item(r_idx, 0).text()) in live_detail_ids:
-                self.widget.setRowHidden(r_idx, False)
-            else:
-                self.widget.setRowHidden(r_idx, True)
+        self.table_model.set_visible_ids(live_detail_ids)
+
+    def get_value(self, row, key):
+        return self.table_model.get_value(row, key)
 
     def load_data(self, data):
         DATA_COLS = ["LDID", "LiveID", "DifficultyInt", "ID", "Name", "Color", "Difficulty", "Level", "Duration (s)",
                      "Note Count", "7h %", "9h %", "11h %", "12m %", "6m %", "9m %", "11m %", "13h %",
                      "Tap", "Long", "Flick", "Slide", "Tap %", "Long %", "Flick %", "Slide %"]
-        self.widget.setColumnCount(len(DATA_COLS))
-        self.widget.setRowCount(len(data))
-        self.widget.setHorizontalHeaderLabels(DATA_COLS)
-        self.widget.setSortingEnabled(True)
-        for r_idx, card_data in enumerate(data):
-            for c_idx, (key, value) in enumerate(card_data.items()):
-                if isinstance(value, int) and 21 >= c_idx >= 7 or c_idx == 1:
-                    item = NumericalTableWidgetItem(value)
-                elif value is None:
-                    item = QTableWidgetItem("")
-                else:
-                    item = QTableWidgetItem(str(value))
-                self.widget.setItem(r_idx, c_idx, item)
+        keys = list(data[0].keys()) if len(data) > 0 else [None] * len(DATA_COLS)
+        self.table_model.set_records(DATA_COLS, keys, data, 'LDID')
         logger.info("Loaded {} charts".format(len(data)))
         self.widget.setColumnHidden(0, True)
         self.widget.setColumnHidden(2, True)
         self.widget.setSortingEnabled(True)
-        self.widget.sortItems(3, Qt.AscendingOrder)
+        self.widget.sortByColumn(3, Qt.AscendingOrder)
         self.toggle_percentage(change=False)
         self.toggle_timers(change=False)
         self.toggle_auto_resize(True)
@@ -218,21 +204,21 @@ class SongModel:
         row_idx = self.view.widget.selectionModel().currentIndex().row()
         if row_idx == -1:
             return None, None, None, None, None
-        live_detail_id = int(self.view.widget.item(row_idx, 0).text())
-        score_id = int(self.view.widget.item(row_idx, 1).text())
-        diff_id = int(self.view.widget.item(row_idx, 2).text())
+        live_detail_id = int(self.view.get_value(row_idx, 'LDID'))
+        score_id = int(self.view.get_value(row_idx, 'LiveID'))
+        diff_id = int(self.view.get_value(row_idx, 'DifficultyInt'))
         return score_id, diff_id, live_detail_id, \
-               self.view.widget.item(row_idx, 4).text(), self.view.widget.item(row_idx, 6).text()
+               str(self.view.get_value(row_idx, 'Name')), str(self.view.get_value(row_idx, 'Difficulty'))
 
     def ping_support(self, r):
-        song_id = int(self.view.widget.item(r, 1).text())
-        difficulty = int(self.view.widget.item(r, 2).text())
+        song_id = int(self.view.get_value(r, 'LiveID'))
+        difficulty = int(self.view.get_value(r, 'DifficultyInt'))
         eventbus.eventbus.post(SendMusicEvent(song_id, difficulty))
         eventbus.eventbus.post(SupportTeamSetMusicEvent(song_id, difficulty))
         eventbus.eventbus.post(RequestSupportTeamEvent())
 
     def popup_and_load_chart(self, r):
         eventbus.eventbus.post(PopupChartViewerEvent())
-        song_id = int(self.view.widget.item(r, 1).text())
-        difficulty = int(self.view.widget.item(r, 2).text())
+        song_id = int(self.view.get_value(r, 'LiveID'))
+        difficulty = int(self.view.get_value(r, 'DifficultyInt'))
         eventbus.eventbus.post(SendMusicEvent(song_id, difficulty))
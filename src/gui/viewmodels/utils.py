@@ -1,7 +1,9 @@
 import uuid
+from numbers import Number
 
-from PyQt5.QtCore import QRectF
-from PyQt5.QtGui import QPixmap, QPainter, QColor, QPen, QPainterPath
+import numpy as np
+from PyQt5.QtCore import QRectF, QAbstractTableModel, QModelIndex, Qt
+from PyQt5.QtGui import QPixmap, QPainter, QColor, QPen, QPainterPath, QImage
 from PyQt5.QtWidgets import QWidget, QTableWidgetItem
 from numpy import int32
 
@@ -44,6 +46,174 @@ class ImageWidget(QWidget):
         painter.drawPixmap(self.padding, self.padding, self.picture)
 
 
+def pixmap_from_rgba(data, size):
+    """
+    :param data: RGBA bytes of a size x size image, e.g. an atlas tile
+    """
+    image = QImage(bytes(data), size, size, size * 4, QImage.Format_RGBA8888)
+    # fromImage copies the pixels, so the buffer only has to outlive this call
+    return QPixmap.fromImage(image)
+
+
+class ColumnarTableModel(QAbstractTableModel):
+    """
+    Table model over column arrays instead of one item per cell. Filtering and sorting only rebuild the array of
+    source rows on display, cells are formatted when the view asks for them, i.e. for visible rows only.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.headers = list()
+        self.keys = list()
+        self.columns = dict()
+        self.id_key = None
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.id_to_source = dict()
+        self.visible_mask = np.zeros(0, dtype=bool)
+        self.order = np.zeros(0, dtype=np.int64)
+        self.rows = np.zeros(0, dtype=np.int64)
+        self.sort_column = None
+        self.sort_order = Qt.AscendingOrder
+
+    def set_records(self, headers, keys, records, id_key):
+        """
+        :param headers: header label of every column
+        :param keys: record key of every column, None for columns without data
+        :param records: list of dicts
+        :param id_key: key identifying a record, used by filtering and partial updates
+        """
+        self.beginResetModel()
+        self.headers = list(headers)
+        self.keys = list(keys)
+        self.id_key = id_key
+        self.columns = dict()
+        for key in records[0].keys() if len(records) > 0 else [_ for _ in keys if _ is not None]:
+            column = np.empty(len(records), dtype=object)
+            column[:] = [record[key] for record in records]
+            self.columns[key] = column
+        self.ids = np.array([record[id_key] for record in records], dtype=np.int64)
+        self.id_to_source = {record_id: idx for idx, record_id in enumerate(self.ids.tolist())}
+        self.visible_mask = np.ones(len(records), dtype=bool)
+        self.order = np.arange(len(records))
+        self._apply_sort()
+        self._refresh_rows()
+        self.endResetModel()
+
+    def update_records(self, records):
+        """
+        Write the records over the rows with the same id and notify the view of the rows that actually changed.
+        """
+        changed_sources = list()
+        changed_keys = set()
+        for record in records:
+            source = self.id_to_source.get(int(record[self.id_key]))
+            if source is None:
+                continue
+            changed = False
+            for key, value in record.items():
+                if key in self.columns and self.columns[key][source] != value:
+                    self.columns[key][source] = value
+                    changed_keys.add(key)
+                    changed = True
+            if changed:
+                changed_sources.append(source)
+        if len(changed_sources) == 0:
+            return
+        if self.sort_column is not None and self.sort_column < len(self.keys) \
+                and self.keys[self.sort_column] in changed_keys:
+            # Changed values may move rows, so the whole layout has to be redone
+            self.layoutAboutToBeChanged.emit()
+            self._apply_sort()
+            self._refresh_rows()
+            self.layoutChanged.emit()
+            return
+        display_rows = np.flatnonzero(np.isin(self.rows, changed_sources))
+        for row in display_rows.tolist():
+            self.dataChanged.emit(self.index(row, 0), self.index(row, self.columnCount() - 1))
+
+    def set_visible_ids(self, ids):
+        self.beginResetModel()
+        self.visible_mask = np.isin(self.ids, np.array(list(ids) if ids else list(), dtype=np.int64))
+        self._refresh_rows()
+        self.endResetModel()
+
+    def _refresh_rows(self):
+        self.rows = self.order[self.visible_mask[self.order]]
+
+    def _get_sort_keys(self, key):
+        column = self.columns[key]
+        if all(isinstance(value, Number) or value is None for value in column):
+            return np.array([0 if value is None else value for value in column], dtype=float)
+        return np.array(["" if value is None else str(value) for value in column])
+
+    def _apply_sort(self):
+        if self.sort_column is None or self.sort_column >= len(self.keys) or self.keys[self.sort_column] is None:
+            order = np.arange(len(self.visible_mask))
+        else:
+            order = np.argsort(self._get_sort_keys(self.keys[self.sort_column]), kind='stable')
+        if self.sort_order == Qt.DescendingOrder:
+            order = order[::-1]
+        self.order = order
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.layoutAboutToBeChanged.emit()
+        self.sort_column = column
+        self.sort_order = order
+        self._apply_sort()
+        self._refresh_rows()
+        self.layoutChanged.emit()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.headers[section]
+        return None
+
+    def get_source_row(self, row):
+        return int(self.rows[row])
+
+    def get_value(self, row, key):
+        return self.columns[key][self.rows[row]]
+
+    def get_id(self, row):
+        return self.get_value(row, self.id_key)
+
+    def get_display(self, row, column):
+        key = self.keys[column]
+        if key is None:
+            return None
+        value = self.get_value(row, key)
+        return "" if value is None else str(value)
+
+    def get_edit(self, row, column):
+        key = self.keys[column]
+        return None if key is None else self.get_value(row, key)
+
+    def get_background(self, row, column):
+        return None
+
+    def get_decoration(self, row, column):
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            return self.get_display(index.row(), index.column())
+        if role == Qt.EditRole:
+            return self.get_edit(index.row(), index.column())
+        if role == Qt.BackgroundRole:
+            return self.get_background(index.row(), index.column())
+        if role == Qt.DecorationRole:
+            return self.get_decoration(index.row(), index.column())
+        return None
+
+
 class NumericalTableWidgetItem(QTableWidgetItem):
     def __init__(self, value):
         if isinstance(value, int) or isinstance(value, float) or isinstance(value, int32):
@@ -16,25 +16,33 @@ def load_static():
     assert song_difficulty
 
 
-def setup(update=False):
-    load_static()
+def setup_headless(update=False):
+    """
+    Everything the simulator needs, without images, search indices or the GUI.
+    """
     if not (storage.exists(MANIFEST_PATH) and storage.exists(MASTERDB_PATH)):
         update = True
-    from db import db
-    assert db
+    # Update before anything connects to the databases so that no connection is left on a replaced file
     from network import meta_updater
     if update:
         meta_updater.update_database()
+    load_static()
+    from db import db
+    assert db
     from logic.search import card_query
-    assert card_query
+    card_query.ensure_short_names()
     from network import music_updater
     music_updater.update_musicscores()
     from network import chart_cache_updater
     chart_cache_updater.update_cache_scores()
-    from network import image_updater
-    assert image_updater
     from logic.profile import profile_manager
     assert profile_manager
+
+
+def setup(update=False):
+    setup_headless(update)
+    from network import image_updater
+    image_updater.update_all()
     from logic.search import indexer, search_engine
     assert indexer
     assert search_engine
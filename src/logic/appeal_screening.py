@@ -0,0 +1,132 @@
+"""
+Appeal and life of many units at once, for screening candidates before any simulation.
+
+Live.get_attributes works on one unit at a time: it recomputes leader bonuses, builds a bonus tensor per card and may
+read the carnival tables on every call. AppealScreener reads everything that does not depend on the unit once, from a
+fixed list of cards on a Live, then evaluates units given as rows of indices into that list with plain array
+operations. The results are the same as setting each unit on the Live and calling get_attributes.
+"""
+import numpy as np
+
+from db import db
+from static.appeal_presets import APPEAL_PRESETS
+
+FURNITURE_BONUS = 10
+
+
+class AppealScreener:
+    def __init__(self, cards, live):
+        """
+        :param cards: every card the units are built from
+        :param live: Live with the chart, extra bonuses and special option to evaluate the units on
+        """
+        self.cards = cards
+        self.colors = np.array([card.color.value for card in cards], dtype=int)
+        # Cards x (vocal, visual, dance, life)
+        self.stats = np.array([[card.vocal, card.visual, card.dance, card.life] for card in cards], dtype=float)
+        self.skill_types = np.array([card.skill.skill_type for card in cards])
+
+        leaders = [card.leader for card in cards]
+        self.leader_bonuses = np.array([self._get_leader_bonuses(card, live.color) for card in cards])
+        self.leader_min = np.array([leader.min_requirements for leader in leaders])
+        self.leader_max = np.array([leader.max_requirements for leader in leaders])
+        self.resonance = np.array([leader.resonance for leader in leaders])
+        self.bless = np.array([leader.bless for leader in leaders])
+
+        # Bonuses shared by every card, (vocal, visual, dance, life) x colors
+        bonuses = live.get_color_bonuses() + live.get_extra_bonuses()
+        bonuses[:3] += FURNITURE_BONUS
+        self.live_bonuses = bonuses[:4]
+        self.color_mask = 1 - (live.get_extra_bonuses()[:4, :] < -5000)
+
+        self.card_bonuses = np.zeros(len(cards))
+        self.life_thresholds = None
+        self._load_special_option(live)
+
+    @staticmethod
+    def _get_leader_bonuses(card, song_color):
+        leader = card.leader
+        if leader.unison and song_color == card.color:
+            return leader.song_bonuses[:4]
+        if leader.duet and song_color != card.color:
+            return np.zeros((4, 3))
+        return leader.bonuses[:4]
+
+    def _load_special_option(self, live):
+        # The per card appeal bonuses of Live.apply_complex_bonus, with the carnival tables read once
+        if live.special_option == APPEAL_PRESETS["Event Idols"]:
+            chara_bonus_set = live.get_chara_bonus_set()
+            self.card_bonuses = np.array([live.chara_bonus_value if card.chara_id in chara_bonus_set else 0
+                                          for card in self.cards], dtype=float)
+        elif live.special_option == APPEAL_PRESETS["Scale with Potential"]:
+            self.card_bonuses = np.array([card.total_potentials * live.special_value for card in self.cards],
+                                         dtype=float)
+        elif live.special_option == APPEAL_PRESETS["Scale with Life"]:
+            booth_life_value = np.array(db.masterdb.execute_and_fetchall("""
+                SELECT param, value FROM carnival_booth_life_value ORDER BY param
+            """))[1:]
+            self.life_thresholds = booth_life_value[:, 0]
+            # Bonus of a total life below each threshold, nothing past the last one
+            self.life_bonuses = np.concatenate([[0], booth_life_value[:-1, 1] - 100, [0]])
+        elif live.special_option == APPEAL_PRESETS["Scale with Star Rank"]:
+            starrank_value = np.array(db.masterdb.execute_and_fetchall("""
+                SELECT param, value_1, value_2, value_3, value_4 FROM carnival_booth_starrank_value ORDER BY param
+            """))[:20, 1:] - 100
+            self.card_bonuses = np.array([starrank_value[card.star - 1][card.rarity // 2 - 1]
+                                          for card in self.cards], dtype=float)
+
+    def _get_unit_leader_bonuses(self, units):
+        # Unit.leader_bonuses for every unit, (units, 4, 3)
+        colors = np.zeros((len(units), 3))
+        for color in range(3):
+            colors[:, color] = (self.colors[units] == color).sum(axis=1)
+        skill_types = np.sort(self.skill_types[units], axis=1)
+        distinct_skills = 1 + (skill_types[:, 1:] != skill_types[:, :-1]).sum(axis=1)
+
+        center_positions = [0, 5] if units.shape[1] == 6 else [0]
+        blessed = self.bless[units[:, center_positions]].any(axis=1)
+        bonuses = np.zeros((len(units), 4, 3))
+        blessed_bonuses = np.zeros((len(units), 4, 3))
+        resonance_bonuses = np.zeros((len(units), 4, 3))
+        has_resonance = np.zeros(len(units), dtype=bool)
+        for position in range(units.shape[1]):
+            leaders = units[:, position]
+            is_center = position in center_positions
+            resonance = self.resonance[leaders]
+            # Resonance is checked on the centers, or on every card when blessed
+            has_resonance |= (is_center | blessed) & resonance & (distinct_skills >= 5)
+            active = ~resonance \
+                     & (colors >= self.leader_min[leaders]).all(axis=1) \
+                     & (colors <= self.leader_max[leaders]).all(axis=1)
+            leader_bonuses = self.leader_bonuses[leaders]
+            resonance_bonuses += np.where(((is_center | blessed) & resonance)[:, np.newaxis, np.newaxis],
+                                          leader_bonuses, 0)
+            blessed_bonuses = np.where(active[:, np.newaxis, np.newaxis],
+                                       np.maximum(blessed_bonuses, leader_bonuses), blessed_bonuses)
+            if is_center:
+                bonuses += np.where(active[:, np.newaxis, np.newaxis], leader_bonuses, 0)
+        bonuses = np.where(blessed[:, np.newaxis, np.newaxis], blessed_bonuses, bonuses)
+        bonuses += np.where(has_resonance[:, np.newaxis, np.newaxis], np.clip(resonance_bonuses, -100, 5000), 0)
+        return np.clip(bonuses, -100, 5000)
+
+    def evaluate(self, units):
+        """
+        :param units: (units, 5) array of card indices, center first, or (units, 6) with the guest last
+        :return: (total appeal, life) arrays with one value per unit
+        """
+        units = np.asarray(units, dtype=int)
+        unit_bonuses = self._get_unit_leader_bonuses(units) + self.live_bonuses
+        colors = self.colors[units]
+        # Only the bonuses of the color of each card matter, (units, cards, 4)
+        bonuses = np.take_along_axis(unit_bonuses[:, np.newaxis, :, :],
+                                     colors[:, :, np.newaxis, np.newaxis], axis=3)[..., 0]
+        stats = self.stats[units]
+        if self.life_thresholds is not None:
+            total_life = np.ceil(stats[:, :, 3] * (1 + bonuses[:, :, 3] / 100)).sum(axis=1)
+            bonuses[:, :, :3] += self.life_bonuses[np.searchsorted(self.life_thresholds, total_life, side="right")][
+                                 :, np.newaxis, np.newaxis]
+        bonuses[:, :, :3] += self.card_bonuses[units][:, :, np.newaxis]
+        attributes = np.ceil(stats * (1 + np.clip(bonuses, -100, 5000) / 100))
+        attributes *= self.color_mask.T[colors]
+        attributes = attributes.sum(axis=1)
+        return attributes[:, :3].sum(axis=1), attributes[:, 3]
@@ -210,9 +210,10 @@ class Card:
         self.sk.offset = offset
 
     def __str__(self):
+        card_query.ensure_short_names()
         short_name = db.cachedb.execute_and_fetchone("SELECT card_short_name FROM card_name_cache WHERE card_id = ?",
                                                      [self.card_id])
-        return short_name[0]
+        return short_name[0] if short_name is not None else "MyCard"
 
     def __eq__(self, other):
         if other is None or not isinstance(other, Card):
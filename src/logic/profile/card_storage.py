@@ -1,5 +1,13 @@
+import threading
+from collections import OrderedDict
+
 import customlogger as logger
 from db import db
+from logic.profile import journal
+
+# Deferred ownership edits of card id to number, written in one transaction by the next scheduled reindex
+_pending = OrderedDict()
+_pending_lock = threading.Lock()
 
 
 def initialize_owned_cards():
@@ -14,19 +22,45 @@ def initialize_owned_cards():
     db.cachedb.commit()
 
 
-def update_owned_cards(card_ids, numbers):
-    logger.info("Updating cards: {}".format(card_ids))
+def update_owned_cards(card_ids, numbers, deferred=False):
+    """
+    :param deferred: queue the edit instead of writing it, edits arriving within indexer.REINDEX_DELAY of each other
+    are written in one transaction right before their reindex
+    """
     if not isinstance(card_ids, list) or not isinstance(numbers, list):
         card_ids = [card_ids]
         numbers = [numbers]
     assert len(card_ids) == len(numbers)
-    for card_id, number in zip(card_ids, numbers):
-        db.cachedb.execute("""
-            INSERT OR REPLACE INTO owned_card (card_id, number)
-            VALUES (?,?)
-        """, [card_id, number])
+    if deferred:
+        with _pending_lock:
+            for card_id, number in zip(card_ids, numbers):
+                _pending.pop(card_id, None)
+                _pending[card_id] = number
+    else:
+        # Older deferred edits must not overwrite these later
+        flush_owned_cards()
+        _write_owned_cards(card_ids, numbers)
+    from logic.search import indexer
+    indexer.im.schedule_reindex(card_ids)
+
+
+def flush_owned_cards():
+    """
+    Write the deferred ownership edits, before anything reads owned_card as a whole.
+    """
+    with _pending_lock:
+        if len(_pending) == 0:
+            return
+        card_ids, numbers = list(_pending.keys()), list(_pending.values())
+        _pending.clear()
+    _write_owned_cards(card_ids, numbers)
+
+
+def _write_owned_cards(card_ids, numbers):
+    logger.info("Updating cards: {}".format(card_ids))
+    db.cachedb.executemany("""
+        INSERT OR REPLACE INTO owned_card (card_id, number)
+        VALUES (?,?)
+    """, list(zip(card_ids, numbers)))
     db.cachedb.commit()
-    from logic.search import indexer, search_engine
-    indexer.im.initialize_index_db(card_ids)
-    indexer.im.reindex(card_ids)
-    search_engine.engine.refresh_searcher()
+    journal.record_owned_cards(card_ids, numbers)
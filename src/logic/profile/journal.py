@@ -0,0 +1,203 @@
+"""
+Write-behind journal for the current profile.
+
+Every profile mutation is appended to <profile>.jnl next to the profile db as soon as it happens, so a crash loses
+nothing. A debounce timer folds the journal into the profile db in the background once edits stop coming in. Shutdown
+only has to fold whatever is still pending.
+"""
+import json
+import os
+import sqlite3
+import threading
+
+import customlogger as logger
+
+JOURNAL_SUFFIX = ".jnl"
+COMPACTING_SUFFIX = ".compacting"
+COMPACT_DELAY = 5  # Seconds without new entries before the journal is compacted
+
+PROFILE_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS {schema}owned_card (
+        card_id INTEGER PRIMARY KEY UNIQUE,
+        number INTEGER NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS {schema}potential_cache (
+        chara_id INTEGER PRIMARY KEY,
+        vo INTEGER NOT NULL,
+        vi INTEGER NOT NULL,
+        da INTEGER NOT NULL,
+        li INTEGER NOT NULL,
+        sk INTEGER NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS {schema}personal_units (
+        unit_name TEXT PRIMARY KEY UNIQUE CHECK(unit_name <> ''),
+        grand INTEGER,
+        cards BLOB
+    )
+    """,
+]
+
+
+def get_profile_table_queries(schema=None):
+    return [query.format(schema="" if schema is None else schema + ".") for query in PROFILE_TABLES]
+
+
+def _apply_entry(cursor, entry):
+    kind = entry['type']
+    if kind == 'card':
+        cursor.execute("INSERT OR REPLACE INTO owned_card (card_id, number) VALUES (?,?)",
+                       [entry['card_id'], entry['number']])
+    elif kind == 'potential':
+        cursor.execute("INSERT OR REPLACE INTO potential_cache (chara_id, vo, vi, da, li, sk) VALUES (?,?,?,?,?,?)",
+                       [entry['chara_id']] + entry['pots'])
+    elif kind == 'unit':
+        cursor.execute("INSERT OR REPLACE INTO personal_units (unit_name, grand, cards) VALUES (?,?,?)",
+                       [entry['unit_name'], entry['grand'], entry['cards']])
+    elif kind == 'unit_deleted':
+        cursor.execute("DELETE FROM personal_units WHERE unit_name = ?", [entry['unit_name']])
+    elif kind == 'units_cleared':
+        cursor.execute("DELETE FROM personal_units WHERE grand = ?", [entry['grand']])
+    else:
+        raise ValueError("Unknown journal entry type {}".format(kind))
+
+
+def _read_entries(path):
+    entries = list()
+    with open(str(path), 'r') as fr:
+        for line in fr:
+            line = line.strip()
+            if line == "":
+                continue
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                # Only the last line can be torn by a crash mid-write
+                logger.debug("Skipping incomplete journal entry in {}".format(path))
+    return entries
+
+
+class ProfileJournal:
+    def __init__(self, delay=COMPACT_DELAY):
+        self.delay = delay
+        self.db_path = None
+        self._lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        self._timer = None
+
+    def _get_journal_path(self, db_path=None):
+        db_path = self.db_path if db_path is None else db_path
+        return db_path.with_name(db_path.name + JOURNAL_SUFFIX)
+
+    def _get_compacting_path(self, db_path=None):
+        journal_path = self._get_journal_path(db_path)
+        return journal_path.with_name(journal_path.name + COMPACTING_SUFFIX)
+
+    def open(self, db_path):
+        """
+        Compact the journal of the previous profile and start journaling into db_path. Entries left over by a crash
+        are folded into db_path before it is read.
+        """
+        self.compact()
+        with self._lock:
+            self.db_path = db_path
+        self.compact()
+
+    def forget(self, db_path):
+        """
+        Drop the journal of db_path without applying it, e.g. when its profile is deleted.
+        """
+        with self._lock:
+            if self.db_path == db_path:
+                self._cancel_timer()
+                self.db_path = None
+        for path in (self._get_journal_path(db_path), self._get_compacting_path(db_path)):
+            if path.exists():
+                path.unlink()
+
+    def append(self, entries):
+        with self._lock:
+            if self.db_path is None:
+                return
+            with open(str(self._get_journal_path()), 'a') as fa:
+                for entry in entries:
+                    fa.write(json.dumps(entry) + "\n")
+                fa.flush()
+            self._cancel_timer()
+            self._timer = threading.Timer(self.delay, self.compact)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def compact(self):
+        with self._compact_lock:
+            with self._lock:
+                self._cancel_timer()
+                if self.db_path is None:
+                    return
+                db_path = self.db_path
+                journal_path = self._get_journal_path()
+                compacting_path = self._get_compacting_path()
+                # Leftovers of an interrupted compaction are older than the journal, so they go first
+                if compacting_path.exists():
+                    entries = _read_entries(compacting_path)
+                else:
+                    entries = list()
+                if journal_path.exists():
+                    entries.extend(_read_entries(journal_path))
+                    if compacting_path.exists():
+                        with open(str(compacting_path), 'w') as fw:
+                            fw.writelines(json.dumps(entry) + "\n" for entry in entries)
+                        journal_path.unlink()
+                    else:
+                        os.replace(str(journal_path), str(compacting_path))
+            if len(entries) == 0:
+                if compacting_path.exists():
+                    compacting_path.unlink()
+                return
+            conn = sqlite3.connect(str(db_path))
+            try:
+                cursor = conn.cursor()
+                for query in get_profile_table_queries():
+                    cursor.execute(query)
+                for entry in entries:
+                    _apply_entry(cursor, entry)
+                conn.commit()
+            finally:
+                conn.close()
+            compacting_path.unlink()
+            logger.debug("Compacted {} journal entries into {}".format(len(entries), db_path))
+
+
+journal = ProfileJournal()
+
+
+def record_owned_cards(card_ids, numbers):
+    journal.append([
+        {'type': 'card', 'card_id': int(card_id), 'number': int(number)}
+        for card_id, number in zip(card_ids, numbers)
+    ])
+
+
+def record_potential(chara_id, pots):
+    journal.append([{'type': 'potential', 'chara_id': int(chara_id), 'pots': list(map(int, pots))}])
+
+
+def record_unit(unit_name, grand, cards):
+    journal.append([{'type': 'unit', 'unit_name': unit_name, 'grand': int(grand), 'cards': cards}])
+
+
+def record_unit_deleted(unit_name):
+    journal.append([{'type': 'unit_deleted', 'unit_name': unit_name}])
+
+
+def record_units_cleared(grand):
+    journal.append([{'type': 'units_cleared', 'grand': int(grand)}])
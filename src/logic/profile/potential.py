@@ -1,10 +1,95 @@
+from collections import OrderedDict
+
+import numpy as np
 import pandas as pd
 
 import customlogger as logger
 from db import db
-from logic.search import card_query
+from logic.profile import journal
+
+ATTRIBUTES = [('vo', 'vocal'),
+              ('vi', 'visual'),
+              ('da', 'dance'),
+              ('li', 'hp'),
+              ('sk', 'skill')]
+
+# master.db does not change while running, so card data and potential values are read from it once
+_master_cards = None
+_potential_values = None
+# card_data_cache is rebuilt from master once per run, later updates only rewrite the potential bonuses
+_card_data_cache_built = False
+
 
-chara_dict = card_query.get_chara_dict()
+def _get_master_cards():
+    global _master_cards
+    if _master_cards is None:
+        _master_cards = pd.DataFrame(db.masterdb.execute_and_fetchall("SELECT * FROM card_data", out_dict=True))
+    return _master_cards
+
+
+def _get_potential_values():
+    """
+    :return: dict of attribute to an array indexed by [rarity group, potential level]
+    """
+    global _potential_values
+    if _potential_values is None:
+        _potential_values = dict()
+        for key, _ in ATTRIBUTES:
+            pot_df = pd.read_sql_query("SELECT * FROM potential_value_{}".format(key), db.masterdb.get_connection())
+            levels = pot_df['potential_level'].to_numpy()
+            lookup = np.zeros((4, levels.max() + 1), dtype=np.int64)
+            for rarity in range(4):
+                lookup[rarity, levels] = pot_df['value_rare_{}'.format(rarity * 2 + 1)].to_numpy()
+            lookup[:, 0] = 0
+            _potential_values[key] = lookup
+    return _potential_values
+
+
+def _get_bonuses(card_df, chara_id=None):
+    if chara_id is None:
+        potentials = db.cachedb.execute_and_fetchall("SELECT chara_id, vo, vi, da, li, sk FROM potential_cache")
+    else:
+        potentials = db.cachedb.execute_and_fetchall(
+            "SELECT chara_id, vo, vi, da, li, sk FROM potential_cache WHERE chara_id = ?", [chara_id])
+    chara_ids = card_df['chara_id'].to_numpy()
+    potentials = np.array(potentials, dtype=np.int64).reshape(-1, len(ATTRIBUTES) + 1)
+    potentials = potentials[potentials[:, 0] <= chara_ids.max(initial=0)]
+    levels = np.zeros((chara_ids.max(initial=0) + 1, len(ATTRIBUTES)), dtype=np.int64)
+    levels[potentials[:, 0]] = potentials[:, 1:]
+    card_levels = levels[chara_ids]
+    # N/N+, R/R+, SR/SR+ and SSR/SSR+ share potential values
+    rarity_groups = (card_df['rarity'].to_numpy() - 1) // 2
+    pot_values = _get_potential_values()
+    bonuses = OrderedDict()
+    for idx, (key, full_name) in enumerate(ATTRIBUTES):
+        column = 'bonus_{}'.format(full_name)
+        lookup = pot_values[key]
+        values = lookup[rarity_groups, np.minimum(card_levels[:, idx], lookup.shape[1] - 1)]
+        if column in card_df and full_name != 'skill':
+            values = values + card_df[column].to_numpy()
+        bonuses[column] = values
+    return bonuses
+
+
+def _update_bonuses(card_ids, bonuses, chara_id=None):
+    columns = list(bonuses.keys())
+    if chara_id is None:
+        cached = db.cachedb.execute_and_fetchall(
+            "SELECT id, {} FROM card_data_cache".format(", ".join(columns)))
+    else:
+        cached = db.cachedb.execute_and_fetchall(
+            "SELECT id, {} FROM card_data_cache WHERE chara_id = ?".format(", ".join(columns)), [chara_id])
+    cached = {row[0]: row[1:] for row in cached}
+    new_values = np.column_stack([bonuses[column] for column in columns]).tolist()
+    changed = [
+        values + [card_id]
+        for card_id, values in zip(card_ids, new_values)
+        if card_id not in cached or list(cached[card_id]) != values
+    ]
+    if len(changed) > 0:
+        db.cachedb.executemany("UPDATE card_data_cache SET {} WHERE id = ?".format(
+            ", ".join("{} = ?".format(column) for column in columns)), changed)
+    return len(changed)
 
 
 def initialize_potential_db():
@@ -24,45 +109,29 @@ def initialize_potential_db():
 
 
 def copy_card_data_from_master(update_all=True, chara_id=None):
-    if update_all:
-        db.cachedb.execute("DROP TABLE IF EXISTS card_data_cache")
-        all_cards = db.masterdb.execute_and_fetchall("SELECT * FROM card_data", out_dict=True)
-    else:
+    global _card_data_cache_built
+    card_df = _get_master_cards()
+    if not update_all:
         assert chara_id is not None
-        all_cards = db.masterdb.execute_and_fetchall("SELECT * FROM card_data WHERE chara_id = ?", [chara_id],
-                                                     out_dict=True)
-    potentials = db.cachedb.execute_and_fetchall("SELECT * FROM potential_cache", out_dict=True)
-    card_df = pd.DataFrame(all_cards)
-    pot_df = pd.DataFrame(potentials)
-    attributes = [('vo', 'vocal'),
-                  ('vi', 'visual'),
-                  ('da', 'dance'),
-                  ('li', 'hp'),
-                  ('sk', 'skill')]
-    card_df = card_df.merge(pot_df, on='chara_id', how='left').fillna(0)
-    pots = {
-        key: pd.read_sql_query("SELECT * FROM potential_value_{}".format(key),
-                               db.masterdb.get_connection())
-        for key, _ in attributes
-    }
-    for rarity in range(4):
-        rarity1 = rarity * 2 + 1
-        rarity2 = rarity * 2 + 2
-        for key, full_name in attributes:
-            pot_map = dict(zip(pots[key]['potential_level'], pots[key]['value_rare_{}'.format(rarity1)]))
-            pot_map[0] = 0
-            card_df.loc[(card_df['rarity'] == rarity1) | (card_df['rarity'] == rarity2), key] = card_df.loc[
-                (card_df['rarity'] == rarity1) | (card_df['rarity'] == rarity2), key].map(pot_map)
-    card_df['bonus_skill'] = 0
-    for key, full_name in attributes:
-        card_df['bonus_{}'.format(full_name)] += card_df[key]
-    card_df = card_df.drop([_[0] for _ in attributes], axis=1)
-    if update_all:
-        card_df.to_sql('card_data_cache', db.cachedb.get_connection(), index=False)
+        card_df = card_df[card_df['chara_id'] == chara_id]
+    bonuses = _get_bonuses(card_df, None if update_all else chara_id)
+    card_ids = card_df['id'].tolist()
+    if _card_data_cache_built:
+        changed = _update_bonuses(card_ids, bonuses, None if update_all else chara_id)
+        logger.debug("Updated potential bonuses of {} cards".format(changed))
     else:
-        db.cachedb.execute("DELETE FROM card_data_cache WHERE chara_id = ?", [chara_id])
-        card_df.to_sql('card_data_cache', db.cachedb.get_connection(), if_exists='append', index=False)
+        card_df = card_df.copy()
+        for column, values in bonuses.items():
+            card_df[column] = values
+        if update_all:
+            db.cachedb.execute("DROP TABLE IF EXISTS card_data_cache")
+            card_df.to_sql('card_data_cache', db.cachedb.get_connection(), index=False)
+            _card_data_cache_built = True
+        else:
+            db.cachedb.execute("DELETE FROM card_data_cache WHERE chara_id = ?", [chara_id])
+            card_df.to_sql('card_data_cache', db.cachedb.get_connection(), if_exists='append', index=False)
     db.cachedb.commit()
+    return card_ids
 
 
 def update_potential(chara_id, pots):
@@ -71,5 +140,7 @@ def update_potential(chara_id, pots):
         INSERT OR REPLACE INTO potential_cache (chara_id, vo, vi, da, li, sk)
         VALUES (?,?,?,?,?,?)
     """, [int(chara_id)] + list(map(int, pots)))
-    copy_card_data_from_master(update_all=False, chara_id=chara_id)
-    logger.info("Updated character ID {} to pots {}".format(chara_id, pots))
\ No newline at end of file
+    journal.record_potential(chara_id, pots)
+    card_ids = copy_card_data_from_master(update_all=False, chara_id=chara_id)
+    logger.info("Updated character ID {} to pots {}".format(chara_id, pots))
+    return card_ids
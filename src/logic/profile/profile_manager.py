@@ -7,7 +7,7 @@ from collections import defaultdict
 
 import customlogger as logger
 from db import db
-from logic.profile import card_storage, potential
+from logic.profile import card_storage, journal, potential
 from logic.profile import unit_storage
 from logic.search import card_query
 from network.api_client import get_cards
@@ -30,14 +30,14 @@ def import_from_gameid(game_id):
         card_dict = defaultdict(int)
         for card in cards:
             card_dict[card] += 1
+        owned = dict(db.cachedb.execute_and_fetchall("SELECT card_id, number FROM owned_card"))
+        updated_cards = list()
         for card_id, number in card_dict.items():
-            z = list(zip(*db.cachedb.execute_and_fetchall("SELECT number FROM owned_card WHERE card_id = ? OR card_id = ?", [card_id, card_id - 1])))[0]
-            if z[0] + z[1] < number:
-                db.cachedb.execute("""
-                    INSERT OR REPLACE INTO owned_card (card_id, number)
-                    VALUES (?,?)
-                """, [card_id, number - z[0]])
-        db.cachedb.commit()
+            unidolized, idolized = owned.get(card_id - 1, 0), owned.get(card_id, 0)
+            if unidolized + idolized < number:
+                updated_cards.append((card_id, number - unidolized))
+        if len(updated_cards) > 0:
+            card_storage.update_owned_cards(*map(list, zip(*updated_cards)))
         logger.info("Imported {} cards successfully".format(len(card_dict)))
         return list(card_dict.keys())
     except:
@@ -65,10 +65,18 @@ class ProfileManager:
         profile_id = db.cachedb.execute_and_fetchone("SELECT 1 FROM profiles WHERE name = ?", [profile_name])
         if profile_id is None:
             return False
+        # Deferred edits belong to the profile being left
+        card_storage.flush_owned_cards()
         self.profile = profile_name
-        self._load_cards()
-        self._load_potentials()
-        self._load_units()
+        journal.journal.open(self._get_profile_db_path())
+        if self._has_newer_csv():
+            logger.info("Importing profile {} from CSV".format(profile_name))
+            self._load_cards()
+            self._load_potentials()
+            self._load_units()
+            self._write_profile_db()
+        else:
+            self._load_profile_db()
         return True
 
     def add_profile(self, profile_name):
@@ -87,8 +95,86 @@ class ProfileManager:
             (PROFILE_PATH / "{}.ptl".format(profile_name)).unlink()
         if (PROFILE_PATH / "{}.unt".format(profile_name)).exists():
             (PROFILE_PATH / "{}.unt".format(profile_name)).unlink()
+        journal.journal.forget(self._get_profile_db_path(profile_name))
+        if self._get_profile_db_path(profile_name).exists():
+            self._get_profile_db_path(profile_name).unlink()
         self.switch_profile('main')
 
+    def _get_profile_db_path(self, profile_name=None):
+        if profile_name is None:
+            profile_name = self.profile
+        return PROFILE_PATH / "{}.db".format(profile_name)
+
+    def _has_newer_csv(self):
+        """
+        CSV profiles are still read when there is no profile db yet, or when they were edited after it was saved.
+        """
+        db_path = self._get_profile_db_path()
+        for suffix in ("crd", "ptl", "unt"):
+            csv_path = PROFILE_PATH / "{}.{}".format(self.profile, suffix)
+            if not csv_path.exists():
+                continue
+            if not db_path.exists() or csv_path.stat().st_mtime > db_path.stat().st_mtime:
+                return True
+        return False
+
+    def _attach_profile_db(self):
+        db.cachedb.commit()
+        db.cachedb.execute("""ATTACH DATABASE "{}" AS profile""".format(self._get_profile_db_path()))
+        for query in journal.get_profile_table_queries("profile"):
+            db.cachedb.execute(query)
+        db.cachedb.commit()
+
+    def _detach_profile_db(self):
+        db.cachedb.commit()
+        db.cachedb.execute("DETACH DATABASE profile")
+
+    def _fill_missing_defaults(self):
+        # Cards and characters added since the profile was saved start at 0
+        all_cards = db.masterdb.execute_and_fetchall("SELECT id FROM card_data")
+        db.cachedb.executemany("INSERT OR IGNORE INTO owned_card (card_id, number) VALUES (?,0)", all_cards)
+        # Makes sure chara_cache is populated
+        card_query.get_chara_dict()
+        db.cachedb.execute("""
+            INSERT OR IGNORE INTO potential_cache (chara_id, vo, vi, da, li, sk)
+            SELECT chara_id, 0, 0, 0, 0, 0 FROM chara_cache
+        """)
+        db.cachedb.commit()
+
+    def _load_profile_db(self):
+        card_storage.initialize_owned_cards()
+        potential.initialize_potential_db()
+        unit_storage.initialize_personal_units()
+        self._attach_profile_db()
+        try:
+            db.cachedb.execute("""
+                INSERT INTO owned_card (card_id, number)
+                SELECT card_id, number FROM profile.owned_card
+            """)
+            db.cachedb.execute("""
+                INSERT INTO potential_cache (chara_id, vo, vi, da, li, sk)
+                SELECT chara_id, vo, vi, da, li, sk FROM profile.potential_cache
+            """)
+            db.cachedb.execute("""
+                INSERT INTO personal_units (unit_name, grand, cards)
+                SELECT unit_name, grand, cards FROM profile.personal_units
+            """)
+        finally:
+            self._detach_profile_db()
+        self._fill_missing_defaults()
+        potential.copy_card_data_from_master(update_all=True)
+
+    def _write_profile_db(self):
+        self._attach_profile_db()
+        try:
+            for table, columns in (("owned_card", "card_id, number"),
+                                   ("potential_cache", "chara_id, vo, vi, da, li, sk"),
+                                   ("personal_units", "unit_name, grand, cards")):
+                db.cachedb.execute("DELETE FROM profile.{}".format(table))
+                db.cachedb.execute("INSERT INTO profile.{0} ({1}) SELECT {1} FROM main.{0}".format(table, columns))
+        finally:
+            self._detach_profile_db()
+
     def _initialize_owned_cards_csv(self):
         all_cards = [_[0] for _ in db.masterdb.execute_and_fetchall("SELECT id FROM card_data")]
         if not (PROFILE_PATH / "{}.crd".format(self.profile)).exists():
@@ -104,19 +190,14 @@ class ProfileManager:
         with storage.get_reader(PROFILE_PATH / "{}.crd".format(self.profile), 'r') as fr:
             csv_reader = csv.reader(fr)
             next(csv_reader)  # Skip headers
-            for row in csv_reader:
-                row = list(map(int, row))
-                db.cachedb.execute("""
-                    INSERT OR REPLACE INTO owned_card (card_id, number)
-                    VALUES (?,?)
-                """, row)
-                all_card_ids.remove(row[0])
-            for missing_id in all_card_ids:
-                db.cachedb.execute("""
-                                    INSERT OR REPLACE INTO owned_card (card_id, number)
-                                    VALUES (?,?)
-                                """, [missing_id, 0])
-            db.cachedb.commit()
+            rows = [list(map(int, row)) for row in csv_reader]
+        all_card_ids.difference_update(row[0] for row in rows)
+        rows.extend([missing_id, 0] for missing_id in all_card_ids)
+        db.cachedb.executemany("""
+            INSERT OR REPLACE INTO owned_card (card_id, number)
+            VALUES (?,?)
+        """, rows)
+        db.cachedb.commit()
 
     def _write_owned_cards(self):
         owned_cards = db.cachedb.execute_and_fetchall("SELECT * FROM owned_card", out_dict=True)
@@ -136,11 +217,11 @@ class ProfileManager:
         with storage.get_reader(PROFILE_PATH / "{}.unt".format(self.profile), 'r') as fr:
             csv_reader = csv.reader(fr)
             next(csv_reader)  # Skip headers
-            for row in csv_reader:
-                db.cachedb.execute("""
-                    INSERT OR REPLACE INTO personal_units (unit_name, grand, cards)
-                    VALUES (?,?,?)
-                """, row)
+            db.cachedb.executemany("""
+                INSERT OR REPLACE INTO personal_units (unit_name, grand, cards)
+                VALUES (?,?,?)
+            """, list(csv_reader))
+        db.cachedb.commit()
 
     def _write_units(self):
         personal_units = db.cachedb.execute_and_fetchall("SELECT * FROM personal_units", out_dict=True)
@@ -174,11 +255,10 @@ class ProfileManager:
         with storage.get_reader(PROFILE_PATH / "{}.ptl".format(self.profile), 'r') as fr:
             csv_reader = csv.reader(fr)
             next(csv_reader)  # Skip headers
-            for row in csv_reader:
-                db.cachedb.execute("""
-                    INSERT OR REPLACE INTO potential_cache (chara_id, vo, vi, da, li, sk)
-                    VALUES (?,?,?,?,?,?)
-                """, list(map(int, row)))
+            db.cachedb.executemany("""
+                INSERT OR REPLACE INTO potential_cache (chara_id, vo, vi, da, li, sk)
+                VALUES (?,?,?,?,?,?)
+            """, [list(map(int, row)) for row in csv_reader])
         potential.copy_card_data_from_master(update_all=True)
 
     def _write_potentials_csv(self):
@@ -188,10 +268,18 @@ class ProfileManager:
             for data in potentials:
                 fw.write(",".join(map(str, data.values())) + "\n")
 
-    def cleanup(self):
+    def export_csv(self):
+        card_storage.flush_owned_cards()
         self._write_potentials_csv()
         self._write_owned_cards()
         self._write_units()
+        # Rewritten after the CSVs so the profile db stays the newer copy and is the one loaded next time
+        self._write_profile_db()
+
+    def cleanup(self):
+        # Everything is journaled as it happens, only the pending entries are left to fold in
+        card_storage.flush_owned_cards()
+        journal.journal.compact()
 
 
 pm = ProfileManager()
@@ -1,4 +1,5 @@
 from db import db
+from logic.profile import journal
 
 
 def initialize_personal_units():
@@ -20,14 +21,17 @@ def update_unit(unit_name, cards, grand=False):
     db.cachedb.execute("INSERT OR REPLACE INTO personal_units (unit_name, grand, cards) VALUES (?,?,?)",
                        [unit_name, grand, cards])
     db.cachedb.commit()
+    journal.record_unit(unit_name, grand, cards)
 
 
 def delete_unit(unit_name):
     db.cachedb.execute("DELETE FROM personal_units WHERE unit_name = ? ", [unit_name])
     db.cachedb.commit()
+    journal.record_unit_deleted(unit_name)
 
 
 def clean_all_units(grand=False):
     grand = 1 if grand else 0
     db.cachedb.execute("DELETE FROM personal_units WHERE grand = ? ", [grand])
     db.cachedb.commit()
+    journal.record_units_cleared(grand)
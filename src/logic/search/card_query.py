@@ -1,7 +1,6 @@
-import os
-import sys
 from collections import defaultdict
 
+import customlogger as logger
 from db import db
 from network import kirara_query
 from static.rarity import Rarity
@@ -13,6 +12,7 @@ ALIASES = {
 }
 
 queried_to_kirara = False
+short_names_generated = False
 
 
 def get_chara_dict():
@@ -31,15 +31,7 @@ def get_chara_dict():
     return {_: __ for _, __ in results}
 
 
-def generate_short_names():
-    chara_data_dict = get_chara_dict()
-    card_chara_rarity = db.masterdb.execute_and_fetchall(
-        """
-        SELECT chara_id, GROUP_CONCAT(id), GROUP_CONCAT(rarity)
-        FROM card_data
-        GROUP BY chara_id
-        """
-    )
+def _initialize_card_name_cache():
     db.cachedb.execute("""
         CREATE TABLE IF NOT EXISTS card_name_cache (
         card_id TEXT UNIQUE PRIMARY KEY,
@@ -49,6 +41,45 @@ def generate_short_names():
         FOREIGN KEY (chara_id) REFERENCES chara_cache(chara_id) 
         )
     """)
+    db.cachedb.commit()
+
+
+def _get_local_chara_dict():
+    if not db.cachedb.execute_and_fetchone("""
+            SELECT name FROM sqlite_master WHERE type='table' AND name='chara_cache'
+        """):
+        return dict()
+    results = db.cachedb.execute_and_fetchall("""
+        SELECT chara_id, conventional FROM chara_cache
+    """)
+    return {_: __ for _, __ in results}
+
+
+def _get_missing_charas():
+    cached_ids = {int(_[0]) for _ in db.cachedb.execute_and_fetchall("SELECT card_id FROM card_name_cache")}
+    all_cards = db.masterdb.execute_and_fetchall("SELECT id, chara_id FROM card_data")
+    return {chara_id for card_id, chara_id in all_cards if card_id not in cached_ids}
+
+
+def generate_short_names():
+    _initialize_card_name_cache()
+    # Numbering depends on every card of a character, so rebuild whole characters that have uncached cards
+
+    missing_charas = _get_missing_charas()
+    if len(missing_charas) == 0:
+        return
+    chara_data_dict = _get_local_chara_dict()
+    if not missing_charas.issubset(chara_data_dict.keys()):
+        chara_data_dict = get_chara_dict()
+    card_chara_rarity = db.masterdb.execute_and_fetchall(
+        """
+        SELECT chara_id, GROUP_CONCAT(id), GROUP_CONCAT(rarity)
+        FROM card_data
+        WHERE chara_id IN ({})
+        GROUP BY chara_id
+        """.format(",".join(map(str, missing_charas)))
+    )
+    rows = list()
     for chara_id, card_ids, card_rarities in card_chara_rarity:
         if chara_id not in chara_data_dict:
             continue
@@ -74,11 +105,21 @@ def generate_short_names():
                 short_name = short_name + str(rarity_count[card_rarity])
             temp.append(short_name)
         for card_id, card_rarity, short_name in zip(card_ids, card_rarities, temp):
-            db.cachedb.execute("""
-                INSERT OR REPLACE INTO card_name_cache (card_id,chara_id,card_rarity,card_short_name)
-                VALUES (?,?,?,?)
-            """, [card_id, chara_id, card_rarity.value, short_name])
+            rows.append([card_id, chara_id, card_rarity.value, short_name])
+    db.cachedb.executemany("""
+        INSERT OR REPLACE INTO card_name_cache (card_id,chara_id,card_rarity,card_short_name)
+        VALUES (?,?,?,?)
+    """, rows)
     db.cachedb.commit()
+    logger.debug("Generated short names for {} cards of {} characters".format(len(rows), len(missing_charas)))
+
+
+def ensure_short_names():
+    global short_names_generated
+    if short_names_generated:
+        return
+    generate_short_names()
+    short_names_generated = True
 
 
 def convert_short_name_to_id(query):
@@ -88,6 +129,7 @@ def convert_short_name_to_id(query):
         tokens = query.split()
     else:
         raise ValueError("Invalid query: {}".format(query))
+    ensure_short_names()
     results = list()
     for token in tokens:
         if token.isdigit():
@@ -108,6 +150,7 @@ def convert_id_to_short_name(query):
         tokens = query.split()
     else:
         raise ValueError("Invalid query: {}".format(query))
+    ensure_short_names()
     results = list()
     for token in tokens:
         query_res = db.cachedb.execute_and_fetchone("""
@@ -117,5 +160,3 @@ def convert_id_to_short_name(query):
         results.append(query_res)
     return results
 
-
-generate_short_names()
@@ -1,6 +1,7 @@
 import ast
 import os
 import shutil
+import threading
 
 from whoosh.analysis import SimpleAnalyzer
 from whoosh.fields import *
@@ -9,7 +10,8 @@ from whoosh.index import create_in, open_dir
 import customlogger as logger
 from db import db
 from logic.live import Live
-from network.meta_updater import get_masterdb_path
+from logic.search import card_query
+from network.meta_updater import get_cachedb_path, get_masterdb_path
 from settings import INDEX_PATH
 from static.color import Color
 from static.song_difficulty import Difficulty
@@ -18,6 +20,7 @@ from utils.misc import is_debug_mode
 KEYWORD_KEYS_STR_ONLY = ["short", "chara", "rarity", "color", "skill", "leader", "time_prob_key", "fes", "noir",
                          "blanc", "carnival", "main_attribute"]
 KEYWORD_KEYS = KEYWORD_KEYS_STR_ONLY + ["owned", "idolized"]
+REINDEX_DELAY = 1  # Seconds without new ownership edits before the pending cards are reindexed
 
 
 class IndexManager:
@@ -28,13 +31,28 @@ class IndexManager:
             INDEX_PATH.mkdir()
         self.index = None
         self.song_index = None
+        self._pending_card_ids = set()
+        self._pending_lock = threading.Lock()
+        self._reindex_lock = threading.Lock()
+        self._reindex_timer = None
+        # Called with the reindexed card ids from the reindex thread once a scheduled reindex is searchable
+        self.reindex_callback = None
 
-    def initialize_index_db(self, card_list=None):
-        logger.info("Building quicksearch index, please wait...")
+    def initialize_index_db(self, card_list=None, cachedb=None):
+        """
+        :param cachedb: connection to write the keywords with, defaults to the shared cache db connection
+        """
+        if card_list is None:
+            logger.info("Building quicksearch index, please wait...")
+        else:
+            logger.debug("Updating quicksearch index for {} cards".format(len(card_list)))
+        if cachedb is None:
+            cachedb = db.cachedb
+        card_query.ensure_short_names()
 
         carnival_idols = ",".join(map(str, Live.static_get_chara_bonus_set(get_name=False)))
 
-        db.cachedb.execute("""ATTACH DATABASE "{}" AS masterdb""".format(get_masterdb_path()))
+        cachedb.execute("""ATTACH DATABASE "{}" AS masterdb""".format(get_masterdb_path()))
         query = """
             SELECT  cdc.id,
                     LOWER(cnc.card_short_name) as short,
@@ -96,11 +114,11 @@ class IndexManager:
         """.format(carnival_idols)
         if card_list is not None:
             query += "WHERE cdc.id IN ({})".format(','.join(['?'] * len(card_list)))
-            data = db.cachedb.execute_and_fetchall(query, card_list, out_dict=True)
+            data = cachedb.execute_and_fetchall(query, card_list, out_dict=True)
         else:
-            data = db.cachedb.execute_and_fetchall(query, out_dict=True)
-            db.cachedb.execute("DROP TABLE IF EXISTS card_index_keywords")
-            db.cachedb.execute("""
+            data = cachedb.execute_and_fetchall(query, out_dict=True)
+            cachedb.execute("DROP TABLE IF EXISTS card_index_keywords")
+            cachedb.execute("""
                 CREATE TABLE IF NOT EXISTS card_index_keywords (
                     "card_id" INTEGER UNIQUE PRIMARY KEY,
                     "fields" BLOB
@@ -110,13 +128,13 @@ class IndexManager:
         for card in data:
             card_id = card['id']
             fields = {_: card[_] for _ in KEYWORD_KEYS}
-            db.cachedb.execute("""
+            cachedb.execute("""
                     INSERT OR REPLACE INTO card_index_keywords ("card_id", "fields")
                     VALUES (?,?)
                 """, [card_id, str(fields)])
-        db.cachedb.commit()
+        cachedb.commit()
         logger.debug("Quicksearch db transaction for {} cards completed".format(len(data)))
-        db.cachedb.execute("DETACH DATABASE masterdb")
+        cachedb.execute("DETACH DATABASE masterdb")
 
     def initialize_index(self):
         results = db.cachedb.execute_and_fetchall("SELECT card_id, fields FROM card_index_keywords")
@@ -190,17 +208,19 @@ class IndexManager:
         self.song_index = ix
         logger.debug("Quicksearch index initialized for {} charts".format(len(results)))
 
-    def reindex(self, card_ids=None):
-        logger.debug("Reindexing for {} cards".format(len(card_ids)))
+    def reindex(self, card_ids=None, cachedb=None):
+        if cachedb is None:
+            cachedb = db.cachedb
+        logger.debug("Reindexing for {} cards".format("all" if card_ids is None else len(card_ids)))
         if card_ids is not None:
-            results = db.cachedb.execute_and_fetchall(
+            results = cachedb.execute_and_fetchall(
                 """
                 SELECT card_id, fields 
                 FROM card_index_keywords 
                 WHERE card_id IN ({})
                 """.format(','.join(['?'] * len(card_ids))), card_ids)
         else:
-            results = db.cachedb.execute_and_fetchall("SELECT card_id, fields FROM card_index_keywords")
+            results = cachedb.execute_and_fetchall("SELECT card_id, fields FROM card_index_keywords")
         writer = self.index.writer()
         for result in results:
             fields = ast.literal_eval(result[1])
@@ -211,6 +231,46 @@ class IndexManager:
                                 **fields)
         writer.commit()
 
+    def schedule_reindex(self, card_ids):
+        """
+        Queue cards whose ownership changed for reindexing. Edits arriving within REINDEX_DELAY of each other are
+        coalesced into a single incremental reindex that runs on a background thread, after writing the edits
+        card_storage deferred.
+        """
+        with self._pending_lock:
+            self._pending_card_ids.update(map(int, card_ids))
+            if self._reindex_timer is not None:
+                self._reindex_timer.cancel()
+            self._reindex_timer = threading.Timer(REINDEX_DELAY, self.flush_reindex)
+            self._reindex_timer.daemon = True
+            self._reindex_timer.start()
+
+    def flush_reindex(self):
+        # The deferred ownership edits go in first, in one transaction, so the reindex sees them
+        from logic.profile import card_storage
+        card_storage.flush_owned_cards()
+        # Runs off the UI thread, so it gets its own connection: attaching masterdb must not collide with the
+        # transactions of the shared one
+        with self._reindex_lock:
+            with self._pending_lock:
+                if self._reindex_timer is not None:
+                    self._reindex_timer.cancel()
+                    self._reindex_timer = None
+                card_ids = sorted(self._pending_card_ids)
+                self._pending_card_ids.clear()
+            if len(card_ids) == 0 or self.index is None:
+                return
+            cachedb = db.CustomDB(get_cachedb_path())
+            try:
+                self.initialize_index_db(card_ids, cachedb=cachedb)
+                self.reindex(card_ids, cachedb=cachedb)
+            finally:
+                cachedb.get_connection().close()
+            from logic.search import search_engine
+            search_engine.engine.refresh_searcher()
+            if self.reindex_callback is not None:
+                self.reindex_callback(card_ids)
+
     def get_index(self, song_index=False):
         if not is_debug_mode() and self.index is None:
             im.initialize_index_db()
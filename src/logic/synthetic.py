@@ -0,0 +1,357 @@
+"""
+Synthetic charts, cards and units for stress testing and fuzzing the simulator.
+
+Nothing here reads chart files or card rows, so any note count, note mix or skill combination can be built without
+downloading the matching scores or owning the cards. The static game tables the simulator reads (sparkle and motif
+values) come from master.db when it is there, otherwise stand-in tables are installed in memory on import so nothing
+gets downloaded.
+
+    unit = generate_unit([41, 40, 39, 16, 20], seed=0)
+    live = generate_live(unit, note_count=5000, seed=0)
+    Simulator(live).simulate(times=10)
+"""
+import itertools
+
+import numpy as np
+import pandas as pd
+import pyximport
+
+from db import db
+from logic.card import Card
+from logic.grandlive import GrandLive
+from logic.grandunit import GrandUnit
+from logic.leader import Leader
+from logic.live import Live, classify_note
+from logic.skill import BOOST_TYPES, ACT_TYPES, COLOR_TARGETS, COMMON_TIMERS, Skill
+from logic.unit import Unit
+from settings import MASTERDB_PATH
+from static import skill as static_skill
+from static.color import Color
+from static.song_difficulty import Difficulty
+from utils import storage
+
+pyximport.install(language_level=3)
+
+# Far above real card ids so synthetic cards never resolve to real ones
+SYNTHETIC_ID_BASE = 900001
+# Raw (value, value_2, value_3) of every skill type as stored in skill_data, boost types have their 4 boost values
+SKILL_VALUES = {
+    1: (117, 0, 0),
+    2: (117, 0, 0),
+    4: (118, 0, 0),
+    5: (0, 0, 0),
+    6: (0, 0, 0),
+    7: (0, 0, 0),
+    9: (0, 0, 0),
+    12: (0, 0, 0),
+    14: (118, 0, 0),
+    15: (122, 0, 0),
+    16: (0, 0, 0),
+    17: (3, 0, 0),
+    20: (1200, 1200, 1200, 1),
+    21: (116, 114, 0),
+    22: (116, 114, 0),
+    23: (116, 114, 0),
+    24: (113, 1, 0),
+    25: (1, 0, 0),
+    26: (116, 115, 1),
+    27: (110, 103, 0),
+    28: (110, 140, 0),
+    29: (110, 140, 0),
+    30: (110, 140, 0),
+    31: (112, 0, 0),
+    32: (1500, 1500, 1000, 0),
+    33: (1500, 1500, 1000, 0),
+    34: (1500, 1500, 1000, 0),
+    35: (1, 0, 0),
+    36: (1, 0, 0),
+    37: (1, 0, 0),
+    38: (1500, 1500, 1200, 0),
+    39: (80, 1500, 0),
+    40: (0, 0, 0),
+    41: (0, 0, 0),
+    42: (80, 1500, 0),
+    43: (118, 1, 0),
+}
+PROBABILITIES = {'h': 6000, 'm': 5250}
+OVERLOAD_LIFE_COST = 15
+SUPPORT_SIZE = 10
+
+WIDE_LANES = 5
+GRAND_LANES = 15
+# Shortest time between two notes, so notes never stack on the same instant
+MIN_GAP = 0.05
+
+# Highest life covered by the stand-in sparkle tables, far above any start life
+OFFLINE_MAX_LIFE = 50000
+OFFLINE_MOTIF_ROWS = 60
+
+_card_ids = itertools.count(SYNTHETIC_ID_BASE)
+
+
+def install_offline_tables():
+    """
+    Replace master.db by an in-memory database holding stand-ins for the static tables used while simulating, shaped
+    like the real ones. Values are close to the game's but not exact, fine for fuzzing, not for real scores.
+    """
+    masterdb = db.CustomDB(":memory:")
+    masterdb.execute("CREATE TABLE card_data (id INTEGER PRIMARY KEY, chara_id INTEGER, rarity INTEGER)")
+    for table in ["skill_life_value", "skill_life_value_grand"]:
+        masterdb.execute("CREATE TABLE {} (life_value INTEGER, type_01_value INTEGER, type_02_value INTEGER)"
+                         .format(table))
+        masterdb.executemany("INSERT INTO {} VALUES (?,?,?)".format(table), [
+            (life, 100 + min(life // 100, 18), 100 + min(life // 150, 12))
+            for life in range(0, OFFLINE_MAX_LIFE + 10, 10)
+        ])
+    for table in ["skill_motif_value", "skill_motif_value_grand"]:
+        masterdb.execute("CREATE TABLE {} (motif_value INTEGER, type_01_value INTEGER)".format(table))
+        masterdb.executemany("INSERT INTO {} VALUES (?,?)".format(table), [
+            (idx, 100 + min(idx // 2, 18)) for idx in range(OFFLINE_MOTIF_ROWS)
+        ])
+    masterdb.commit()
+    db.masterdb = masterdb
+    static_skill.invalidate_sparkle_bonus()
+
+
+if not storage.exists(MASTERDB_PATH):
+    install_offline_tables()
+
+
+def _get_rng(seed):
+    if isinstance(seed, np.random.RandomState):
+        return seed
+    return np.random.RandomState(seed)
+
+
+class _ChartBuilder:
+    def __init__(self, grand, rng):
+        self.grand = grand
+        self.rng = rng
+        self.lane_count = GRAND_LANES if grand else WIDE_LANES
+        # Time until which a lane is held or has a note scheduled
+        self.busy_until = np.zeros(self.lane_count + 1)
+        self.rows = list()
+        self.group_ids = itertools.count(1)
+
+    def free_lane(self, time, width=1):
+        candidates = [lane for lane in range(1, self.lane_count - width + 2)
+                      if (self.busy_until[lane:lane + width] < time).all()]
+        if len(candidates) == 0:
+            return None
+        return int(self.rng.choice(candidates))
+
+    def add(self, time, note_type, lane, status=0, group_id=0, width=1):
+        self.busy_until[lane:lane + width] = np.maximum(self.busy_until[lane:lane + width], time + MIN_GAP)
+        self.rows.append((time, note_type, lane, lane, width if self.grand else status, group_id))
+
+    def flick_status(self):
+        return int(self.rng.randint(1, 3))
+
+    def width(self):
+        return int(self.rng.randint(1, 5)) if self.grand else 1
+
+    def tap(self, time):
+        width = self.width()
+        lane = self.free_lane(time, width)
+        if lane is None:
+            return 0
+        self.add(time, 4 if self.grand else 1, lane, width=width)
+        return 1
+
+    def long(self, time):
+        width = self.width()
+        lane = self.free_lane(time, width)
+        if lane is None:
+            return 0
+        end = time + self.rng.uniform(0.5, 2)
+        if self.grand:
+            # Grand charts hold with two point slides
+            group_id = next(self.group_ids)
+            self.add(time, 5, lane, group_id=group_id, width=width)
+            self.add(end, 5, lane, group_id=group_id, width=width)
+        else:
+            self.add(time, 2, lane)
+            self.add(end, 1, lane, status=self.flick_status() if self.rng.rand() < 0.3 else 0)
+        return 2
+
+    def flick(self, time, count):
+        group_id = next(self.group_ids) if count > 1 else 0
+        status = self.flick_status()
+        for idx in range(count):
+            width = self.width()
+            lane = self.free_lane(time, width)
+            if lane is None:
+                return idx
+            if self.grand:
+                self.add(time, 5 + status, lane, group_id=group_id, width=width)
+            else:
+                self.add(time, 1, lane, status=status, group_id=group_id)
+            time += self.rng.uniform(0.1, 0.2)
+        return count
+
+    def slide(self, time, count):
+        group_id = next(self.group_ids)
+        for idx in range(count):
+            width = self.width()
+            lane = self.free_lane(time, width)
+            if lane is None:
+                return idx
+            status = self.flick_status() if idx == count - 1 and self.rng.rand() < 0.3 else 0
+            self.add(time, 5 if self.grand else 3, lane, status=status, group_id=group_id, width=width)
+            time += self.rng.uniform(0.2, 0.6)
+        return count
+
+    def to_frame(self):
+        notes = pd.DataFrame(self.rows, columns=["sec", "type", "startPos", "finishPos", "status", "groupId"])
+        notes = notes.sort_values("sec", kind="stable").reset_index(drop=True)
+        notes.insert(5, "sync", notes["sec"].duplicated(keep=False).astype(int))
+        notes['note_type'] = notes.apply(classify_note, axis=1)
+        return notes
+
+
+def generate_chart(note_count=1000, density=6.0, long_ratio=0.1, flick_ratio=0.15, slide_ratio=0.1, grand=False,
+                   start=3.0, seed=None):
+    """
+    Generate notes shaped like a loaded chart, with the columns fetch_chart returns.
+
+    :param density: average notes per second
+    :param long_ratio: share of notes that are long notes, both ends counted
+    :param flick_ratio: share of notes that are flicks, including flicks ending a long note or slide
+    :param slide_ratio: share of notes that are slide points
+    :param grand: 15 lane layout of PIANO/FORTE charts, with note widths in status
+    :param seed: seed or np.random.RandomState for reproducible charts
+    :return: DataFrame of exactly note_count notes sorted by time
+    """
+    if long_ratio + flick_ratio + slide_ratio > 1:
+        raise ValueError("Long, flick and slide ratios add up to more than 1")
+    rng = _get_rng(seed)
+    builder = _ChartBuilder(grand, rng)
+    # Chance of starting each kind of event, weighted by how many notes the event adds
+    weights = np.array([1 - long_ratio - flick_ratio - slide_ratio, long_ratio / 2, flick_ratio / 2, slide_ratio / 3])
+    weights = weights / weights.sum()
+    time = start
+    added = 0
+    while added < note_count:
+        remaining = note_count - added
+        kind = rng.choice(4, p=weights)
+        if kind == 1 and remaining >= 2:
+            added += builder.long(time)
+        elif kind == 2 and remaining >= 2:
+            added += builder.flick(time, min(remaining, int(rng.randint(2, 4))))
+        elif kind == 3 and remaining >= 2:
+            added += builder.slide(time, min(remaining, int(rng.randint(2, 5))))
+        else:
+            added += builder.tap(time)
+        time += max(MIN_GAP, rng.exponential(1 / density))
+    return builder.to_frame()
+
+
+def generate_card(skill_type, color=None, timer=None, leader=None, rarity=8, seed=None):
+    """
+    Build a max level card with the given skill_type and no potentials, without looking it up in master.db.
+
+    :param timer: (interval, duration, 'h' or 'm') like COMMON_TIMERS, random if None
+    :param leader: Leader of the card, no leader skill if None
+    """
+    if skill_type not in SKILL_VALUES:
+        raise ValueError("Unknown skill type {}".format(skill_type))
+    rng = _get_rng(seed)
+    if color is None:
+        color = Color(int(rng.randint(3)))
+    if timer is None:
+        timer = COMMON_TIMERS[rng.randint(len(COMMON_TIMERS))]
+    if leader is None:
+        leader = Leader()
+    interval, duration, probability = timer
+
+    boost = skill_type in BOOST_TYPES
+    values = list(SKILL_VALUES[skill_type]) if boost else Skill._handle_skill_type(skill_type,
+                                                                                   SKILL_VALUES[skill_type])
+    skill = Skill(
+        color=color,
+        duration=duration,
+        probability=PROBABILITIES[probability],
+        interval=interval,
+        values=values,
+        boost=boost,
+        color_target=skill_type in COLOR_TARGETS,
+        act=ACT_TYPES.get(skill_type),
+        bonus_skill=0,
+        skill_type=skill_type,
+        min_requirements=[1, 1, 1] if skill_type == 26 else None,
+        life_requirement=OVERLOAD_LIFE_COST if skill_type == 14 else 0,
+    )
+    vo, vi, da = (int(_) for _ in rng.randint(4000, 7000, 3))
+    li = int(rng.randint(30, 45))
+    card_id = next(_card_ids)
+    card = Card(vo=vo, vi=vi, da=da, li=li, base_vo=vo, base_vi=vi, base_da=da, base_li=li,
+                sk=skill, le=leader, color=color, ra=rarity, card_id=card_id, chara_id=card_id)
+    # Stats are final, there is nothing to refresh from master.db
+    card.is_refreshed = False
+    return card
+
+
+def generate_unit(skill_types=None, colors=None, seed=None):
+    """
+    :param skill_types: 5 skill types, random if None
+    :param colors: 5 Colors, cycling through all three if None so tricolor skills can trigger
+    """
+    rng = _get_rng(seed)
+    if skill_types is None:
+        skill_types = rng.choice(sorted(SKILL_VALUES), 5)
+    if colors is None:
+        colors = [Color(idx % 3) for idx in range(5)]
+    if len(skill_types) != 5 or len(colors) != 5:
+        raise ValueError("A unit needs 5 skill types and 5 colors")
+    return Unit(*[generate_card(int(skill_type), color, seed=rng) for skill_type, color in zip(skill_types, colors)])
+
+
+def generate_grand_unit(skill_types=None, seed=None):
+    """
+    :param skill_types: 15 skill types, random if None
+    """
+    rng = _get_rng(seed)
+    if skill_types is None:
+        skill_types = rng.choice(sorted(SKILL_VALUES), 15)
+    if len(skill_types) != 15:
+        raise ValueError("A grand unit needs 15 skill types")
+    return GrandUnit(*[generate_unit(skill_types[idx:idx + 5], seed=rng) for idx in range(0, 15, 5)])
+
+
+def generate_support(seed=None):
+    """
+    :return: support team in the layout Live.get_support caches, card id | vocal | visual | dance | total
+    """
+    rng = _get_rng(seed)
+    support = np.zeros((SUPPORT_SIZE, 5), dtype=int)
+    support[:, 0] = [next(_card_ids) for _ in range(SUPPORT_SIZE)]
+    support[:, 1:4] = rng.randint(2000, 3500, (SUPPORT_SIZE, 3))
+    support[:, 4] = support[:, 1:4].sum(axis=1)
+    return support
+
+
+def generate_live(unit, notes=None, difficulty=None, level=28, color=Color.ALL, seed=None, **chart_kwargs):
+    """
+    Build a Live, or a GrandLive for a GrandUnit, playing a synthetic chart with a synthetic support team.
+
+    :param notes: chart from generate_chart, generated from chart_kwargs if None
+    :param difficulty: FORTE for grand units and MASTER otherwise if None
+    """
+    rng = _get_rng(seed)
+    grand = isinstance(unit, GrandUnit)
+    if notes is None:
+        notes = generate_chart(grand=grand, seed=rng, **chart_kwargs)
+    if difficulty is None:
+        difficulty = Difficulty.FORTE if grand else Difficulty.MASTER
+    live = GrandLive() if grand else Live()
+    for chart_live in [live] + (live.unit_lives if grand else []):
+        chart_live.music_name = "Synthetic {} notes".format(len(notes))
+        chart_live.difficulty = difficulty
+        chart_live.notes = notes.copy()
+        chart_live.color = color
+        chart_live.level = level
+        chart_live.duration = notes.iloc[-1].sec + 2
+    live.set_unit(unit)
+    # After set_unit, which clears the cached support
+    live.support = generate_support(rng)
+    return live
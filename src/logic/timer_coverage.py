@@ -0,0 +1,186 @@
+"""
+Weighted timer coverage of every cached chart for arbitrary skill timers.
+
+Coverage is the share of the combo weight of a chart that falls under an active skill, the same figure stored in the
+Timer_* columns of live_detail_cache, but for any (interval, duration). All charts are concatenated into one note
+array, each chart shifted by its own offset, so a single searchsorted over the cumulative weights answers every
+activation window of every chart at once.
+"""
+from functools import lru_cache
+
+import numpy as np
+
+import customlogger as logger
+from db import db
+from static.live_values import WEIGHT_RANGE
+
+# Skills stop activating within 3 seconds of the last note
+END_CUTOFF_MS = 3000
+
+_live_detail_ids = None
+_chart_offsets = None
+_last_notes = None
+_note_times = None
+_cumulative_weights = None
+_total_weights = None
+
+
+def initialize_note_weight_db():
+    db.cachedb.execute("""
+        CREATE TABLE IF NOT EXISTS live_detail_weight_cache (
+            live_detail_id INTEGER UNIQUE PRIMARY KEY,
+            note_times BLOB NOT NULL,
+            note_weights BLOB NOT NULL
+        )
+    """)
+    db.cachedb.commit()
+
+
+def get_cached_live_detail_ids():
+    initialize_note_weight_db()
+    return {_[0] for _ in db.cachedb.execute_and_fetchall("SELECT live_detail_id FROM live_detail_weight_cache")}
+
+
+def get_missing_live_detail_ids():
+    """
+    :return: live detail ids recorded without notes because their chart could not be found
+    """
+    initialize_note_weight_db()
+    return {_[0] for _ in db.cachedb.execute_and_fetchall(
+        "SELECT live_detail_id FROM live_detail_weight_cache WHERE length(note_times) = 0")}
+
+
+def insert_note_weights(rows):
+    """
+    :param rows: iterable of (live_detail_id, note times in seconds, combo weight of every note), empty arrays to
+    record a chart that could not be found
+    """
+    initialize_note_weight_db()
+    db.cachedb.executemany("""
+        INSERT OR REPLACE INTO live_detail_weight_cache (live_detail_id, note_times, note_weights)
+        VALUES (?,?,?)
+    """, [
+        [live_detail_id,
+         np.round(np.asarray(note_times) * 1000).astype(np.int32).tobytes(),
+         np.asarray(note_weights, dtype=np.float32).tobytes()]
+        for live_detail_id, note_times, note_weights in rows
+    ])
+    db.cachedb.commit()
+    invalidate()
+
+
+def get_note_weights(note_count):
+    """
+    :return: combo weight of every note of a chart with note_count notes
+    """
+    combo_thresholds = (note_count * WEIGHT_RANGE[:, 0] / 100).astype(int)
+    # Correct for deresute's rounding method
+    combo_thresholds[1:-1] -= 1
+    return np.repeat(WEIGHT_RANGE[:-1, 1], combo_thresholds[1:] - combo_thresholds[:-1])
+
+
+def invalidate():
+    global _live_detail_ids
+    _live_detail_ids = None
+    get_coverage.cache_clear()
+
+
+def _load():
+    if _live_detail_ids is not None:
+        return
+    initialize_note_weight_db()
+    data = db.cachedb.execute_and_fetchall("""
+        SELECT live_detail_id, note_times, note_weights FROM live_detail_weight_cache ORDER BY live_detail_id
+    """)
+    _set_charts([
+        (live_detail_id, np.frombuffer(times, dtype=np.int32), np.frombuffer(weights, dtype=np.float32))
+        for live_detail_id, times, weights in data
+        # Charts without musicscore are only recorded so they are not looked for again
+        if len(times) > 0
+    ])
+
+
+def _set_charts(data):
+    """
+    :param data: list of (live_detail_id, note times in ms, combo weight of every note)
+    """
+    global _live_detail_ids, _chart_offsets, _last_notes, _note_times, _cumulative_weights, _total_weights
+    get_coverage.cache_clear()
+    live_detail_ids = np.array([_[0] for _ in data], dtype=np.int64)
+    if len(data) == 0:
+        times = np.zeros(0, dtype=np.int64)
+        weights = np.zeros(0, dtype=np.float64)
+        last_notes = np.zeros(0, dtype=np.int64)
+        total_weights = np.zeros(0, dtype=np.float64)
+    else:
+        times = np.concatenate([_[1] for _ in data]).astype(np.int64)
+        weights = np.concatenate([_[2] for _ in data]).astype(np.float64)
+        last_notes = np.array([_[1][-1] for _ in data], dtype=np.int64)
+        total_weights = np.array([_[2].sum() for _ in data], dtype=np.float64)
+    # Shift every chart past the end of the previous one so the concatenated times stay sorted
+    chart_lengths = np.array([len(_[1]) for _ in data], dtype=np.int64)
+    chart_offsets = np.concatenate([[0], np.cumsum(last_notes + 1)[:-1]]).astype(np.int64)
+    times += np.repeat(chart_offsets, chart_lengths)
+
+    _chart_offsets = chart_offsets
+    _last_notes = last_notes
+    _note_times = times
+    _cumulative_weights = np.concatenate([[0], np.cumsum(weights)])
+    _total_weights = total_weights
+    _live_detail_ids = live_detail_ids
+    logger.debug("Loaded note weights of {} charts".format(len(live_detail_ids)))
+
+
+def _compute_coverage(interval, duration, chart_offsets, last_notes, note_times, cumulative_weights, total_weights):
+    interval_ms = int(round(interval * 1000))
+    # Skills lasting the whole interval cover everything but the notes exactly at the activations
+    duration_ms = min(int(round(duration * 1000)), interval_ms - 1)
+    # Activations happen at every multiple of the interval, except at 0 and too close to the last note
+    activations = np.maximum((last_notes - END_CUTOFF_MS) // interval_ms, 0)
+    chart_idx = np.repeat(np.arange(len(activations)), activations)
+    first_activation = np.concatenate([[0], np.cumsum(activations)[:-1]]).astype(np.int64)
+    k = np.arange(len(chart_idx), dtype=np.int64) - np.repeat(first_activation, activations) + 1
+    window_start = chart_offsets[chart_idx] + k * interval_ms
+    # A note is covered if it lands in (start, start + duration], the end is clipped so no window reaches the next chart
+    window_end = np.minimum(window_start + duration_ms, chart_offsets[chart_idx] + last_notes[chart_idx])
+    covered = cumulative_weights[np.searchsorted(note_times, window_end, side='right')] \
+              - cumulative_weights[np.searchsorted(note_times, window_start, side='right')]
+    return np.bincount(chart_idx, weights=covered, minlength=len(activations)) / total_weights
+
+
+@lru_cache(maxsize=64)
+def get_coverage(interval, duration):
+    """
+    Weighted coverage of a timer skill on every cached chart.
+
+    :param interval: skill interval in seconds
+    :param duration: skill duration in seconds
+    :return: dict of live_detail_id to coverage in [0, 1]
+    """
+    _load()
+    coverage = _compute_coverage(interval, duration, _chart_offsets, _last_notes, _note_times, _cumulative_weights,
+                                 _total_weights)
+    return dict(zip(_live_detail_ids.tolist(), coverage.tolist()))
+
+
+def get_chart_coverage(note_times, interval, duration):
+    """
+    Weighted coverage of a timer skill on a single chart, cached or not, e.g. the notes of a loaded Live.
+
+    :param note_times: note times in seconds
+    :return: coverage in [0, 1]
+    """
+    times = np.round(np.asarray(note_times) * 1000).astype(np.int64)
+    weights = get_note_weights(len(times))
+    return float(_compute_coverage(interval, duration, np.zeros(1, dtype=np.int64), times[-1:], times,
+                                   np.concatenate([[0], np.cumsum(weights)]), np.array([weights.sum()]))[0])
+
+
+def rank_charts(interval, duration, live_detail_ids=None):
+    """
+    :return: list of (live_detail_id, coverage), best covered chart first
+    """
+    coverage = get_coverage(interval, duration)
+    if live_detail_ids is not None:
+        coverage = {_: coverage[_] for _ in live_detail_ids if _ in coverage}
+    return sorted(coverage.items(), key=lambda x: x[1], reverse=True)
@@ -1,23 +1,33 @@
-import requests
+from network.http_client import client
 
-_headers = {
+HEADERS = {
     'X-Unity-Version': '2018.3.8f1',
     'Accept-Encoding': 'gzip',
 }
 
 
+def get_resource_url(data_type, resource_hash):
+    return "https://asset-starlight-stage.akamaized.net/dl/resources/{}/{}/{}".format(data_type, resource_hash[:2],
+                                                                                      resource_hash)
+
+
 def get_resources(data_type, resource_hash):
-    return requests.get(
-        "https://asset-starlight-stage.akamaized.net/dl/resources/{}/{}/{}".format(data_type, resource_hash[:2],
-                                                                                   resource_hash), headers=_headers)
+    return client.get(get_resource_url(data_type, resource_hash), headers=HEADERS)
+
+
+def get_manifest_url(truth_version=None):
+    if truth_version is None:
+        from network import kirara_query
+        truth_version = kirara_query.get_truth_version()
+    return "https://asset-starlight-stage.akamaized.net/dl/{}/manifests/Android_AHigh_SHigh".format(truth_version)
 
 
 def get_manifests():
-    from network import kirara_query
-    truth_version = kirara_query.get_truth_version()
-    return requests.get(
-        "https://asset-starlight-stage.akamaized.net/dl/{}/manifests/Android_AHigh_SHigh".format(truth_version),
-        headers=_headers)
+    return client.get(get_manifest_url(), headers=HEADERS)
+
+
+def get_db_url(resource_hash):
+    return get_resource_url('Generic', resource_hash)
 
 
 def get_db(resource_hash):
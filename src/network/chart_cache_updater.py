@@ -5,35 +5,43 @@ from io import StringIO
 
 import numpy as np
 import pandas as pd
-import requests
 
 import customlogger as logger
 from db import db
 from logic.live import classify_note_vectorized
+from logic import timer_coverage
 from logic.skill import COMMON_TIMERS
 from network import meta_updater
-from settings import REMOTE_TRANSLATED_SONG_URL, REMOTE_CACHE_SCORES_URL, MUSICSCORES_PATH
-from static.live_values import WEIGHT_RANGE
+from network.http_client import client
+from settings import REMOTE_TRANSLATED_SONG_URL, REMOTE_CACHE_SCORES_URL, MUSICSCORES_PATH, MAX_WORKERS
 from static.note_type import NoteType
+from utils.misc import get_process_pool
 
 BLACKLIST = "1901,1902,1903,1904,90001"
+# Below this many charts the process pool costs more to start than it saves
+MIN_PARALLEL_CHARTS = 20
+
+LIVE_DETAIL_CACHE_COLUMNS = [
+    "live_detail_id", "live_id", "sort", "color", "performers", "special_keys", "jp_name", "name", "difficulty",
+    "level", "duration", "Tap", "Long", "Flick", "Slide",
+    "Timer_7h", "Timer_9h", "Timer_11h", "Timer_12m", "Timer_6m", "Timer_9m", "Timer_11m", "Timer_13h"
+]
 
 
 def _check_remote_cache(url):
     initialize_score_db()
-    response = requests.get(url)
+    response = client.get(url)
     if response.status_code == 404:
         logger.debug("No remote live detail cache found at {}".format(url))
         return
     df = pd.read_csv(StringIO(response.content.decode("utf-8")))
     logger.debug("Remote live detail cache found at {}, {} rows".format(url, len(df)))
-    for _, row in df.iterrows():
-        _insert_into_live_detail_cache(row)
+    _insert_into_live_detail_cache(df.to_dict('records'))
     db.cachedb.commit()
 
 
 def _get_translated_name_df():
-    response = requests.get(REMOTE_TRANSLATED_SONG_URL)
+    response = client.get(REMOTE_TRANSLATED_SONG_URL)
     df = pd.read_csv(StringIO(response.content.decode("utf-8")))
     return {
         r['id']: r['name'] for _, r in df.iterrows()
@@ -192,6 +200,10 @@ def _merge_live_list(live_list):
 
 
 def _expand_song_list(song_list):
+    levels = {
+        live_detail_id: level
+        for live_detail_id, level in db.masterdb.execute_and_fetchall("SELECT id, level_vocal FROM live_detail")
+    }
     res_dict = dict()
     for value in song_list.values():
         for diff, live_detail_id, live_id in value['diff']:
@@ -200,9 +212,7 @@ def _expand_song_list(song_list):
             res_dict[live_detail_id]['live_detail_id'] = live_detail_id
             res_dict[live_detail_id]['live_id'] = live_id
             res_dict[live_detail_id]['diff'] = int(diff[1:])
-            res_dict[live_detail_id]['level'] = \
-                db.masterdb.execute_and_fetchone("SELECT level_vocal FROM live_detail WHERE live_detail.id = ?",
-                                                 (live_detail_id,))[0]
+            res_dict[live_detail_id]['level'] = levels[live_detail_id]
     return res_dict
 
 
@@ -246,50 +256,23 @@ def has_cached_live_details():
         return False
 
 
-def _insert_into_live_detail_cache(hashable):
-    db.cachedb.execute("""
-            INSERT OR IGNORE INTO live_detail_cache( live_detail_id, live_id, sort, color, performers, special_keys,
-             jp_name, name, difficulty, level, duration, Tap, Long, Flick, Slide,
-             Timer_7h, Timer_9h, Timer_11h, Timer_12m, Timer_6m, Timer_9m, Timer_11m, Timer_13h)
-            VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
-        """, [
-        hashable["live_detail_id"],
-        hashable["live_id"],
-        hashable["sort"],
-        hashable["color"],
-        hashable["performers"],
-        hashable["special_keys"],
-        hashable["jp_name"],
-        hashable["name"],
-        hashable["difficulty"],
-        hashable["level"],
-        hashable["duration"],
-        hashable["Tap"],
-        hashable["Long"],
-        hashable["Flick"],
-        hashable["Slide"],
-        hashable["Timer_7h"],
-        hashable["Timer_9h"],
-        hashable["Timer_11h"],
-        hashable["Timer_12m"],
-        hashable["Timer_6m"],
-        hashable["Timer_9m"],
-        hashable["Timer_11m"],
-        hashable["Timer_13h"]
-    ])
+def _insert_into_live_detail_cache(rows):
+    db.cachedb.executemany("""
+            INSERT OR IGNORE INTO live_detail_cache( {})
+            VALUES ({})
+        """.format(", ".join(LIVE_DETAIL_CACHE_COLUMNS), ",".join(["?"] * len(LIVE_DETAIL_CACHE_COLUMNS))),
+                           [[row[column] for column in LIVE_DETAIL_CACHE_COLUMNS] for row in rows])
 
 
 def _overwrite_song_name(expanded_song_list):
-    for live_detail_id, song_data in expanded_song_list.items():
-        db.cachedb.execute("""
-                    UPDATE live_detail_cache
-                    SET name = ?, special_keys = ?
-                    WHERE live_detail_id = ?
-                """, [
-            song_data["name"],
-            song_data["special_keys"],
-            live_detail_id,
-        ])
+    db.cachedb.executemany("""
+                UPDATE live_detail_cache
+                SET name = ?, special_keys = ?
+                WHERE live_detail_id = ?
+            """, [
+        [song_data["name"], song_data["special_keys"], live_detail_id]
+        for live_detail_id, song_data in expanded_song_list.items()
+    ])
     db.cachedb.commit()
 
 
@@ -297,6 +280,72 @@ def _is_active(time, interval, duration, last_note):
     return (time > interval) & (time % interval > 0) & (time % interval <= duration) & (time // interval * interval <= last_note - 3)
 
 
+def _get_chart_stats(notes_data, diff):
+    stats = dict()
+    stats["duration"] = notes_data.iloc[-1]['sec']
+    if diff == 6:
+        notes_data = notes_data[(notes_data["type"] < 8) & ((notes_data["visible"].isna()) | (notes_data["visible"] >= 0))].reset_index(drop=True)
+    else:
+        notes_data = notes_data[notes_data["type"] < 8].reset_index(drop=True)
+    notes_data['note_type'] = classify_note_vectorized(notes_data)
+    note_count = dict(notes_data['note_type'].value_counts())
+    for note_type in NoteType:
+        key_str = note_type.name.capitalize()
+        if note_type in note_count:
+            stats[key_str] = int(note_count[note_type])
+        else:
+            stats[key_str] = 0
+    multipliers = timer_coverage.get_note_weights(len(notes_data))
+    for timer in COMMON_TIMERS:
+        stats['Timer_{}{}'.format(timer[0], timer[2])] = multipliers[
+            _is_active(notes_data['sec'], timer[0], timer[1], notes_data.iloc[-1]['sec'])
+        ].sum() / multipliers.sum()
+    return stats, notes_data['sec'].to_numpy(), multipliers
+
+
+def _compute_live_stats(job):
+    """
+    Compute the chart stats of all requested difficulties of one live. Runs in a worker process, so it reads the
+    musicscore db directly instead of going through the shared connections.
+
+    :param job: (live_id, [(live_detail_id, diff), ...])
+    :return: list of (live_detail_id, (stats, note times, note weights)), None instead if the chart is missing
+    """
+    live_id, charts = job
+    score_path = MUSICSCORES_PATH / "musicscores_m{:03d}.db".format(live_id)
+    if not score_path.exists():
+        return [(live_detail_id, None) for live_detail_id, _ in charts]
+    results = list()
+    score_conn = sqlite3.connect(str(score_path))
+    try:
+        for live_detail_id, diff in charts:
+            score = score_conn.execute(
+                """
+                SELECT * FROM blobs WHERE name LIKE "musicscores/m{:03d}/{:d}_{:d}.csv"
+                """.format(live_id, live_id, diff)
+            ).fetchone()
+            if score is None:
+                results.append((live_detail_id, None))
+                continue
+            notes_data = pd.read_csv(StringIO(score[1].decode()))
+            results.append((live_detail_id, _get_chart_stats(notes_data, diff)))
+    finally:
+        score_conn.close()
+    return results
+
+
+def _compute_all_live_stats(jobs):
+    if len(jobs) == 0:
+        return
+    if sum(len(charts) for _, charts in jobs) < MIN_PARALLEL_CHARTS:
+        for job in jobs:
+            yield from _compute_live_stats(job)
+        return
+    with get_process_pool(MAX_WORKERS) as executor:
+        for results in executor.map(_compute_live_stats, jobs):
+            yield from results
+
+
 def update_cache_scores():
     if not has_cached_live_details():
         initialize_score_db()
@@ -306,43 +355,40 @@ def update_cache_scores():
                               db.cachedb.execute_and_fetchall("SELECT live_detail_id FROM live_detail_cache")}
     new_live_detail_ids = set(expanded_song_list.keys()).difference(cached_live_detail_ids)
     logger.debug("Uncached live detail IDs: {}".format(new_live_detail_ids))
-    for ldid in new_live_detail_ids:
+    # Charts cached before note weights were stored only need their weights
+    unweighted_live_detail_ids = set(expanded_song_list.keys()).difference(timer_coverage.get_cached_live_detail_ids())
+
+    # Charts found missing before are only looked for again once their musicscore shows up
+    missing_live_detail_ids = {
+        ldid for ldid in timer_coverage.get_missing_live_detail_ids()
+        if ldid in expanded_song_list and not (MUSICSCORES_PATH / "musicscores_m{:03d}.db".format(
+            expanded_song_list[ldid]["live_id"])).exists()
+    }
+
+    # Group by live so every musicscore db is opened once
+    charts_by_live = defaultdict(list)
+    for ldid in sorted(new_live_detail_ids.union(unweighted_live_detail_ids).difference(missing_live_detail_ids)):
+        charts_by_live[expanded_song_list[ldid]["live_id"]].append((ldid, expanded_song_list[ldid]["diff"]))
+    jobs = list(charts_by_live.items())
+
+    new_rows = list()
+    note_weights = list()
+    for ldid, result in _compute_all_live_stats(jobs):
         live_data = expanded_song_list[ldid]
-        with db.CustomDB(MUSICSCORES_PATH / "musicscores_m{:03d}.db".format(live_data["live_id"])) as score_conn:
-            try:
-                score = score_conn.execute_and_fetchone(
-                    """
-                    SELECT * FROM blobs WHERE name LIKE "musicscores/m{:03d}/{:d}_{:d}.csv"
-                    """.format(live_data["live_id"], live_data["live_id"], live_data["diff"])
-                )[1]
-            except TypeError:
-                logger.debug("Cannot find chart for live detail ID {} difficulty {}".format(ldid, live_data["diff"]))
-                continue
-        notes_data = pd.read_csv(StringIO(score.decode()))
-        live_data["duration"] = notes_data.iloc[-1]['sec']
-        if live_data["diff"] == 6:
-            notes_data = notes_data[(notes_data["type"] < 8) & ((notes_data["visible"].isna()) | (notes_data["visible"] >= 0))].reset_index(drop=True)
-        else:
-            notes_data = notes_data[notes_data["type"] < 8].reset_index(drop=True)
-        notes_data['note_type'] = classify_note_vectorized(notes_data)
-        note_count = dict(notes_data['note_type'].value_counts())
-        for note_type in NoteType:
-            key_str = note_type.name.capitalize()
-            if note_type in note_count:
-                live_data[key_str] = int(note_count[note_type])
-            else:
-                live_data[key_str] = 0
+        if result is None:
+            logger.debug("Cannot find chart for live detail ID {} difficulty {}".format(ldid, live_data["diff"]))
+            note_weights.append((ldid, [], []))
+            continue
+        stats, note_times, multipliers = result
+        note_weights.append((ldid, note_times, multipliers))
+        if ldid not in new_live_detail_ids:
+            continue
+        live_data.update(stats)
         live_data['difficulty'] = live_data['diff']
-        total_notes = len(notes_data)
-        combo_thresholds = (total_notes * WEIGHT_RANGE[:, 0] / 100).astype(int)
-        # Correct for deresute's rounding method
-        combo_thresholds[1:-1] -= 1
-        multipliers = np.repeat(WEIGHT_RANGE[:-1, 1], combo_thresholds[1:] - combo_thresholds[:-1])
-        for timer in COMMON_TIMERS:
-            live_data['Timer_{}{}'.format(timer[0], timer[2])] = multipliers[
-                _is_active(notes_data['sec'], timer[0], timer[1], notes_data.iloc[-1]['sec'])
-            ].sum() / multipliers.sum()
-        _insert_into_live_detail_cache(live_data)
+        new_rows.append(live_data)
+    _insert_into_live_detail_cache(new_rows)
+    if len(note_weights) > 0:
+        timer_coverage.insert_note_weights(note_weights)
     _overwrite_song_name(expanded_song_list)
     db.cachedb.commit()
 
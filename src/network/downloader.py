@@ -0,0 +1,128 @@
+import os
+import shutil
+import time
+from concurrent.futures import as_completed
+from concurrent.futures.thread import ThreadPoolExecutor
+
+import requests
+
+import customlogger as logger
+from network import http_client
+from settings import MAX_WORKERS
+from utils import storage
+from utils.misc import decompress_to_file
+
+PART_SUFFIX = ".part"
+COMPRESSED_SUFFIX = ".lz4"
+CHUNK_SIZE = 1 << 20
+
+
+def _get_part_path(path):
+    return path.with_name(path.name + PART_SUFFIX)
+
+
+def _get_compressed_part_path(path):
+    return path.with_name(path.name + COMPRESSED_SUFFIX + PART_SUFFIX)
+
+
+def _move_into_place(part_path, path):
+    try:
+        os.replace(str(part_path), str(path))
+    except PermissionError:
+        # Target is held open elsewhere (e.g. a connected sqlite db on Windows), overwrite it in place instead
+        shutil.copyfile(str(part_path), str(path))
+        part_path.unlink()
+
+
+def _stream_to_file(response, path):
+    with storage.get_writer(path, 'wb') as fwb:
+        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+            fwb.write(chunk)
+
+
+def cleanup_partial_downloads(directory):
+    if not directory.exists():
+        return
+    for part_path in directory.glob("*" + PART_SUFFIX):
+        part_path.unlink()
+
+
+def download_file(client, url, path, headers=None, transform=None, decompress=False, retries=3, backoff=1.0):
+    """
+    Download url into path. The content is written to a sibling .part file first and renamed over path once
+    complete, so an interrupted download never leaves a truncated file behind.
+
+    With decompress, the LZ4 compressed response is streamed to disk in chunks and decompressed from there instead
+    of being held in memory.
+    """
+    part_path = _get_part_path(path)
+    compressed_part_path = _get_compressed_part_path(path)
+    for attempt in range(retries + 1):
+        try:
+            # Closing the response hands its connection back to the pool, which blocks once every connection is
+            # checked out
+            with client.get(url, headers=headers, stream=decompress) as response:
+                if response.status_code == 200:
+                    if decompress:
+                        _stream_to_file(response, compressed_part_path)
+                        decompress_to_file(compressed_part_path, part_path)
+                        compressed_part_path.unlink()
+                    else:
+                        content = response.content
+                        if transform is not None:
+                            content = transform(content)
+                        with storage.get_writer(part_path, 'wb') as fwb:
+                            fwb.write(content)
+                    _move_into_place(part_path, path)
+                    return True
+                # Client errors will not go away by retrying
+                if 400 <= response.status_code < 500:
+                    logger.debug("Download of {} failed with status {}".format(url, response.status_code))
+                    return False
+                logger.debug("Download of {} failed with status {}, attempt {}/{}".format(
+                    url, response.status_code, attempt + 1, retries + 1))
+        except requests.RequestException as e:
+            logger.debug("Download of {} failed: {}, attempt {}/{}".format(url, e, attempt + 1, retries + 1))
+        if attempt < retries:
+            time.sleep(backoff * 2 ** attempt)
+    for leftover in (part_path, compressed_part_path):
+        if leftover.exists():
+            leftover.unlink()
+    return False
+
+
+def download_all(jobs, client=None, headers=None, transform=None, decompress=False, on_complete=None,
+                 max_workers=MAX_WORKERS, retries=3, backoff=1.0):
+    """
+    Download all jobs concurrently.
+
+    :param jobs: iterable of (key, url, path)
+    :param on_complete: called with the key of every successful download, always from the calling thread
+    :return: list of keys that failed to download
+    """
+    jobs = list(jobs)
+    if len(jobs) == 0:
+        return list()
+    if client is None:
+        client = http_client.client
+    failed = list()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(download_file, client, url, path, headers, transform, decompress, retries, backoff): key
+            for key, url, path in jobs
+        }
+        for idx, future in enumerate(as_completed(futures)):
+            key = futures[future]
+            try:
+                success = future.result()
+            except Exception as e:
+                logger.debug("Download of {} raised {}".format(key, e))
+                success = False
+            if not success:
+                failed.append(key)
+                continue
+            if on_complete is not None:
+                on_complete(key)
+            if (idx + 1) % 50 == 0:
+                logger.info("Downloaded {}/{} files".format(idx + 1, len(jobs)))
+    return failed
@@ -0,0 +1,38 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from settings import HTTP_TIMEOUT, HTTP_RETRIES, HTTP_MAX_CONNECTIONS_PER_HOST
+
+
+class HttpClient:
+    """
+    Shared session for all network modules. Connections are kept alive and pooled per host, and the pool blocks
+    instead of opening more than max_connections_per_host connections to the same host at once.
+    """
+
+    def __init__(self, timeout=HTTP_TIMEOUT, retries=HTTP_RETRIES,
+                 max_connections_per_host=HTTP_MAX_CONNECTIONS_PER_HOST):
+        self.timeout = timeout
+        self.session = requests.Session()
+        # Only retry failed connections here, bad responses are up to the caller
+        adapter = HTTPAdapter(pool_connections=max_connections_per_host,
+                              pool_maxsize=max_connections_per_host,
+                              pool_block=True,
+                              max_retries=Retry(total=retries, connect=retries, read=0, status=0,
+                                                backoff_factor=0.5))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        # gzip is requested and decoded transparently by requests
+        self.session.headers.update({'Accept-Encoding': 'gzip, deflate'})
+
+    def get(self, url, headers=None, timeout=None, **kwargs):
+        if timeout is None:
+            timeout = self.timeout
+        return self.session.get(url, headers=headers, timeout=timeout, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+client = HttpClient()
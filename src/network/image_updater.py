@@ -1,52 +1,124 @@
 import os
-import time
 import zipfile
-from concurrent.futures.thread import ThreadPoolExecutor
 
-import requests
 from PIL import Image
 
 import customlogger as logger
+from network import downloader
 from network.kirara_query import _base_query
-from settings import IMAGE_PATH, IMAGE_PATH32, IMAGE_PATH64, ZIP_PATH, MAX_WORKERS
-from utils import storage
+from settings import IMAGE_PATH, IMAGE_PATH32, IMAGE_PATH64, IMAGE_ATLAS_PATH, ZIP_PATH, MAX_WORKERS
+from utils import atlas
+from utils.misc import get_process_pool
 
 FORMAT = "https://hidamarirhodonite.kirara.ca/icon_card/{:06d}.png"
+THUMBNAIL_SIZES = {
+    32: IMAGE_PATH32,
+    64: IMAGE_PATH64,
+}
+# Below this many images the process pool costs more to start than it saves
+MIN_PARALLEL_IMAGES = 20
+ATLAS_BATCH_SIZE = 500
 
 
-def update_image(card_id, sleep=0.1):
-    path = IMAGE_PATH / "{:06d}.png".format(card_id)
-    path32 = IMAGE_PATH32 / "{:06d}.jpg".format(card_id)
-    path64 = IMAGE_PATH64 / "{:06d}.jpg".format(card_id)
-    if not storage.exists(path):
-        time.sleep(sleep)
-        r = requests.get(FORMAT.format(card_id))
-        if r.status_code == 200:
-            with storage.get_writer(path, 'wb') as fwb:
-                for chunk in r:
-                    fwb.write(chunk)
-    if not path64.exists() and not path32.exists():
-        img = Image.open(str(path)).convert('RGB')
-        if not path32.exists():
-            img.resize((32, 32), Image.ANTIALIAS).save(str(path32), format='JPEG')
-        if not path64.exists():
-            img.resize((64, 64), Image.ANTIALIAS).save(str(path64), format='JPEG')
-
-
-def update_all(sleep=0.1):
+def _list_ids(directory):
+    if not directory.exists():
+        return set()
+    ids = set()
+    for name in os.listdir(str(directory)):
+        stem, _, extension = name.partition(".")
+        if stem.isdigit() and extension in ("png", "jpg"):
+            ids.add(int(stem))
+    return ids
+
+
+def resize_image(card_id, sizes, write_sizes):
+    """
+    Decode the icon of the card once and emit every thumbnail size from it.
+
+    :param sizes: thumbnail sizes to return as RGBA tiles for the atlas
+    :param write_sizes: thumbnail sizes to also write as JPEG
+    :return: (card_id, {size: RGBA bytes}), None instead if the icon cannot be read
+    """
+    try:
+        with Image.open(str(IMAGE_PATH / "{:06d}.png".format(card_id))) as img:
+            img = img.convert('RGBA')
+    except OSError:
+        return None
+    tiles = dict()
+    for size in set(sizes).union(write_sizes):
+        resized = img.resize((size, size), Image.ANTIALIAS)
+        if size in write_sizes:
+            resized.convert('RGB').save(str(THUMBNAIL_SIZES[size] / "{:06d}.jpg".format(card_id)), format='JPEG')
+        if size in sizes:
+            tiles[size] = resized.tobytes()
+    return card_id, tiles
+
+
+def _resize_job(job):
+    return resize_image(*job)
+
+
+def _resize_all(jobs):
+    if len(jobs) < MIN_PARALLEL_IMAGES:
+        yield from map(_resize_job, jobs)
+        return
+    with get_process_pool(MAX_WORKERS) as executor:
+        yield from executor.map(_resize_job, jobs, chunksize=16)
+
+
+def _fetch_missing(card_ids):
+    existing_ids = _list_ids(IMAGE_PATH)
+    jobs = [
+        (card_id, FORMAT.format(card_id), IMAGE_PATH / "{:06d}.png".format(card_id))
+        for card_id in sorted(set(card_ids).difference(existing_ids))
+    ]
+    if len(jobs) == 0:
+        return
+    logger.info("Downloading {} icons...".format(len(jobs)))
+    downloader.cleanup_partial_downloads(IMAGE_PATH)
+    failed = downloader.download_all(jobs)
+    if len(failed) > 0:
+        logger.debug("Failed to download {} icons: {}".format(len(failed), failed))
+
+
+def _resize_missing(card_ids):
+    available_ids = _list_ids(IMAGE_PATH)
+    thumbnail_ids = {size: _list_ids(path) for size, path in THUMBNAIL_SIZES.items()}
+    packed_ids = {size: set(atlas.read_index(IMAGE_ATLAS_PATH, size).tolist()) for size in THUMBNAIL_SIZES}
+    jobs = list()
+    for card_id in sorted(available_ids.intersection(card_ids)):
+        sizes = [size for size in THUMBNAIL_SIZES if card_id not in packed_ids[size]]
+        write_sizes = [size for size in THUMBNAIL_SIZES if card_id not in thumbnail_ids[size]]
+        if len(sizes) > 0 or len(write_sizes) > 0:
+            jobs.append((card_id, sizes, write_sizes))
+    if len(jobs) == 0:
+        return
+    logger.info("Resizing {} icons...".format(len(jobs)))
+    tiles = {size: list() for size in THUMBNAIL_SIZES}
+    for idx, result in enumerate(_resize_all(jobs)):
+        if result is not None:
+            card_id, card_tiles = result
+            for size, tile in card_tiles.items():
+                tiles[size].append((card_id, tile))
+        # Pack in batches so the tiles of a full rebuild are never all held at once
+        if (idx + 1) % ATLAS_BATCH_SIZE == 0 or idx + 1 == len(jobs):
+            for size, size_tiles in tiles.items():
+                atlas.append(IMAGE_ATLAS_PATH, size, size_tiles)
+                size_tiles.clear()
+
+
+def update_all():
     logger.info("Updating images, please wait...")
     _try_extract_cache()
-    if not IMAGE_PATH64.exists():
-        IMAGE_PATH64.mkdir()
-    if not IMAGE_PATH32.exists():
-        IMAGE_PATH32.mkdir()
+    for path in THUMBNAIL_SIZES.values():
+        if not path.exists():
+            path.mkdir(parents=True)
     card_data = _base_query("list/card_t")['result']
     logger.debug("Getting icons for {} cards".format(len(card_data)))
     card_ids = [int(card['id']) for card in card_data]
     card_ids_plus = [_ + 1 for _ in card_ids]
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        for card_id in card_ids + card_ids_plus:
-            executor.submit(update_image, card_id, sleep)
+    _fetch_missing(card_ids + card_ids_plus)
+    _resize_missing(card_ids + card_ids_plus)
 
 
 def _try_extract_cache():
@@ -54,6 +126,3 @@ def _try_extract_cache():
         with zipfile.ZipFile(ZIP_PATH, 'r') as zip_ref:
             zip_ref.extractall(IMAGE_PATH)
         os.remove(ZIP_PATH)
-
-
-update_all(0.1)
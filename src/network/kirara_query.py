@@ -1,13 +1,11 @@
 import json
 
-import requests
-
-from db import db
+from network.http_client import client
 
 
 def _base_query(query):
     query_url = "https://starlight.kirara.ca/api/v1/{}".format(query)
-    response = requests.get(query_url)
+    response = client.get(query_url)
     return json.loads(response.content)
 
 
@@ -16,6 +14,8 @@ def get_truth_version():
 
 
 def update_chara_data():
+    # Imported here so that querying kirara does not open the databases before they are updated
+    from db import db
     chara_data = _base_query("list/char_t")['result']
     db.cachedb.execute("""
         CREATE TABLE IF NOT EXISTS chara_cache (
@@ -1,35 +1,70 @@
 import logging
 import sqlite3
 
+import requests
+
 import customlogger as logger
-from network import cgss_query
+from exceptions import DownloadFailedException
+from network import cgss_query, downloader, kirara_query
+from network.http_client import client
 from settings import *
 from utils import storage
-from utils.misc import decompress
 
 
-def _update_manifest():
-    logger.debug("Updating manifest.db")
-    manifest_response = cgss_query.get_manifests()
+def _get_version_cache_connection():
+    conn = sqlite3.connect(str(get_cachedb_path()))
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS db_version_cache (
+            name TEXT UNIQUE PRIMARY KEY,
+            version TEXT NOT NULL
+        )
+    """)
+    return conn
 
-    with storage.get_writer(MANIFEST_PATH, 'wb') as fwb:
-        fwb.write(decompress(manifest_response.content))
-    logger.info("manifest.db updated")
 
+def _get_cached_version(name):
+    conn = _get_version_cache_connection()
+    result = conn.execute("SELECT version FROM db_version_cache WHERE name = ?", [name]).fetchone()
+    conn.close()
+    return result[0] if result is not None else None
 
-def _update_masterdb():
-    logger.debug("Updating master.db")
-    manifest_conn = sqlite3.connect(get_manifestdb_path())
-    manifest_c = manifest_conn.cursor()
 
+def _set_cached_version(name, version):
+    conn = _get_version_cache_connection()
+    conn.execute("INSERT OR REPLACE INTO db_version_cache (name, version) VALUES (?,?)", [name, str(version)])
+    conn.commit()
+    conn.close()
+
+
+def _get_master_hash():
+    manifest_conn = sqlite3.connect(str(get_manifestdb_path()))
+    manifest_c = manifest_conn.cursor()
     manifest_c.execute('SELECT hash FROM manifests WHERE name="master.mdb"')
     master_hash = manifest_c.fetchone()[0]
-    master_response = cgss_query.get_db(master_hash)
-
-    with storage.get_writer(MASTERDB_PATH, 'wb') as fwb:
-        fwb.write(decompress(master_response.content))
     manifest_c.close()
     manifest_conn.close()
+    return master_hash
+
+
+def _update_manifest(truth_version=None):
+    logger.debug("Updating manifest.db")
+    if truth_version is None:
+        truth_version = kirara_query.get_truth_version()
+    if not downloader.download_file(client, cgss_query.get_manifest_url(truth_version), MANIFEST_PATH,
+                                    headers=cgss_query.HEADERS, decompress=True):
+        raise DownloadFailedException("Failed to download manifest.db")
+    _set_cached_version("manifest", truth_version)
+    logger.info("manifest.db updated")
+
+
+def _update_masterdb(master_hash=None):
+    logger.debug("Updating master.db")
+    if master_hash is None:
+        master_hash = _get_master_hash()
+    if not downloader.download_file(client, cgss_query.get_db_url(master_hash), MASTERDB_PATH,
+                                    headers=cgss_query.HEADERS, decompress=True):
+        raise DownloadFailedException("Failed to download master.db")
+    _set_cached_version("master.mdb", master_hash)
     logger.info("master.db updated")
 
 
@@ -54,9 +89,25 @@ def get_cachedb_path():
     return CACHEDB_PATH
 
 
-def update_database():
-    _update_manifest()
-    _update_masterdb()
+def update_database(force=False):
+    try:
+        truth_version = str(kirara_query.get_truth_version())
+    except requests.RequestException as e:
+        if storage.exists(MANIFEST_PATH) and storage.exists(MASTERDB_PATH):
+            logger.info("Failed to get the latest truth version, using local databases: {}".format(e))
+            return
+        raise
+
+    if force or not storage.exists(MANIFEST_PATH) or _get_cached_version("manifest") != truth_version:
+        _update_manifest(truth_version)
+    else:
+        logger.info("manifest.db is up to date with truth version {}".format(truth_version))
+
+    master_hash = _get_master_hash()
+    if force or not storage.exists(MASTERDB_PATH) or _get_cached_version("master.mdb") != master_hash:
+        _update_masterdb(master_hash)
+    else:
+        logger.info("master.db is up to date")
 
 
 if __name__ == '__main__':
@@ -2,11 +2,10 @@ import logging
 
 import customlogger as logger
 from db import db
-from network import cgss_query
+from network import cgss_query, downloader
 from network import meta_updater
 from settings import MANIFEST_PATH, MUSICSCORES_PATH
 from utils import storage
-from utils.misc import decompress
 
 
 def _score_cache_db_exists():
@@ -63,16 +62,28 @@ def update_musicscores():
     if len(new_scores) + len(updated_scores) > 50:
         logger.info("It will take some time to download, please wait...")
 
-    for musicscore_name in set(new_scores).union(set(updated_scores)):
-        musicscore_hash = all_musicscores[musicscore_name]
-        musicscore_response = cgss_query.get_db(musicscore_hash)
-        with storage.get_writer(MUSICSCORES_PATH / "{}.db".format(musicscore_name), 'wb') as fwb:
-            fwb.write(decompress(musicscore_response.content))
+    downloader.cleanup_partial_downloads(MUSICSCORES_PATH)
+    jobs = [
+        (musicscore_name,
+         cgss_query.get_db_url(all_musicscores[musicscore_name]),
+         MUSICSCORES_PATH / "{}.db".format(musicscore_name))
+        for musicscore_name in set(new_scores).union(set(updated_scores))
+    ]
+
+    # Record every finished score right away so an interrupted update resumes from where it stopped
+    def on_complete(musicscore_name):
         db.cachedb.execute("""
             INSERT OR REPLACE INTO score_cache (score_id, score_hash)
             VALUES (?,?)
-        """, [musicscore_name, musicscore_hash])
-    db.cachedb.commit()
+        """, [musicscore_name, all_musicscores[musicscore_name]])
+        db.cachedb.commit()
+
+    failed = downloader.download_all(jobs, headers=cgss_query.HEADERS, decompress=True,
+                                     on_complete=on_complete)
+    if len(failed) > 0:
+        logger.info("Failed to download {} musicscores, they will be retried on next update: {}".format(
+            len(failed), failed))
+        return
     logger.info("All musicscores updated")
 
 
@@ -0,0 +1,304 @@
+"""
+Search the owned cards for the best units on a chart.
+
+Trying every unit is out of the question, a few hundred owned cards make billions of them. The search narrows the
+candidates down in stages, every stage more exact and more expensive than the previous one:
+    1. the POOL_SIZE most promising cards are kept, with the best few of every skill type so skills whose worth
+       depends on the rest of the unit get a chance
+    2. every 5 card unit of the pool is estimated at once with numpy: its exact appeal under the best possible
+       center from the AppealScreener, raised by how much of the chart's combo weight each skill timer covers and
+       how strong the skill is
+    3. the best estimates are simulated with perfect play
+    4. the best perfect scores are simulated with random runs and ranked by mean score
+Stages 3 and 4 run across worker processes, or on a simulation server, through the batch runner.
+
+The estimate only has to rank units well enough to not drop good ones, it is not a score. Only 5 card units without
+guest are searched.
+
+Usage: python chihiro.py optimize --music "Trust me" --difficulty MASTER -k 5
+"""
+import argparse
+import itertools
+import json
+import sys
+import time
+
+import numpy as np
+
+import customlogger as logger
+from batch import run_jobs
+from db import db
+from logic.appeal_screening import AppealScreener
+from logic.card import Card
+from logic.live import Live
+from logic.skill import ACT_TYPES, BOOST_TYPES
+from logic.timer_coverage import get_chart_coverage
+from settings import MAX_WORKERS
+from static.color import Color
+from static.song_difficulty import Difficulty
+
+POOL_SIZE = 24
+PER_SKILL_TYPE = 2
+PERFECT_CANDIDATES = 40
+# Units simulated with random runs for every unit returned
+RANDOM_CANDIDATES_PER_RESULT = 2
+# Skills copying or boosting the other skills of the unit
+COPY_TYPES = {16, 39, 40, 41, 42}
+# Share of the other skills' bonuses a boost adds
+BOOST_SHARE = 0.2
+# Rough (score, combo) bonuses of skills whose bonus is only known while playing
+ESTIMATED_BONUSES = {
+    25: (0, 0.18),
+    35: (0.15, 0),
+    36: (0.15, 0),
+    37: (0.15, 0),
+}
+SONG_COLOR_BONUS = 30
+
+
+def get_owned_card_ids(min_rarity=7):
+    """
+    :param min_rarity: 7 for SSR and above
+    """
+    return [_[0] for _ in db.cachedb.execute_and_fetchall("""
+        SELECT owned_card.card_id FROM owned_card
+        INNER JOIN card_data_cache ON card_data_cache.id = owned_card.card_id
+        WHERE owned_card.number > 0 AND card_data_cache.rarity >= ?
+        ORDER BY owned_card.card_id
+    """, [min_rarity])]
+
+
+def collapse_idolized(card_ids):
+    """
+    :return: card_ids with one entry per card, the idolized (even) id when both forms of a card are in card_ids
+    """
+    forms = dict()
+    for card_id in card_ids:
+        key = card_id + card_id % 2
+        forms[key] = max(forms.get(key, card_id), card_id)
+    return sorted(forms.values())
+
+
+def _get_song_bonuses(live):
+    bonuses = np.zeros(3)
+    if live.color == Color.ALL:
+        bonuses[:] = SONG_COLOR_BONUS
+    elif live.color is not None:
+        bonuses[live.color.value] = SONG_COLOR_BONUS
+    return bonuses
+
+
+def _get_skill_value(skill):
+    """
+    :return: combined score and combo bonus of the skill, None if it depends on the other skills of the unit
+    """
+    if skill.skill_type in COPY_TYPES or skill.skill_type in BOOST_TYPES:
+        return None
+    if skill.skill_type in ESTIMATED_BONUSES:
+        score, combo = ESTIMATED_BONUSES[skill.skill_type]
+    else:
+        score = max(skill.v0 - 100, 0) / 100
+        # Acts keep their special note bonus in v1
+        combo = 0 if skill.skill_type in ACT_TYPES else max(skill.v1 - 100, 0) / 100
+    return (1 + score) * (1 + combo) - 1
+
+
+class CardPool:
+    """
+    Arrays describing a set of cards on a chart, the input of the vectorized estimate.
+    """
+
+    def __init__(self, cards, live):
+        self.cards = cards
+        self.screener = AppealScreener(cards, live)
+        song_bonuses = _get_song_bonuses(live)
+        self.colors = self.screener.colors
+        self.chara_ids = np.array([card.chara_id for card in cards])
+        self.skill_types = self.screener.skill_types
+        self.skill_min = np.array([card.skill.min_requirements for card in cards])
+        self.skill_max = np.array([card.skill.max_requirements for card in cards])
+        values = [_get_skill_value(card.skill) for card in cards]
+        self.is_copy = np.isin(self.skill_types, list(COPY_TYPES))
+        self.is_boost = np.isin(self.skill_types, list(BOOST_TYPES))
+        self.values = np.array([0 if _ is None else _ for _ in values])
+        coverages = dict()
+        note_times = live.notes["sec"].to_numpy()
+        uptimes = list()
+        for card in cards:
+            timer = (card.skill.interval, card.skill.duration)
+            if timer not in coverages:
+                coverages[timer] = get_chart_coverage(note_times, *timer) if card.skill.duration > 0 else 0
+            probability = card.skill.cached_probability / 10000 * (1 + song_bonuses[card.color.value] / 100)
+            uptimes.append(coverages[timer] * min(probability, 1))
+        self.uptimes = np.array(uptimes)
+
+    def __len__(self):
+        return len(self.cards)
+
+    def get_card_estimates(self):
+        """
+        :return: estimate of every card on its own, skills depending on the unit valued like the median skill
+        """
+        independent = ~(self.is_copy | self.is_boost)
+        median = np.median(self.values[independent]) if independent.any() else 0
+        values = np.where(independent, self.values, median)
+        # Appeal without any leader skill, which depends on the unit
+        bonuses = self.screener.live_bonuses[:3, self.colors].T
+        plain_appeals = np.ceil(self.screener.stats[:, :3] * (1 + np.clip(bonuses, -100, 5000) / 100)).sum(axis=1)
+        return plain_appeals * (1 + self.uptimes * values)
+
+    def get_units(self):
+        """
+        :return: (units, 5) array of card indices of every unit without two cards of the same idol
+        """
+        units = np.array(list(itertools.combinations(range(len(self.cards)), 5)), dtype=int).reshape(-1, 5)
+        chara_ids = np.sort(self.chara_ids[units], axis=1)
+        return units[(chara_ids[:, 1:] != chara_ids[:, :-1]).all(axis=1)]
+
+    def estimate_units(self, units):
+        """
+        :param units: (units, 5) array of card indices
+        :return: (appeal of every unit with its best center, position of that center, skill factor of every unit)
+        """
+        appeals = np.zeros((len(units), 5))
+        for position in range(5):
+            centered = np.concatenate([units[:, [position]], np.delete(units, position, axis=1)], axis=1)
+            appeals[:, position], _ = self.screener.evaluate(centered)
+        centers = appeals.argmax(axis=1)
+
+        colors = np.zeros((len(units), 3))
+        for color in range(3):
+            colors[:, color] = (self.colors[units] == color).sum(axis=1)
+        triggers = (colors[:, np.newaxis, :] >= self.skill_min[units]).all(axis=2) \
+                   & (colors[:, np.newaxis, :] <= self.skill_max[units]).all(axis=2)
+        is_copy = self.is_copy[units]
+        is_boost = self.is_boost[units]
+        independent = np.where(is_copy | is_boost | ~triggers, 0, self.values[units])
+        values = np.where(is_copy, independent.max(axis=1)[:, np.newaxis],
+                          np.where(is_boost, BOOST_SHARE * independent.sum(axis=1)[:, np.newaxis], independent))
+        skill_factors = 1 + (triggers * self.uptimes[units] * values).sum(axis=1)
+        return appeals[np.arange(len(units)), centers], centers, skill_factors
+
+
+def build_pool(cards, live, pool_size=POOL_SIZE, per_skill_type=PER_SKILL_TYPE):
+    """
+    :return: CardPool of the best cards on their own, at least the best per_skill_type of every skill type
+    """
+    pool = CardPool(cards, live)
+    estimates = pool.get_card_estimates()
+    order = np.argsort(-estimates, kind="stable")
+    picked = list()
+    for skill_type in np.unique(pool.skill_types):
+        picked.extend(order[pool.skill_types[order] == skill_type][:per_skill_type].tolist())
+    picked = sorted(picked, key=lambda _: -estimates[_])[:pool_size]
+    for idx in order:
+        if len(picked) >= pool_size:
+            break
+        if idx not in picked:
+            picked.append(int(idx))
+    return CardPool([cards[_] for _ in sorted(picked)], live)
+
+
+def _top(values, count):
+    if len(values) <= count:
+        return np.argsort(-values, kind="stable")
+    top = np.argpartition(-values, count)[:count]
+    return top[np.argsort(-values[top], kind="stable")]
+
+
+def _order_unit(unit, center):
+    return [unit[center]] + [card for idx, card in enumerate(unit) if idx != center]
+
+
+def _simulate(candidates, chart, workers, executor, **job):
+    jobs = [dict(chart, id=idx, cards=[card.card_id for card in cards], **job)
+            for idx, (cards, _) in enumerate(candidates)]
+    results = list()
+    for (cards, row), result in zip(candidates, run_jobs(jobs, workers=workers, executor=executor)):
+        if "error" in result:
+            logger.warning("Cannot simulate {}: {}".format([card.card_id for card in cards], result["error"]))
+            continue
+        result.pop("id")
+        row.update(result)
+        results.append((cards, row))
+    return results
+
+
+def optimize(music_name=None, score_id=None, difficulty=Difficulty.MASTER, top_k=5, times=100, card_ids=None,
+             min_rarity=7, workers=MAX_WORKERS, executor=None):
+    """
+    :param card_ids: cards to build units from, every owned card of at least min_rarity if None
+    :param times: random runs of the final simulations
+    :param executor: executor to simulate on instead of a local process pool, e.g. a simulation server
+    :return: list of the top_k units as dicts with the center first in cards, best mean score first
+    """
+    if isinstance(difficulty, str):
+        difficulty = Difficulty[difficulty.upper()]
+    live = Live()
+    live.set_music(music_name=music_name, score_id=score_id, difficulty=difficulty)
+    chart = {"music_name": music_name, "score_id": score_id, "difficulty": difficulty.name}
+    chart = {key: value for key, value in chart.items() if value is not None}
+    if card_ids is None:
+        card_ids = get_owned_card_ids(min_rarity)
+    # Both forms of a card can be owned, only one of them can be in a unit
+    card_ids = collapse_idolized(card_ids)
+    if len(card_ids) < 5:
+        raise ValueError("Need at least 5 cards to build a unit, got {}".format(len(card_ids)))
+
+    start = time.time()
+    pool = build_pool([Card.from_id(card_id) for card_id in card_ids], live)
+    units = pool.get_units()
+    if len(units) == 0:
+        raise ValueError("Need cards of at least 5 different idols to build a unit")
+    appeals, centers, skill_factors = pool.estimate_units(units)
+    estimates = appeals * skill_factors
+    logger.info("Estimated {} units of the best {} of {} cards in {:.1f}s".format(
+        len(units), len(pool), len(card_ids), time.time() - start))
+
+    candidates = [(_order_unit([pool.cards[_] for _ in units[idx]], centers[idx]),
+                   {"appeal": int(appeals[idx]), "estimate": float(estimates[idx])})
+                  for idx in _top(estimates, PERFECT_CANDIDATES)]
+    logger.info("Simulating perfect play of {} units".format(len(candidates)))
+
+    candidates = _simulate(candidates, chart, workers, executor, perfect_play=True)
+    candidates.sort(key=lambda _: -_[1]["perfect_score"])
+    candidates = [(cards, {"appeal": row["appeal"], "estimate": row["estimate"]})
+                  for cards, row in candidates[:top_k * RANDOM_CANDIDATES_PER_RESULT]]
+    logger.info("Simulating {} random runs of {} units".format(times, len(candidates)))
+
+    candidates = _simulate(candidates, chart, workers, executor, times=times)
+    candidates.sort(key=lambda _: -_[1]["mean"])
+    logger.info("Optimized in {:.1f}s".format(time.time() - start))
+    return [dict(cards=[card.card_id for card in cards], **row) for cards, row in candidates[:top_k]]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="chihiro.py optimize", description="Find the best owned units on a chart.")
+    chart = parser.add_mutually_exclusive_group(required=True)
+    chart.add_argument("--music", dest="music_name", help="name of the song")
+    chart.add_argument("--score-id", type=int, help="live id of the chart")
+    parser.add_argument("--difficulty", default="MASTER", help="Difficulty name, MASTER by default")
+    parser.add_argument("-k", "--top", type=int, default=5, help="number of units to return")
+    parser.add_argument("-t", "--times", type=int, default=100, help="random runs of the final simulations")
+    parser.add_argument("--min-rarity", type=int, default=7, help="ignore owned cards below this rarity, 7 = SSR")
+    parser.add_argument("-w", "--workers", type=int, default=MAX_WORKERS, help="worker processes")
+    parser.add_argument("--server", default=None, help="simulate on the simulation server at this address")
+    parser.add_argument("--update", action="store_true", help="update the game databases before optimizing")
+    args = parser.parse_args(argv)
+
+    import initializer
+    initializer.setup_headless(args.update)
+    executor = None
+    if args.server is not None:
+        from simulation_server import RemoteExecutor
+        executor = RemoteExecutor(args.server, max_workers=args.workers)
+    try:
+        results = optimize(music_name=args.music_name, score_id=args.score_id, difficulty=args.difficulty,
+                           top_k=args.top, times=args.times, min_rarity=args.min_rarity, workers=args.workers,
+                           executor=executor)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    for row in results:
+        sys.stdout.write(json.dumps(row) + "\n")
+    return 0
@@ -0,0 +1,201 @@
+"""
+Optional simulation server, so one machine can simulate for many clients.
+
+The server wraps a process pool behind a job queue shared by every client, with a result cache and deduplication: a
+request identical to one already computed is answered from the cache, and one identical to a request still running
+waits for that run instead of starting its own. Requests are plain (function, arguments) pairs, the same the GUI
+scheduler and the batch command run locally.
+
+Clients talk to it over multiprocessing's authenticated IPC, which works on localhost or over a LAN. The authkey is
+what keeps strangers from running code on the server: the server generates a random one on first run in
+SIMULATION_SERVER_KEY_PATH, and clients on other machines need a copy of that file. The server refuses to listen on
+anything but loopback with a well known key.
+
+Usage: python chihiro.py serve [--host 0.0.0.0] [--port 47823] [--workers 8]
+"""
+import argparse
+import hashlib
+import ipaddress
+import os
+import pickle
+import secrets
+import socket
+import threading
+from collections import OrderedDict
+from concurrent.futures.thread import ThreadPoolExecutor
+from multiprocessing.managers import BaseManager
+
+import customlogger as logger
+from settings import MAX_WORKERS, SIMULATION_SERVER_AUTHKEY, SIMULATION_SERVER_CACHE_SIZE, \
+    SIMULATION_SERVER_KEY_PATH, SIMULATION_SERVER_PORT
+from utils.misc import get_process_pool
+
+# Attributes that identify who asked for a simulation rather than what is simulated
+IDENTITY_ATTRIBUTES = {"uuid", "short_uuid", "results", "priority", "id"}
+# Keys anyone can read in the source, only good enough for loopback
+WEAK_AUTHKEYS = {b"", b"chihiro"}
+
+
+def _strip_identity(value):
+    if isinstance(value, dict):
+        return {k: v for k, v in value.items() if k not in IDENTITY_ATTRIBUTES}
+    if hasattr(value, "__dict__"):
+        return type(value), _strip_identity(vars(value))
+    return value
+
+
+def get_cache_key(fn, args):
+    """
+    Hash of a request that is the same for identical simulations, no matter which unit widget or job id asked.
+    """
+    return hashlib.sha1(pickle.dumps((fn, [_strip_identity(arg) for arg in args]))).hexdigest()
+
+
+def get_authkey(create=False, key_path=SIMULATION_SERVER_KEY_PATH):
+    """
+    :param create: generate a random key in key_path if there is none yet
+    :return: SIMULATION_SERVER_AUTHKEY if set, else the key stored in key_path. Raises FileNotFoundError if there is
+    neither and create is False.
+    """
+    if SIMULATION_SERVER_AUTHKEY is not None:
+        return SIMULATION_SERVER_AUTHKEY
+    if not key_path.exists():
+        if not create:
+            raise FileNotFoundError("No simulation server key in {}, copy it over from the server".format(key_path))
+        key_path.parent.mkdir(parents=True, exist_ok=True)
+        # Only readable by the owner
+        fd = os.open(str(key_path), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "w") as fw:
+            fw.write(secrets.token_hex(32))
+        logger.info("Generated a simulation server key in {}".format(key_path))
+    with open(str(key_path), "r") as fr:
+        return fr.read().strip().encode()
+
+
+def is_loopback(host):
+    try:
+        return all(ipaddress.ip_address(info[4][0]).is_loopback
+                   for info in socket.getaddrinfo(host, None, proto=socket.IPPROTO_TCP))
+    except (OSError, ValueError):
+        return False
+
+
+class SimulationService:
+    def __init__(self, workers=MAX_WORKERS, cache_size=SIMULATION_SERVER_CACHE_SIZE):
+        self.cache_size = cache_size
+        self._executor = get_process_pool(workers)
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._in_flight = dict()
+        self._stats = {"requests": 0, "cache_hits": 0, "deduplicated": 0, "computed": 0}
+
+    def simulate(self, fn, args):
+        """
+        Run fn(*args) on the worker pool, or answer from the cache. Blocks until the result is ready.
+        """
+        key = get_cache_key(fn, args)
+        with self._lock:
+            self._stats["requests"] += 1
+            if key in self._cache:
+                self._stats["cache_hits"] += 1
+                self._cache.move_to_end(key)
+                return self._cache[key]
+            future = self._in_flight.get(key)
+            started = future is None
+            if started:
+                future = self._executor.submit(fn, *args)
+                self._in_flight[key] = future
+            else:
+                self._stats["deduplicated"] += 1
+        if started:
+            # Outside the lock, the callback runs right away if the future is already done
+            future.add_done_callback(lambda f: self._store(key, f))
+        return future.result()
+
+    def _store(self, key, future):
+        with self._lock:
+            self._in_flight.pop(key, None)
+            self._stats["computed"] += 1
+            if future.cancelled() or future.exception() is not None:
+                return
+            self._cache[key] = future.result()
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["cached"] = len(self._cache)
+            stats["running"] = len(self._in_flight)
+            return stats
+
+    def shutdown(self, wait=False):
+        self._executor.shutdown(wait=wait)
+
+
+class SimulationManager(BaseManager):
+    pass
+
+
+def connect(host, port=SIMULATION_SERVER_PORT, authkey=None):
+    """
+    :param authkey: key of the server, get_authkey() if None
+    :return: proxy of the SimulationService running on the server, raises OSError if it cannot be reached
+    """
+    if authkey is None:
+        authkey = get_authkey()
+    SimulationManager.register("get_service")
+    manager = SimulationManager(address=(host, port), authkey=authkey)
+    manager.connect()
+    return manager.get_service()
+
+
+class RemoteExecutor:
+    """
+    Executor running every submitted call on a simulation server, a drop-in for a local ProcessPoolExecutor.
+    """
+
+    def __init__(self, host, port=SIMULATION_SERVER_PORT, authkey=None, max_workers=MAX_WORKERS):
+        self.service = connect(host, port, authkey)
+        # Every call blocks a thread until the server answers, the proxy opens one connection per thread
+        self._threads = ThreadPoolExecutor(max_workers=max_workers)
+
+    def submit(self, fn, *args):
+        return self._threads.submit(self.service.simulate, fn, args)
+
+    def shutdown(self, wait=True):
+        self._threads.shutdown(wait=wait)
+
+
+def serve(host, port=SIMULATION_SERVER_PORT, authkey=None, workers=MAX_WORKERS):
+    """
+    :param authkey: key clients must present, get_authkey(create=True) if None
+    """
+    if authkey is None:
+        authkey = get_authkey(create=True)
+    if authkey in WEAK_AUTHKEYS and not is_loopback(host):
+        raise ValueError("Refusing to listen on {} with a well known authkey, anyone reaching the port could run "
+                         "code on this machine".format(host))
+    service = SimulationService(workers=workers)
+    SimulationManager.register("get_service", callable=lambda: service)
+    manager = SimulationManager(address=(host, port), authkey=authkey)
+    server = manager.get_server()
+    logger.info("Simulation server listening on {}:{} with {} workers".format(host, port, workers))
+    try:
+        server.serve_forever()
+    finally:
+        service.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="chihiro.py serve", description="Serve simulations to other clients.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on, 0.0.0.0 for every interface")
+    parser.add_argument("--port", type=int, default=SIMULATION_SERVER_PORT)
+    parser.add_argument("-w", "--workers", type=int, default=MAX_WORKERS, help="worker processes")
+    parser.add_argument("--update", action="store_true", help="update the game databases before serving")
+    args = parser.parse_args(argv)
+
+    import initializer
+    initializer.setup_headless(args.update)
+    serve(args.host, args.port, workers=args.workers)
+    return 0
@@ -9,6 +9,7 @@ from settings import ABUSE_CHARTS_PATH
 from statemachine import StateMachine, AbuseData
 from static.live_values import WEIGHT_RANGE, DIFF_MULTIPLIERS
 from static.note_type import NoteType
+from utils.profiling import PhaseProfiler
 from utils.storage import get_writer
 
 pyximport.install(language_level=3)
@@ -30,7 +31,8 @@ def check_long(notes_data, mask):
 
 class BaseSimulationResult:
     def __init__(self):
-        pass
+        # Per-phase timings from PhaseProfiler.report() when simulated with profile=True
+        self.profile = None
 
 
 class SimulationResult(BaseSimulationResult):
@@ -69,7 +71,11 @@ class Simulator:
     def __init__(self, live=None, special_offset=None, left_inclusive=False, right_inclusive=True,
                  force_encore_amr_cache_to_encore_unit=False,
                  force_encore_magic_to_encore_unit=False,
-                 allow_encore_magic_to_escape_max_agg=True):
+                 allow_encore_magic_to_escape_max_agg=True,
+                 profile=False):
+        """
+        :param profile: time every simulation phase and report it on the result's profile attribute
+        """
         self.live = live
         self.left_inclusive = left_inclusive
         self.right_inclusive = right_inclusive
@@ -80,6 +86,10 @@ class Simulator:
             self.special_offset = 0
         else:
             self.special_offset = special_offset
+        self.profiler = None
+        if profile:
+            self.profiler = PhaseProfiler()
+            self.profiler.instrument(self, [("chart_setup", "_setup_simulator")])
 
     def _setup_simulator(self, appeals=None, support=None, extra_bonus=None, chara_bonus_set=None, chara_bonus_value=0,
                          special_option=None, special_value=None, mirror=False):
@@ -138,6 +148,8 @@ class Simulator:
                  doublelife=False, perfect_only=True, abuse=False, output=False, auto=False, mirror=False,
                  time_offset=0):
         start = time.time()
+        if self.profiler is not None:
+            self.profiler.reset()
         logger.debug("Unit: {}".format(self.live.unit))
         logger.debug("Song: {} - {} - Lv {}".format(self.live.music_name, self.live.difficulty, self.live.level))
         if perfect_play or auto:
@@ -157,6 +169,8 @@ class Simulator:
                                       special_option=special_option, special_value=special_value,
                                       time_offset=time_offset, mirror=mirror, doublelife=doublelife)
         logger.debug("Total run time for {} trials: {:04.2f}s".format(times, time.time() - start))
+        if self.profiler is not None:
+            res.profile = self.profiler.report()
         return res
 
     def save_to_file(self, perfect_scores, abuse_data):
@@ -268,7 +282,8 @@ class Simulator:
             weights=self.weight_range,
             force_encore_amr_cache_to_encore_unit=self.force_encore_amr_cache_to_encore_unit,
             force_encore_magic_to_encore_unit=self.force_encore_magic_to_encore_unit,
-            allow_encore_magic_to_escape_max_agg=self.allow_encore_magic_to_escape_max_agg
+            allow_encore_magic_to_escape_max_agg=self.allow_encore_magic_to_escape_max_agg,
+            profiler=self.profiler
         )
 
         if auto:
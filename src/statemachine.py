@@ -16,6 +16,21 @@ from static.note_type import NoteType
 from static.skill import get_sparkle_bonus
 from static.song_difficulty import PERFECT_TAP_RANGE, GREAT_TAP_RANGE, Difficulty, FLICK_DRAIN, NONFLICK_DRAIN
 
+# (phase, method) pairs timed when the machine is given a profiler
+PROFILED_PHASES = [
+    ("activation_arrays", "initialize_activation_arrays"),
+    ("handle_note", "handle_note"),
+    ("handle_note_auto", "handle_note_auto"),
+    ("handle_skill", "handle_skill"),
+    ("bonuses_phase_boost", "_evaluate_bonuses_phase_boost"),
+    ("bonuses_phase_life_support", "_evaluate_bonuses_phase_life_support"),
+    ("bonuses_phase_score_combo", "_evaluate_bonuses_phase_score_combo"),
+    ("expand_magic", "_expand_magic"),
+    ("expand_encore", "_expand_encore"),
+    ("aggregate_results", "_aggregate_results"),
+    ("aggregate_results_auto", "_aggregate_results_auto"),
+]
+
 
 class AbuseData:
     def __init__(self, score_delta, window_l, window_r, judgements):
@@ -207,7 +222,13 @@ class StateMachine:
                  helen_base_score, weights,
                  force_encore_amr_cache_to_encore_unit=False,
                  force_encore_magic_to_encore_unit=False,
-                 allow_encore_magic_to_escape_max_agg=False):
+                 allow_encore_magic_to_escape_max_agg=False,
+                 profiler=None):
+        """
+        :param profiler: PhaseProfiler to time PROFILED_PHASES with, None to leave the machine uninstrumented
+        """
+        if profiler is not None:
+            profiler.instrument(self, PROFILED_PHASES)
         self.left_inclusive = left_inclusive
         self.right_inclusive = right_inclusive
         self.force_encore_amr_cache_to_encore_unit = force_encore_amr_cache_to_encore_unit
@@ -524,7 +545,9 @@ class StateMachine:
                     self.handle_skill()
                 else:
                     self.handle_note()
+        return self._aggregate_results()
 
+    def _aggregate_results(self):
         self.np_score_bonuses = 1 + np.array(self.score_bonuses) / 100
         self.np_combo_bonuses = 1 + np.array(self.combo_bonuses) / 100
 
@@ -588,7 +611,9 @@ class StateMachine:
                     self.break_hold(temp)
                 else:
                     self.handle_note_auto()
+        return self._aggregate_results_auto()
 
+    def _aggregate_results_auto(self):
         self.np_score_bonuses = 1 + np.array(self.score_bonuses) / 100
         self.np_combo_bonuses = 1 + np.array(self.combo_bonuses) / 100
 
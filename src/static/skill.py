@@ -69,31 +69,36 @@ db.cachedb.commit()
 
 logger.debug("chihiro.skill_keywords created.")
 
-SPARKLE_BONUS_SSR = OrderedDict({_[0]: _[1] for idx, _ in
-                     enumerate(db.masterdb.execute_and_fetchall("SELECT life_value / 10, type_01_value FROM skill_life_value ORDER BY life_value"))})
-SPARKLE_BONUS_SR = OrderedDict({_[0]: _[1] for idx, _ in
-                    enumerate(db.masterdb.execute_and_fetchall("SELECT life_value / 10, type_02_value FROM skill_life_value ORDER BY life_value"))})
-SPARKLE_BONUS_SSR_GRAND = OrderedDict({_[0]: _[1] for idx, _ in enumerate(
-    db.masterdb.execute_and_fetchall("SELECT life_value / 10, type_01_value FROM skill_life_value_grand ORDER BY life_value"))})
-SPARKLE_BONUS_SR_GRAND = OrderedDict({_[0]: _[1] for idx, _ in enumerate(
-    db.masterdb.execute_and_fetchall("SELECT life_value / 10, type_02_value FROM skill_life_value_grand ORDER BY life_value"))})
+# (table, value column) of every sparkle bonus, read from master.db on first use
+SPARKLE_BONUS_TABLES = {
+    (False, True): ("skill_life_value", "type_01_value"),
+    (False, False): ("skill_life_value", "type_02_value"),
+    (True, True): ("skill_life_value_grand", "type_01_value"),
+    (True, False): ("skill_life_value_grand", "type_02_value"),
+}
+_sparkle_bonuses = dict()
+
 
-for d in [SPARKLE_BONUS_SSR, SPARKLE_BONUS_SR, SPARKLE_BONUS_SSR_GRAND, SPARKLE_BONUS_SR_GRAND]:
+def _load_sparkle_bonus(table, column):
+    d = OrderedDict(db.masterdb.execute_and_fetchall(
+        "SELECT life_value / 10, {} FROM {} ORDER BY life_value".format(column, table)))
     c_v = 0
     for key, value in d.items():
         if value < c_v:
             d[key] = c_v
         if c_v < value:
             c_v = value
+    return d
+
+
+def invalidate_sparkle_bonus():
+    _sparkle_bonuses.clear()
+
 
 def get_sparkle_bonus(rarity, grand=False):
-    if grand:
-        if rarity > 6:
-            return SPARKLE_BONUS_SSR_GRAND
-        if rarity > 4:
-            return SPARKLE_BONUS_SR_GRAND
-    else:
-        if rarity > 6:
-            return SPARKLE_BONUS_SSR
-        if rarity > 4:
-            return SPARKLE_BONUS_SR
+    if rarity <= 4:
+        return None
+    key = (grand, rarity > 6)
+    if key not in _sparkle_bonuses:
+        _sparkle_bonuses[key] = _load_sparkle_bonus(*SPARKLE_BONUS_TABLES[key])
+    return _sparkle_bonuses[key]
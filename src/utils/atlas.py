@@ -0,0 +1,105 @@
+"""
+Packed thumbnail atlas: every thumbnail of one size stored back to back as raw RGBA in a single blob file, plus an
+index file holding the card id of every tile in order. The offset of a tile is its position in the index times the
+tile size, so reading a thumbnail is a slice of the memory mapped blob.
+"""
+import mmap
+
+import numpy as np
+
+from utils import storage
+
+BLOB_SUFFIX = ".rgba"
+INDEX_SUFFIX = ".idx"
+INDEX_DTYPE = np.int32
+
+
+def get_blob_path(directory, size):
+    return directory / "atlas{}{}".format(size, BLOB_SUFFIX)
+
+
+def get_index_path(directory, size):
+    return directory / "atlas{}{}".format(size, INDEX_SUFFIX)
+
+
+def get_tile_bytes(size):
+    return size * size * 4
+
+
+def read_index(directory, size):
+    index_path = get_index_path(directory, size)
+    if not storage.exists(index_path):
+        return np.zeros(0, dtype=INDEX_DTYPE)
+    return np.fromfile(str(index_path), dtype=INDEX_DTYPE)
+
+
+def append(directory, size, tiles):
+    """
+    Append tiles to the atlas, replacing nothing. Tiles of ids already packed are skipped.
+
+    :param tiles: iterable of (card_id, RGBA bytes of a size x size image)
+    :return: number of tiles appended
+    """
+    index = read_index(directory, size)
+    known_ids = set(index.tolist())
+    tile_bytes = get_tile_bytes(size)
+    blob_path = get_blob_path(directory, size)
+    new_ids = list()
+    with storage.get_writer(blob_path, 'ab') as fab:
+        # Drop tiles written after the index was last saved, they would shift every later offset
+        fab.truncate(len(index) * tile_bytes)
+        fab.seek(len(index) * tile_bytes)
+        for card_id, tile in tiles:
+            if card_id in known_ids:
+                continue
+            if len(tile) != tile_bytes:
+                raise ValueError("Tile of card {} is {} bytes, expected {}".format(card_id, len(tile), tile_bytes))
+            fab.write(tile)
+            known_ids.add(card_id)
+            new_ids.append(card_id)
+    if len(new_ids) > 0:
+        # The blob is complete before the index references it
+        np.concatenate([index, np.array(new_ids, dtype=INDEX_DTYPE)]).tofile(str(get_index_path(directory, size)))
+    return len(new_ids)
+
+
+class Atlas:
+    def __init__(self, directory, size):
+        self.size = size
+        self.tile_bytes = get_tile_bytes(size)
+        self.positions = {card_id: idx for idx, card_id in enumerate(read_index(directory, size).tolist())}
+        self._file = None
+        self._mmap = None
+        blob_path = get_blob_path(directory, size)
+        if len(self.positions) > 0 and storage.exists(blob_path):
+            self._file = storage.get_reader(blob_path, 'rb')
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self.positions = dict()
+
+    def __contains__(self, card_id):
+        return card_id in self.positions
+
+    def __len__(self):
+        return len(self.positions)
+
+    def get_tile(self, card_id):
+        """
+        :return: zero-copy memoryview of the RGBA bytes of the card, None if it is not packed
+        """
+        if card_id not in self.positions:
+            return None
+        offset = self.positions[card_id] * self.tile_bytes
+        return memoryview(self._mmap)[offset:offset + self.tile_bytes]
+
+    def close(self):
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # Tiles are still referenced somewhere, the map is released once they are gone
+                pass
+            self._file.close()
+            self._mmap = None
+            self._file = None
+        self.positions = dict()
@@ -1,10 +1,15 @@
+import mmap
+import multiprocessing
 import os
+from concurrent.futures.process import ProcessPoolExecutor
 from itertools import chain, combinations
 from math import ceil, log2
 
 import lz4.block
 import numpy as np
 
+from utils import storage
+
 
 def keystoint(x):
     return {int(k): v for k, v in x.items()}
@@ -18,6 +23,28 @@ def decompress(bytes):
     return lz4.block.decompress(bytes[16:], length, True)
 
 
+def decompress_to_file(compressed_path, target_path):
+    # The file is a single LZ4 block so it cannot be decoded in pieces, but mapping it avoids holding the compressed
+    # data in memory next to the decompressed output
+    with storage.get_reader(compressed_path, 'rb') as fr, \
+            mmap.mmap(fr.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        view = memoryview(mm)
+        try:
+            length = int.from_bytes(view[4:8], 'little')
+            with storage.get_writer(target_path, 'wb') as fwb:
+                fwb.write(lz4.block.decompress(view[16:], uncompressed_size=length))
+        finally:
+            view.release()
+
+
+def get_process_pool(max_workers):
+    """
+    Process pool whose workers start from a fresh interpreter. Forked workers would inherit the sqlite connections of
+    the db module, which sqlite does not support, spawned ones open their own on import.
+    """
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+
+
 def sortbased_randn(N, notes):
     bins = np.zeros((N, notes, 3))
     simulated_play = np.digitize(np.random.randn(N, notes), bins=[-1, 1])
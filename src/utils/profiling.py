@@ -0,0 +1,54 @@
+"""
+Opt-in timing of named phases. Instrumenting an object replaces the chosen bound methods of that one instance with
+timing wrappers, so code that is not being profiled runs the original methods with no added cost at all.
+"""
+from collections import OrderedDict
+from time import perf_counter
+
+
+class PhaseProfiler:
+    def __init__(self):
+        self.times = OrderedDict()
+        self.calls = OrderedDict()
+
+    def reset(self):
+        self.times.clear()
+        self.calls.clear()
+
+    def add(self, phase, elapsed):
+        if phase not in self.times:
+            self.times[phase] = 0.0
+            self.calls[phase] = 0
+        self.times[phase] += elapsed
+        self.calls[phase] += 1
+
+    def wrap(self, phase, fn):
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.add(phase, perf_counter() - start)
+
+        return wrapper
+
+    def instrument(self, obj, phases):
+        """
+        :param phases: iterable of (phase name, method name) to time on obj
+        """
+        for phase, method_name in phases:
+            setattr(obj, method_name, self.wrap(phase, getattr(obj, method_name)))
+
+    def report(self):
+        """
+        :return: {phase: {"calls", "total_sec", "mean_us"}}. Times are inclusive, a phase called from within another
+        one is counted in both.
+        """
+        return OrderedDict(
+            (phase, {
+                "calls": self.calls[phase],
+                "total_sec": total,
+                "mean_us": total / self.calls[phase] * 1E6,
+            })
+            for phase, total in self.times.items()
+        )
@@ -0,0 +1,215 @@
+"""
+Benchmarks of the Simulator over a fixed set of charts, units and simulation modes.
+
+Every case reports trials per second, setup time (loading the chart and building the unit) and peak memory of the
+simulation. Results can be saved as a JSON baseline and later runs compared against it, a run is a regression when a
+case got slower or hungrier than the tolerance allows.
+
+    PYTHONPATH=src:. python test/benchmark_simulator.py --save baseline.json
+    PYTHONPATH=src:. python test/benchmark_simulator.py --compare baseline.json
+
+Compare on the same machine the baseline was saved on, absolute numbers do not carry over between machines.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pyximport
+
+pyximport.install(language_level=3)
+
+os.environ["DEBUG_MODE"] = "1"
+from logic.grandlive import GrandLive
+from logic.grandunit import GrandUnit
+from logic.live import Live
+from logic.synthetic import generate_grand_unit, generate_live, generate_unit
+from logic.unit import Unit
+from simulator import Simulator
+from static.song_difficulty import Difficulty
+
+# Units covering the skills with the most involved simulation paths
+UNITS = {
+    "magic": ("kaede5 syoko4 yui5 shin3 makino2 frederica5", (0, 0, 0, 0, 10)),
+    "alternate": ("nao4 yukimi2 haru2 mizuki4 rin2 ranko3", (0, 0, 0, 0, 10)),
+    "refrain": ([201002, 100990, 201004, 100989, 300762, 100256], (5, 10, 10, 0, 10)),
+    "focus": ([200896, 200968, 200314, 200734, 200460, 200844], (5, 10, 10, 0, 10)),
+    "tricolor": ([100936, 100964, 100708, 100108, 100914], (10, 0, 0, 0, 0)),
+    "auto": ([200946, 200058, 100076, 100396, 300530, 200294], (0, 0, 0, 0, 10)),
+}
+GRAND_UNITS = {
+    "encore": ([100946, 100774, 100882, 200978, 300896,
+                100750, 101016, 100886, 100982, 100628,
+                100972, 100964, 100904, 100918, 100944], (10, 10, 10, 10, 10)),
+    "grand_mixed": ([201002, 100990, 100612, 100918, 300152,
+                     200720, 200980, 100944, 100882, 300896,
+                     200906, 201044, 200930, 100916, 300882], (10, 10, 10, 10, 10)),
+}
+# Charts from a few hundred to well over a thousand notes
+CHARTS = {
+    "regular": dict(music_name="Absolute Nine", difficulty=Difficulty.REGULAR),
+    "master": dict(music_name="Trust me", difficulty=Difficulty.MASTER),
+    "mplus": dict(score_id=409, difficulty=Difficulty.MPLUS),
+    "mplus_event": dict(score_id=637, difficulty=Difficulty.MPLUS, event=True),
+    "piano": dict(music_name="Starry-Go-Round", difficulty=Difficulty.PIANO),
+    "forte": dict(score_id=443, difficulty=Difficulty.FORTE),
+}
+# Generated units on generated charts, far longer than any real chart
+SYNTHETIC = {
+    "synthetic_5k": dict(skill_types=[41, 40, 39, 16, 20], note_count=5000),
+    "synthetic_grand_5k": dict(skill_types=[41, 40, 39, 16, 20, 26, 24, 25, 1, 4, 31, 28, 35, 32, 43],
+                               note_count=5000),
+}
+# name, unit, chart, mode, random trials
+CASES = [
+    ("normal_magic_mplus", "magic", "mplus", "normal", 200),
+    ("normal_alternate_master", "alternate", "master", "normal", 200),
+    ("normal_refrain_regular", "refrain", "regular", "normal", 500),
+    ("normal_focus_mplus", "focus", "mplus", "normal", 200),
+    ("perfect_magic_master", "magic", "master", "perfect", 1),
+    ("perfect_refrain_mplus", "refrain", "mplus", "perfect", 1),
+    ("abuse_tricolor_mplus_event", "tricolor", "mplus_event", "abuse", 1),
+    ("auto_master", "auto", "master", "auto", 1),
+    ("grand_normal_encore_forte", "encore", "forte", "normal", 50),
+    ("grand_perfect_mixed_piano", "grand_mixed", "piano", "perfect", 1),
+    ("grand_abuse_encore_forte", "encore", "forte", "abuse", 1),
+    ("normal_synthetic_5k", "synthetic_5k", None, "normal", 20),
+    ("grand_perfect_synthetic_5k", "synthetic_grand_5k", None, "perfect", 1),
+]
+METRICS = {
+    # metric: True if higher is better
+    "trials_per_sec": True,
+    "setup_sec": False,
+    "peak_memory_mb": False,
+}
+
+
+def _build(unit_name, chart_name):
+    if unit_name in SYNTHETIC:
+        skill_types = SYNTHETIC[unit_name]["skill_types"]
+        unit = generate_unit(skill_types, seed=0) if len(skill_types) == 5 \
+            else generate_grand_unit(skill_types, seed=0)
+        return generate_live(unit, note_count=SYNTHETIC[unit_name]["note_count"], seed=0)
+    grand = unit_name in GRAND_UNITS
+    cards, pots = GRAND_UNITS[unit_name] if grand else UNITS[unit_name]
+    if grand:
+        unit = GrandUnit.from_list(cards, pots)
+    elif isinstance(cards, str):
+        unit = Unit.from_query(cards, custom_pots=pots)
+    else:
+        unit = Unit.from_list(cards, pots)
+    live = GrandLive() if grand else Live()
+    live.set_music(**CHARTS[chart_name])
+    live.set_unit(unit)
+    return live
+
+
+def _simulate(live, mode, times):
+    sim = Simulator(live, special_offset=0.075 if mode == "auto" else None)
+    if mode == "normal":
+        return sim.simulate(times=times)
+    if mode == "perfect":
+        return sim.simulate(perfect_play=True)
+    if mode == "abuse":
+        return sim.simulate(perfect_play=True, abuse=True)
+    return sim.simulate(auto=True)
+
+
+def run_case(unit_name, chart_name, mode, times, repeats):
+    np.random.seed(0)
+    random.seed(0)
+    # Warms up the database connections and the chart cache, so the timed setups are comparable between runs
+    _build(unit_name, chart_name)
+
+    best = None
+    setup_sec = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        live = _build(unit_name, chart_name)
+        elapsed = time.perf_counter() - start
+        setup_sec = elapsed if setup_sec is None else min(setup_sec, elapsed)
+        start = time.perf_counter()
+        _simulate(live, mode, times)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    # Measured apart, tracing allocations slows everything down
+    live = _build(unit_name, chart_name)
+    tracemalloc.start()
+    _simulate(live, mode, times)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "trials_per_sec": times / best,
+        "setup_sec": setup_sec,
+        "peak_memory_mb": peak / 2 ** 20,
+    }
+
+
+def run(repeats=3, name_filter=None):
+    results = dict()
+    for name, unit_name, chart_name, mode, times in CASES:
+        if name_filter is not None and name_filter not in name:
+            continue
+        results[name] = run_case(unit_name, chart_name, mode, times, repeats)
+        print("{:<32} {:>10.2f} trials/s {:>8.3f}s setup {:>8.1f}MB".format(
+            name, results[name]["trials_per_sec"], results[name]["setup_sec"], results[name]["peak_memory_mb"]))
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    :return: list of (case, metric, baseline value, current value) that regressed beyond tolerance
+    """
+    regressions = list()
+    for name, metrics in results.items():
+        if name not in baseline:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            old, new = baseline[name][metric], metrics[metric]
+            if higher_is_better and new < old * (1 - tolerance) or not higher_is_better and new > old * (1 + tolerance):
+                regressions.append((name, metric, old, new))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the simulator.")
+    parser.add_argument("--save", help="save the results as a JSON baseline")
+    parser.add_argument("--compare", help="compare against a JSON baseline, exit with 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative change, 0.15 = 15%%")
+    parser.add_argument("--repeats", type=int, default=3, help="timed runs per case, the fastest setup and run count")
+    parser.add_argument("--filter", default=None, help="only run cases whose name contains this")
+    args = parser.parse_args(argv)
+
+    results = run(args.repeats, args.filter)
+    if args.save is not None:
+        with open(args.save, "w") as fw:
+            json.dump({
+                "meta": {
+                    "date": datetime.now().isoformat(timespec="seconds"),
+                    "python": platform.python_version(),
+                    "numpy": np.__version__,
+                    "machine": platform.platform(),
+                },
+                "cases": results,
+            }, fw, indent=2)
+    if args.compare is not None:
+        with open(args.compare, "r") as fr:
+            baseline = json.load(fr)["cases"]
+        regressions = compare(results, baseline, args.tolerance)
+        for name, metric, old, new in regressions:
+            print("REGRESSION {} {}: {:.3f} -> {:.3f}".format(name, metric, old, new))
+        if len(regressions) > 0:
+            return 1
+        print("No regression beyond {:.0%}".format(args.tolerance))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,55 @@
+import itertools
+import unittest
+
+import numpy as np
+import pyximport
+
+from logic.appeal_screening import AppealScreener
+from logic.leader import Leader
+from logic.synthetic import generate_card, generate_live, generate_unit
+from logic.unit import Unit
+from static.color import Color
+
+pyximport.install(language_level=3)
+
+
+def _leader(param, value, **kwargs):
+    bonuses = np.zeros((5, 3))
+    bonuses[param] = value
+    return Leader(bonuses=bonuses, **kwargs)
+
+
+class TestAppealScreening(unittest.TestCase):
+    def setUp(self):
+        self.live = generate_live(generate_unit(seed=0), note_count=300, seed=0)
+        leaders = [
+            _leader(0, 90),
+            _leader(1, 60, min_requirements=np.array([1, 1, 1])),
+            _leader(3, 40, max_requirements=np.array([99, 0, 0])),
+            _leader([0, 1, 2], 30, bless=True),
+            _leader([0, 1], -100, resonance=True),
+            _leader(2, 50, song_bonuses=np.full((5, 3), 100.0), unison=True),
+            _leader(0, 80, duet=True),
+            None,
+        ]
+        skill_types = [1, 4, 20, 41, 16, 24, 26, 17]
+        self.cards = [generate_card(skill_types[idx % 8], Color(idx % 3), leader=leaders[idx % 8], seed=idx)
+                      for idx in range(12)]
+        self.screener = AppealScreener(self.cards, self.live)
+
+    def _check(self, units):
+        appeals, lives = self.screener.evaluate(units)
+        for unit, appeal, life in zip(units, appeals, lives):
+            self.live.set_unit(Unit(*[self.cards[_] for _ in unit]))
+            attributes = self.live.get_attributes()
+            self.assertEqual(appeal, attributes[:3].sum())
+            self.assertEqual(life, attributes[3])
+
+    def test_matches_live(self):
+        units = np.array(list(itertools.permutations(range(8), 5))[::47])
+        self._check(units)
+
+    def test_matches_live_with_guest(self):
+        units = np.array([list(unit) + [min(set(range(12)) - set(unit))]
+                          for unit in itertools.combinations(range(12), 5)][::23])
+        self._check(units)
@@ -0,0 +1,50 @@
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from utils import atlas
+
+
+def _tile(size, value):
+    return bytes([value]) * atlas.get_tile_bytes(size)
+
+
+class TestAtlas(unittest.TestCase):
+    def setUp(self):
+        self.directory = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(str(self.directory))
+
+    def test_append_and_read(self):
+        self.assertEqual(atlas.append(self.directory, 4, [(100001, _tile(4, 1)), (100002, _tile(4, 2))]), 2)
+        # Already packed ids are skipped
+        self.assertEqual(atlas.append(self.directory, 4, [(100002, _tile(4, 9)), (100003, _tile(4, 3))]), 1)
+        packed = atlas.Atlas(self.directory, 4)
+        self.assertEqual(len(packed), 3)
+        self.assertEqual(bytes(packed.get_tile(100001)), _tile(4, 1))
+        self.assertEqual(bytes(packed.get_tile(100002)), _tile(4, 2))
+        self.assertEqual(bytes(packed.get_tile(100003)), _tile(4, 3))
+        self.assertIsNone(packed.get_tile(100004))
+        packed.close()
+
+    def test_unindexed_tiles_are_dropped(self):
+        atlas.append(self.directory, 4, [(100001, _tile(4, 1))])
+        # Simulate an interrupted append that wrote a tile but never updated the index
+        with open(str(atlas.get_blob_path(self.directory, 4)), 'ab') as fab:
+            fab.write(_tile(4, 7))
+        atlas.append(self.directory, 4, [(100002, _tile(4, 2))])
+        packed = atlas.Atlas(self.directory, 4)
+        self.assertEqual(bytes(packed.get_tile(100002)), _tile(4, 2))
+        packed.close()
+
+    def test_wrong_tile_size(self):
+        with self.assertRaises(ValueError):
+            atlas.append(self.directory, 4, [(100001, _tile(8, 1))])
+
+    def test_empty_atlas(self):
+        packed = atlas.Atlas(self.directory, 4)
+        self.assertEqual(len(packed), 0)
+        self.assertNotIn(100001, packed)
+        packed.close()
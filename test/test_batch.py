@@ -0,0 +1,52 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import batch
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, "w") as fw:
+            fw.write(content)
+        return path
+
+    def test_read_jsonl(self):
+        path = self._write("jobs.jsonl",
+                           '{"cards": [1, 2, 3, 4, 5, 6], "score_id": 100, "difficulty": "MPLUS"}\n'
+                           '\n'
+                           '{"id": "b", "cards": "sae4 chieri4", "music_name": "in fact", "perfect_play": true}\n')
+        jobs = list(batch.read_jobs(path))
+        self.assertEqual(len(jobs), 2)
+        self.assertEqual(jobs[0]["id"], 1)
+        self.assertListEqual(jobs[0]["cards"], [1, 2, 3, 4, 5, 6])
+        self.assertEqual(jobs[1]["id"], "b")
+        self.assertEqual(jobs[1]["cards"], "sae4 chieri4")
+        self.assertTrue(jobs[1]["perfect_play"])
+
+    def test_read_csv(self):
+        path = self._write("jobs.csv",
+                           "cards,pots,score_id,difficulty,times,perfect_play\n"
+                           "\"1,2,3,4,5\",10 10 0 0 10,100,5,20,0\n")
+        job, = batch.read_jobs(path)
+        self.assertListEqual(job["cards"], [1, 2, 3, 4, 5])
+        self.assertListEqual(job["pots"], [10, 10, 0, 0, 10])
+        self.assertEqual(job["score_id"], 100)
+        self.assertEqual(job["times"], 20)
+        self.assertFalse(job["perfect_play"])
+
+    def test_invalid_jobs(self):
+        with self.assertRaises(ValueError):
+            batch.normalize_job({"score_id": 100}, 1)
+        with self.assertRaises(ValueError):
+            batch.normalize_job({"cards": [1, 2, 3, 4, 5]}, 1)
+        with self.assertRaises(ValueError):
+            batch.normalize_job({"cards": [1, 2, 3, 4, 5], "score_id": 100, "pots": [1, 2]}, 1)
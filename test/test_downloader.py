@@ -0,0 +1,136 @@
+import shutil
+import tempfile
+import threading
+import unittest
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+
+import lz4.block
+
+from network import downloader
+from network.http_client import HttpClient
+from utils.misc import decompress, decompress_to_file
+
+
+def _compress(data):
+    header = bytearray(16)
+    header[4:8] = len(data).to_bytes(4, 'little')
+    return bytes(header) + lz4.block.compress(data, store_size=False)
+
+
+PAYLOADS = {
+    "/musicscores_m001": b"score 1" * 100,
+    "/musicscores_m002": b"score 2" * 100,
+    "/musicscores_m003": b"score 3" * 100,
+}
+FLAKY_PATH = "/musicscores_m003"
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    hits = defaultdict(int)
+
+    def do_GET(self):
+        self.hits[self.path] += 1
+        if self.path == FLAKY_PATH and self.hits[self.path] == 1:
+            self.send_response(503)
+            self.end_headers()
+            return
+        if self.path not in PAYLOADS:
+            self.send_response(404)
+            self.end_headers()
+            return
+        content = _compress(PAYLOADS[self.path])
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestDownloader(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = HTTPServer(("127.0.0.1", 0), _StandInHandler)
+        cls.base_url = "http://127.0.0.1:{}".format(cls.server.server_port)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        _StandInHandler.hits.clear()
+        self.directory = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(str(self.directory))
+
+    def _jobs(self, names):
+        return [(name, self.base_url + "/" + name, self.directory / "{}.db".format(name)) for name in names]
+
+    def test_download_all(self):
+        completed = list()
+        failed = downloader.download_all(self._jobs(["musicscores_m001", "musicscores_m002", "musicscores_m003"]),
+                                         transform=decompress, on_complete=completed.append, max_workers=3,
+                                         backoff=0.01)
+        self.assertListEqual(failed, [])
+        self.assertSetEqual(set(completed), {"musicscores_m001", "musicscores_m002", "musicscores_m003"})
+        for name in completed:
+            with open(str(self.directory / "{}.db".format(name)), 'rb') as fr:
+                self.assertEqual(fr.read(), PAYLOADS["/" + name])
+        # The flaky file needed a retry
+        self.assertEqual(_StandInHandler.hits[FLAKY_PATH], 2)
+        self.assertListEqual(list(self.directory.glob("*" + downloader.PART_SUFFIX)), [])
+
+    def test_download_all_streaming(self):
+        completed = list()
+        failed = downloader.download_all(self._jobs(["musicscores_m001", "musicscores_m002", "musicscores_m003"]),
+                                         decompress=True, on_complete=completed.append, backoff=0.01)
+        self.assertListEqual(failed, [])
+        for name in completed:
+            with open(str(self.directory / "{}.db".format(name)), 'rb') as fr:
+                self.assertEqual(fr.read(), PAYLOADS["/" + name])
+        self.assertListEqual(list(self.directory.glob("*" + downloader.PART_SUFFIX)), [])
+
+    def test_streaming_errors_release_connections(self):
+        # A single pooled connection hangs the second request if a failed response keeps it checked out
+        client = HttpClient(max_connections_per_host=1)
+        result = list()
+        worker = threading.Thread(target=lambda: result.append(downloader.download_all(
+            self._jobs(["musicscores_m003", "musicscores_m999", "musicscores_m001"]), client=client,
+            decompress=True, max_workers=3, backoff=0.01)), daemon=True)
+        worker.start()
+        worker.join(timeout=10)
+        client.close()
+        self.assertFalse(worker.is_alive())
+        self.assertListEqual(result, [["musicscores_m999"]])
+        self.assertEqual(_StandInHandler.hits[FLAKY_PATH], 2)
+
+    def test_decompress_to_file(self):
+        data = bytes(range(256)) * 1000
+        compressed_path = self.directory / "compressed"
+        compressed_path.write_bytes(_compress(data))
+        decompress_to_file(compressed_path, self.directory / "decompressed")
+        self.assertEqual((self.directory / "decompressed").read_bytes(), data)
+        self.assertEqual(decompress(_compress(data)), data)
+
+    def test_missing_file_is_reported(self):
+        completed = list()
+        failed = downloader.download_all(self._jobs(["musicscores_m001", "musicscores_m999"]),
+                                         transform=decompress, on_complete=completed.append, backoff=0.01)
+        self.assertListEqual(failed, ["musicscores_m999"])
+        self.assertListEqual(completed, ["musicscores_m001"])
+        self.assertFalse((self.directory / "musicscores_m999.db").exists())
+        # Client errors are not retried
+        self.assertEqual(_StandInHandler.hits["/musicscores_m999"], 1)
+
+    def test_cleanup_partial_downloads(self):
+        (self.directory / ("musicscores_m001.db" + downloader.PART_SUFFIX)).write_bytes(b"truncated")
+        (self.directory / "musicscores_m002.db").write_bytes(b"done")
+        downloader.cleanup_partial_downloads(self.directory)
+        self.assertListEqual([_.name for _ in self.directory.iterdir()], ["musicscores_m002.db"])
@@ -0,0 +1,66 @@
+import shutil
+import sqlite3
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from logic.profile.journal import ProfileJournal
+
+
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        self.directory = Path(tempfile.mkdtemp())
+        self.db_path = self.directory / "main.db"
+        self.journal = ProfileJournal(delay=60)
+        self.journal.open(self.db_path)
+
+    def tearDown(self):
+        self.journal.forget(self.db_path)
+        shutil.rmtree(str(self.directory))
+
+    def _fetch(self, query):
+        conn = sqlite3.connect(str(self.db_path))
+        try:
+            return conn.execute(query).fetchall()
+        finally:
+            conn.close()
+
+    def test_compact(self):
+        self.journal.append([{'type': 'card', 'card_id': 100001, 'number': 2},
+                             {'type': 'card', 'card_id': 100002, 'number': 1}])
+        self.journal.append([{'type': 'card', 'card_id': 100001, 'number': 3}])
+        self.journal.append([{'type': 'potential', 'chara_id': 101, 'pots': [10, 10, 5, 0, 1]}])
+        self.journal.append([{'type': 'unit', 'unit_name': 'a', 'grand': 0, 'cards': '1,2,3,4,5,'},
+                             {'type': 'unit', 'unit_name': 'b', 'grand': 1, 'cards': '1,2,3'}])
+        self.journal.append([{'type': 'unit_deleted', 'unit_name': 'a'}])
+        self.assertTrue((self.directory / "main.db.jnl").exists())
+        self.journal.compact()
+        self.assertFalse((self.directory / "main.db.jnl").exists())
+        self.assertListEqual(self._fetch("SELECT * FROM owned_card ORDER BY card_id"), [(100001, 3), (100002, 1)])
+        self.assertListEqual(self._fetch("SELECT * FROM potential_cache"), [(101, 10, 10, 5, 0, 1)])
+        self.assertListEqual(self._fetch("SELECT unit_name FROM personal_units"), [('b',)])
+
+    def test_debounced_compaction(self):
+        self.journal.delay = 0.05
+        self.journal.append([{'type': 'card', 'card_id': 100001, 'number': 2}])
+        time.sleep(0.5)
+        self.assertFalse((self.directory / "main.db.jnl").exists())
+        self.assertListEqual(self._fetch("SELECT * FROM owned_card"), [(100001, 2)])
+
+    def test_recover_after_crash(self):
+        self.journal.append([{'type': 'card', 'card_id': 100001, 'number': 2}])
+        # A torn last line from a crash mid-write is skipped
+        with open(str(self.directory / "main.db.jnl"), 'a') as fa:
+            fa.write('{"type": "card", "card_id": 1000')
+        recovered = ProfileJournal(delay=60)
+        recovered.open(self.db_path)
+        self.assertListEqual(self._fetch("SELECT * FROM owned_card"), [(100001, 2)])
+
+    def test_forget(self):
+        self.journal.append([{'type': 'card', 'card_id': 100001, 'number': 2}])
+        self.journal.forget(self.db_path)
+        self.assertFalse((self.directory / "main.db.jnl").exists())
+        # Not journaling anything anymore
+        self.journal.append([{'type': 'card', 'card_id': 100001, 'number': 2}])
+        self.assertFalse((self.directory / "main.db.jnl").exists())
@@ -0,0 +1,43 @@
+import itertools
+import unittest
+
+import numpy as np
+import pyximport
+
+from logic.synthetic import generate_card, generate_live, generate_unit
+from logic.unit import Unit
+from optimizer import CardPool, _order_unit, build_pool, collapse_idolized
+from static.color import Color
+
+pyximport.install(language_level=3)
+
+
+class TestOptimizer(unittest.TestCase):
+    def setUp(self):
+        self.live = generate_live(generate_unit(seed=0), note_count=800, seed=0)
+        self.cards = [generate_card(skill_type, Color(idx % 3), seed=idx)
+                      for idx, skill_type in enumerate([1, 4, 20, 41, 16, 24, 26, 17, 25, 35, 39, 40] * 3)]
+
+    def test_pool_keeps_every_skill_type(self):
+        pool = build_pool(self.cards, self.live, pool_size=12, per_skill_type=1)
+        self.assertEqual(len(pool), 12)
+        self.assertSetEqual(set(pool.skill_types.tolist()), {card.skill.skill_type for card in self.cards})
+
+    def test_appeal_matches_live(self):
+        pool = CardPool(self.cards[:8], self.live)
+        units = np.array(list(itertools.combinations(range(8), 5)))
+        appeals, centers, skill_factors = pool.estimate_units(units)
+        for unit, appeal, center in zip(units[:10], appeals[:10], centers[:10]):
+            self.live.set_unit(Unit(*_order_unit([pool.cards[_] for _ in unit], center)))
+            self.assertEqual(appeal, self.live.get_appeals())
+        self.assertTrue((skill_factors >= 1).all())
+
+    def test_units_have_distinct_idols(self):
+        cards = self.cards[:6]
+        cards[1].chara_id = cards[0].chara_id
+        units = CardPool(cards, self.live).get_units()
+        self.assertEqual(len(units), 2)
+        self.assertFalse(((units == 0).any(axis=1) & (units == 1).any(axis=1)).any())
+
+    def test_collapse_idolized(self):
+        self.assertListEqual(collapse_idolized([100001, 100002, 100003, 200004]), [100002, 100003, 200004])
@@ -0,0 +1,40 @@
+import unittest
+
+from utils.profiling import PhaseProfiler
+
+
+class Machine:
+    def inner(self):
+        return 1
+
+    def outer(self):
+        return self.inner() + self.inner()
+
+
+class TestPhaseProfiler(unittest.TestCase):
+    def test_instrument(self):
+        profiler = PhaseProfiler()
+        machine = Machine()
+        profiler.instrument(machine, [("outer", "outer"), ("inner", "inner")])
+        self.assertEqual(machine.outer(), 2)
+        report = profiler.report()
+        self.assertEqual(set(report), {"outer", "inner"})
+        self.assertEqual(report["outer"]["calls"], 1)
+        self.assertEqual(report["inner"]["calls"], 2)
+        self.assertGreaterEqual(report["outer"]["total_sec"], report["inner"]["total_sec"])
+        profiler.reset()
+        self.assertEqual(len(profiler.report()), 0)
+
+    def test_other_instances_untouched(self):
+        profiler = PhaseProfiler()
+        profiler.instrument(Machine(), [("outer", "outer")])
+        Machine().outer()
+        self.assertEqual(len(profiler.report()), 0)
+        self.assertNotIn("outer", vars(Machine()))
+
+    def test_counts_raising_calls(self):
+        profiler = PhaseProfiler()
+        fn = profiler.wrap("fail", lambda: 1 / 0)
+        with self.assertRaises(ZeroDivisionError):
+            fn()
+        self.assertEqual(profiler.report()["fail"]["calls"], 1)
@@ -0,0 +1,90 @@
+import operator
+import unittest
+from concurrent.futures import Future
+
+from gui.events.service.simulation_scheduler import PRIORITY_HIGH, PRIORITY_LOW, PRIORITY_NORMAL, \
+    SimulationScheduler
+
+
+class _ManualExecutor:
+    """
+    Executor that only runs a call when the test says so, to control what is running and what is still queued.
+    """
+
+    def __init__(self):
+        self.pending = list()
+
+    def submit(self, fn, *args):
+        future = Future()
+        self.pending.append((fn, args, future))
+        return future
+
+    def run_next(self):
+        fn, args, future = self.pending.pop(0)
+        future.set_result(fn(*args))
+
+    def shutdown(self, wait=True):
+        pass
+
+
+class TestSimulationScheduler(unittest.TestCase):
+    def setUp(self):
+        self.executor = _ManualExecutor()
+        self.scheduler = SimulationScheduler(max_workers=1)
+        self.scheduler._executor = self.executor
+        self.results = list()
+
+    def _submit(self, key, value, priority=PRIORITY_NORMAL):
+        return self.scheduler.submit(key, operator.add, (value, 0), priority=priority, callback=self.results.append)
+
+    def _run_all(self):
+        while len(self.executor.pending) > 0:
+            self.executor.run_next()
+
+    def test_priority_order(self):
+        self._submit("a", 1)
+        self._submit("b", 2, PRIORITY_LOW)
+        self._submit("c", 3, PRIORITY_HIGH)
+        self._submit("d", 4)
+        self._run_all()
+        self.assertListEqual(self.results, [1, 3, 4, 2])
+
+    def test_supersede_queued(self):
+        self._submit("a", 1)
+        self._submit("b", 2)
+        self._submit("b", 3)
+        self._run_all()
+        self.assertListEqual(self.results, [1, 3])
+        progress = self.scheduler.get_progress()
+        self.assertEqual(progress.completed, 2)
+        self.assertEqual(progress.dropped, 1)
+
+    def test_supersede_running(self):
+        self._submit("a", 1)
+        self._submit("a", 2)
+        self._run_all()
+        # The first job was already on a worker, it ran but its result is dropped
+        self.assertListEqual(self.results, [2])
+        progress = self.scheduler.get_progress()
+        self.assertEqual(progress.completed, 1)
+        self.assertEqual(progress.dropped, 1)
+
+    def test_identical_pending_job_is_dropped(self):
+        self.assertTrue(self._submit("a", 1))
+        self.assertTrue(self._submit("b", 2))
+        self.assertFalse(self._submit("b", 2))
+        self._run_all()
+        self.assertListEqual(self.results, [1, 2])
+        self.assertEqual(self.scheduler.get_progress().submitted, 2)
+
+    def test_cancel(self):
+        self._submit("a", 1)
+        self._submit("b", 2)
+        self.scheduler.cancel("a")
+        self.scheduler.cancel("b")
+        self._run_all()
+        self.assertListEqual(self.results, [])
+        progress = self.scheduler.get_progress()
+        self.assertEqual(progress.completed, 0)
+        self.assertEqual(progress.dropped, 2)
+        self.assertEqual(progress.queued + progress.running, 0)
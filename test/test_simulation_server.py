@@ -0,0 +1,77 @@
+import operator
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from simulation_server import SimulationService, get_authkey, get_cache_key, is_loopback, serve
+
+
+class _Request:
+    def __init__(self, uuid, times):
+        self.uuid = uuid
+        self.times = times
+
+
+class TestSimulationServer(unittest.TestCase):
+    def setUp(self):
+        self.service = SimulationService(workers=2, cache_size=2)
+
+    def tearDown(self):
+        self.service.shutdown(wait=True)
+
+    def test_cache_key_ignores_identity(self):
+        self.assertEqual(get_cache_key(operator.add, (_Request("a", 10),)),
+                         get_cache_key(operator.add, (_Request("b", 10),)))
+        self.assertNotEqual(get_cache_key(operator.add, (_Request("a", 10),)),
+                            get_cache_key(operator.add, (_Request("a", 20),)))
+        self.assertEqual(get_cache_key(operator.add, ({"id": 1, "times": 10},)),
+                         get_cache_key(operator.add, ({"id": 2, "times": 10},)))
+
+    def test_cache(self):
+        self.assertEqual(self.service.simulate(operator.add, (1, 2)), 3)
+        self.assertEqual(self.service.simulate(operator.add, (1, 2)), 3)
+        self.assertEqual(self.service.simulate(operator.add, (2, 2)), 4)
+        stats = self.service.get_stats()
+        self.assertEqual(stats["requests"], 3)
+        self.assertEqual(stats["cache_hits"], 1)
+        self.assertEqual(stats["computed"], 2)
+
+    def test_cache_size(self):
+        for i in range(3):
+            self.service.simulate(operator.add, (i, 0))
+        self.assertEqual(self.service.get_stats()["cached"], 2)
+        # The oldest result was evicted
+        self.service.simulate(operator.add, (0, 0))
+        self.assertEqual(self.service.get_stats()["cache_hits"], 0)
+
+    def test_errors_are_not_cached(self):
+        with self.assertRaises(TypeError):
+            self.service.simulate(operator.add, (1, "a"))
+        with self.assertRaises(TypeError):
+            self.service.simulate(operator.add, (1, "a"))
+        self.assertEqual(self.service.get_stats()["cached"], 0)
+
+
+class TestSimulationServerKey(unittest.TestCase):
+    def setUp(self):
+        self.directory = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(str(self.directory))
+
+    def test_generated_key(self):
+        key_path = self.directory / "server.key"
+        with self.assertRaises(FileNotFoundError):
+            get_authkey(key_path=key_path)
+        key = get_authkey(create=True, key_path=key_path)
+        self.assertGreaterEqual(len(key), 32)
+        self.assertEqual(get_authkey(key_path=key_path), key)
+        self.assertNotEqual(get_authkey(create=True, key_path=self.directory / "other.key"), key)
+
+    def test_weak_key_stays_on_loopback(self):
+        self.assertTrue(is_loopback("127.0.0.1"))
+        self.assertTrue(is_loopback("localhost"))
+        self.assertFalse(is_loopback("0.0.0.0"))
+        with self.assertRaises(ValueError):
+            serve("0.0.0.0", authkey=b"chihiro")
@@ -62,6 +62,18 @@ class TestPerfect(unittest.TestCase):
         sim = Simulator(live)
         self.assertEqual(sim.simulate(perfect_play=True, appeals=208617).perfect_score, 776777)
 
+    def test_magic_profile(self):
+        unit = Unit.from_query("kaede5 syoko4 yui5 shin3 makino2 frederica5", custom_pots=(0, 0, 0, 0, 10))
+        live = Live()
+        live.set_music(music_name="Absolute Nine", difficulty=Difficulty.REGULAR)
+        live.set_unit(unit)
+        result = Simulator(live, profile=True).simulate(perfect_play=True, appeals=208617)
+        self.assertEqual(result.perfect_score, 776777)
+        self.assertEqual(result.profile["chart_setup"]["calls"], 1)
+        self.assertEqual(result.profile["handle_note"]["calls"], len(live.notes))
+        self.assertGreater(result.profile["expand_magic"]["calls"], 0)
+        self.assertIsNone(Simulator(live).simulate(perfect_play=True, appeals=208617).profile)
+
     def test_ref(self):
         unit = Unit.from_list([201002, 100990, 201004, 100989, 300762, 100256], custom_pots=(5, 10, 10, 0, 10))
         live = Live()
@@ -0,0 +1,80 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+import pyximport
+
+from logic.grandlive import GrandLive
+from logic.synthetic import SKILL_VALUES, generate_chart, generate_grand_unit, generate_live, generate_unit
+from simulator import Simulator
+from static.note_type import NoteType
+from static.skill import SKILL_BASE
+
+pyximport.install(language_level=3)
+
+# Run in a fresh interpreter, the databases are opened by whatever imported db first
+_OFFLINE_SCRIPT = """
+import sys
+from pathlib import Path
+
+import settings
+
+settings.MASTERDB_PATH = Path(sys.argv[1]) / "master.db"
+settings.CACHEDB_PATH = Path(sys.argv[1]) / "chihiro.db"
+
+from logic.synthetic import generate_grand_unit, generate_live, generate_unit
+from simulator import Simulator
+
+live = generate_live(generate_unit([41, 40, 39, 16, 20], seed=0), note_count=500, seed=0)
+assert Simulator(live).simulate(times=2).perfect_score > 0
+live = generate_live(generate_grand_unit(seed=0), note_count=500, seed=0)
+assert Simulator(live).simulate(perfect_play=True).perfect_score > 0
+"""
+
+
+class TestSynthetic(unittest.TestCase):
+    def setUp(self):
+        self.directory = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(str(self.directory))
+
+    def test_chart(self):
+        notes = generate_chart(note_count=5000, seed=0)
+        self.assertEqual(len(notes), 5000)
+        self.assertTrue(notes["sec"].is_monotonic_increasing)
+        self.assertTrue(notes["finishPos"].between(1, 5).all())
+        for note_type in [NoteType.TAP, NoteType.LONG, NoteType.FLICK, NoteType.SLIDE]:
+            self.assertGreater((notes["note_type"] == note_type).sum(), 0)
+
+    def test_grand_chart(self):
+        notes = generate_chart(note_count=2000, grand=True, seed=0)
+        self.assertEqual(len(notes), 2000)
+        self.assertTrue((notes["finishPos"] + notes["status"] - 1).between(1, 15).all())
+
+    def test_chart_is_reproducible(self):
+        self.assertTrue(generate_chart(note_count=500, seed=1).equals(generate_chart(note_count=500, seed=1)))
+
+    def test_covers_every_skill_type(self):
+        self.assertEqual(set(SKILL_VALUES), set(SKILL_BASE))
+
+    def test_simulate(self):
+        live = generate_live(generate_unit([41, 40, 39, 16, 20], seed=0), note_count=1500, seed=0)
+        result = Simulator(live).simulate(times=5)
+        self.assertGreater(result.perfect_score, 0)
+
+    def test_simulate_grand(self):
+        live = generate_live(generate_grand_unit(seed=0), note_count=1500, seed=0)
+        self.assertIsInstance(live, GrandLive)
+        self.assertGreater(Simulator(live).simulate(perfect_play=True).perfect_score, 0)
+
+    def test_simulate_without_masterdb(self):
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+        result = subprocess.run([sys.executable, "-c", _OFFLINE_SCRIPT, str(self.directory)], env=env,
+                                stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=600)
+        self.assertEqual(result.returncode, 0, result.stdout.decode(errors="replace"))
+        self.assertFalse((self.directory / "master.db").exists())
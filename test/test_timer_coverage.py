@@ -0,0 +1,52 @@
+import unittest
+
+import numpy as np
+
+from logic import timer_coverage
+from logic.skill import COMMON_TIMERS
+
+
+def _generate_note_times(note_count, seed):
+    # Sorted note times in seconds, with chords and long pauses like real charts
+    rng = np.random.RandomState(seed)
+    return np.round(np.cumsum(rng.exponential(0.25, note_count) * (rng.rand(note_count) > 0.1)) + 2, 3)
+
+
+def _is_active(note_times, interval, duration):
+    # The formula of the Timer_* columns of live_detail_cache
+    last_note = note_times[-1]
+    return (note_times > interval) & (note_times % interval > 0) & (note_times % interval <= duration) \
+           & (note_times // interval * interval <= last_note - 3)
+
+
+class TestTimerCoverage(unittest.TestCase):
+    def setUp(self):
+        self.charts = [(live_detail_id, _generate_note_times(note_count, live_detail_id))
+                       for live_detail_id, note_count in [(1, 400), (2, 850), (3, 1200)]]
+        timer_coverage._set_charts([
+            (live_detail_id, np.round(note_times * 1000).astype(np.int32),
+             timer_coverage.get_note_weights(len(note_times)).astype(np.float32))
+            for live_detail_id, note_times in self.charts
+        ])
+
+    def tearDown(self):
+        timer_coverage.invalidate()
+
+    def test_matches_cached_timers(self):
+        for interval, duration, _ in COMMON_TIMERS:
+            coverage = timer_coverage.get_coverage(interval, duration)
+            self.assertSetEqual(set(coverage.keys()), {1, 2, 3})
+            for live_detail_id, note_times in self.charts:
+                weights = timer_coverage.get_note_weights(len(note_times))
+                expected = weights[_is_active(note_times, interval, duration)].sum() / weights.sum()
+                self.assertAlmostEqual(coverage[live_detail_id], expected, places=4)
+                self.assertAlmostEqual(timer_coverage.get_chart_coverage(note_times, interval, duration), expected,
+                                       places=4)
+
+    def test_rank_charts(self):
+        ranking = timer_coverage.rank_charts(10, 8)
+        self.assertEqual(len(ranking), 3)
+        self.assertListEqual(ranking, sorted(ranking, key=lambda x: x[1], reverse=True))
+        self.assertListEqual(timer_coverage.rank_charts(10, 8, live_detail_ids=[3, 1]),
+                             [_ for _ in ranking if _[0] != 2])
+        self.assertIs(timer_coverage.get_coverage(10, 8), timer_coverage.get_coverage(10, 8))